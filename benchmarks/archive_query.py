@@ -0,0 +1,65 @@
+import argparse
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import DebitCard, SIMULATION_PIN_HASHER, TransactionArchive, set_default_pin_hasher
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def timed(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f"{label:<52} {time.perf_counter() - started:8.3f} с  ({result})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запросы к архиву операций по месяцам")
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=730, help="длина истории в днях")
+    parser.add_argument("--per-day", type=int, default=4, help="операций на карту в день")
+    args = parser.parse_args()
+
+    now = int(time.time())
+    first_timestamp = now - args.days * 24 * 60 * 60
+    step = 24 * 60 * 60 // args.per_day
+    with tempfile.TemporaryDirectory() as directory:
+        archive = TransactionArchive(directory)
+        cards = {}
+        for i in range(args.cards):
+            card = DebitCard(f"{i:016d}", "0000", 0.0, True)
+            cards[card.card_number] = card
+        archive.attach(cards)
+
+        def fill():
+            for timestamp in range(first_timestamp, now, step):
+                for card in cards.values():
+                    card.balance += 1.0
+                    card.add_transaction("Пополнение", 1.0, timestamp)
+            archive.flush()
+            return sum(len(card.transactions) for card in cards.values())
+
+        timed("Заполнение истории, строк в памяти", fill)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"Размер архива: {size / 1024 / 1024:.1f} МБ, файлов: {len(os.listdir(directory))}")
+
+        card = cards[f"{args.cards // 2:016d}"]
+        last_year = datetime.now() - timedelta(days=365)
+        month_start = last_year.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        month_end = (month_start + timedelta(days=32)).replace(day=1)
+        for label, start, end in (("Последние 30 дней", datetime.now() - timedelta(days=30), None),
+                                  ("Один месяц год назад", month_start, month_end),
+                                  ("Вся история", None, None)):
+            # Новый объект архива, чтобы индексы читались заново
+            card.archive = TransactionArchive(directory)
+            timed(f"{label}, строк", lambda: len(card.get_transactions(start, end)))
+            print(f"    прочитано блоков: {card.archive.blocks_read}")
+
+
+if __name__ == "__main__":
+    main()
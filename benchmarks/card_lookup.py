@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import CardIndex
+
+# Поиск карты на экране ожидания: раньше при каждом возврате на экран строилась строка меню
+# для каждой карты базы, теперь CardIndex строится один раз, а экран берет одну страницу поиска.
+
+SURNAMES = ("Иванов", "Петров", "Сидоров", "Зайцев", "Кузнецов", "Смирнов", "Попов", "Волков", "Соколов", "Лебедев")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск карт по номеру, последним цифрам и владельцу")
+    parser.add_argument("--cards", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    descriptions = []
+    for i in range(args.cards):
+        digits = f"{rng.randrange(10 ** 16):016d}"
+        card_number = "-".join(digits[j:j + 4] for j in range(0, 16, 4))
+        owner_name = f"{rng.choice(SURNAMES)}{'а' if i % 2 else ''} {chr(0x0410 + i % 32)}.{chr(0x0410 + i % 29)}."
+        descriptions.append((card_number, owner_name, i % 50 == 0))
+
+    started = time.perf_counter()
+    menu = [f"{number} ({owner_name}, {'Забл.' if is_blocked else 'OK'})"
+            for number, owner_name, is_blocked in sorted(descriptions)]
+    menu_seconds = time.perf_counter() - started
+    print(f"Строки меню для всех карт (без создания виджетов): {menu_seconds * 1000:.0f} мс на каждый показ экрана")
+    del menu
+
+    index = CardIndex()
+    started = time.perf_counter()
+    index.rebuild(descriptions)
+    print(f"Построение CardIndex для {len(index)} карт: {time.perf_counter() - started:.2f} с (один раз)")
+
+    queries = []
+    for _ in range(args.queries):
+        number, owner_name, _ = rng.choice(descriptions)
+        kind = rng.randrange(3)
+        if kind == 0:
+            queries.append(number[:rng.randint(4, 14)])
+        elif kind == 1:
+            queries.append("*" + number[-4:])
+        else:
+            queries.append(owner_name[:rng.randint(3, len(owner_name))].lower())
+
+    timings = []
+    found = 0
+    for query in queries:
+        started = time.perf_counter()
+        result = index.search(query)
+        found += len(result)
+        result.page(0, args.page_size)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"Поиск и первая страница: медиана {timings[len(timings) // 2] * 1e6:.1f} мкс, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:.1f} мкс, в среднем найдено {found / len(queries):.0f}")
+
+    result = index.search("")
+    started = time.perf_counter()
+    for page in range(0, result.page_count(args.page_size), max(1, result.page_count(args.page_size) // 1000)):
+        result.page(page, args.page_size)
+    print(f"Страница в конце списка: {(time.perf_counter() - started) / 1000 * 1e6:.1f} мкс")
+
+    samples = [rng.choice(descriptions) for _ in range(args.queries)]
+    started = time.perf_counter()
+    for number, owner_name, _ in samples:
+        assert index.find_by_number(number.replace("-", " ")) == number
+        assert number in index.find_by_owner(owner_name.upper())
+    elapsed = time.perf_counter() - started
+    print(f"find_by_number + find_by_owner: {elapsed / len(samples) * 1e6:.1f} мкс на пару")
+
+    number, owner_name, _ = descriptions[0]
+    started = time.perf_counter()
+    index.add(number, owner_name, True)
+    print(f"Обновление карты в индексе: {(time.perf_counter() - started) * 1000:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
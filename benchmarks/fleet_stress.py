@@ -0,0 +1,122 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATMFleet, Card, CreditCard, DebitCard, SIMULATION_PIN_HASHER, derive_rng,
+                     set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+_SIGNS = {"Пополнение": 1.0, "Перевод с карты": 1.0, "Снятие": -1.0, "Перевод на карту": -1.0}
+
+
+_BALANCE_SLOT = Card.balance
+
+
+def _yielding_balance(card_class):
+    # Чтение баланса отдает процессор другому потоку: "прочитать - изменить - записать" в операциях
+    # карты всегда пересекается с другими терминалами, и без блокировок обновления теряются в каждом прогоне
+    class YieldingCard(card_class):
+        __slots__ = ()
+
+        @property
+        def balance(self):
+            value = _BALANCE_SLOT.__get__(self)
+            time.sleep(0)
+            return value
+
+        @balance.setter
+        def balance(self, value):
+            _BALANCE_SLOT.__set__(self, value)
+
+    return YieldingCard
+
+
+YieldingDebitCard = _yielding_balance(DebitCard)
+YieldingCreditCard = _yielding_balance(CreditCard)
+
+
+def build_cards(card_count):
+    cards = {}
+    for i in range(card_count):
+        card_number = f"{i:016d}"
+        if i % 2:
+            card = YieldingCreditCard(card_number, "0000", 1000.0, 5000.0, True)
+        else:
+            card = YieldingDebitCard(card_number, "0000", 1000.0, True)
+        cards[card_number] = card
+    return cards
+
+
+def run_terminal(atm, cards, sessions, seed):
+    rng = derive_rng(seed, "sessions", atm.terminal_id)  # у каждого терминала своя последовательность
+    card_numbers = sorted(cards)
+    operations = 0
+    for _ in range(sessions):
+        card = cards[rng.choice(card_numbers)]
+        while not atm.insert_card(card)[0]:  # повтор при ошибке чтения карты
+            pass
+        atm.process_pin_entry("0000")
+        for _ in range(rng.randint(1, 5)):
+            amount = str(rng.randint(1, 20))
+            choice = rng.random()
+            if choice < 0.4:
+                atm.perform_withdrawal(amount)
+            elif choice < 0.7:
+                atm.perform_cash_deposit_to_card(amount)
+            else:
+                atm.perform_transfer_to_card(cards[rng.choice(card_numbers)], amount)
+            operations += 1
+        atm._eject_card_to_user()
+    return operations
+
+
+def history_balance(card, initial_balance):
+    # Баланс, восстановленный по истории операций карты
+    balance = initial_balance
+    for _, trans_type, amount, _ in card.transactions:
+        balance += _SIGNS.get(trans_type, 0.0) * amount
+    return balance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка терминалов в потоках над общей базой карт")
+    parser.add_argument("--terminals", type=int, default=8)
+    parser.add_argument("--cards", type=int, default=4, help="мало карт - больше конкуренции")
+    parser.add_argument("--sessions", type=int, default=2000, help="сессий на терминал")
+    parser.add_argument("--no-locks", action="store_true", help="отключить блокировки карт, чтобы увидеть потери")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.setswitchinterval(1e-6)  # частое переключение потоков усиливает конкуренцию
+    cards = build_cards(args.cards)
+    fleet = ATMFleet(cards, args.terminals, initial_atm_cash=1e9, hourly_withdrawal_limit=math.inf, seed=args.seed)
+    if args.no_locks:
+        for atm in fleet.terminals:
+            atm.card_locks = None
+    initial_balance = sum(card.balance for card in cards.values())
+    initial_cash = fleet.get_total_cash()
+
+    started = time.perf_counter()
+    operations = sum(fleet.run(run_terminal, cards, args.sessions, args.seed))
+    elapsed = time.perf_counter() - started
+    print(f"Операций: {operations}, {elapsed:.2f} с, {operations / elapsed:.0f} оп/с")
+
+    # Снятие и внесение меняют баланс карты и наличные терминала на одну сумму, переводы сохраняют сумму балансов
+    drift = (sum(card.balance for card in cards.values()) - initial_balance) - (fleet.get_total_cash() - initial_cash)
+    mismatched = [card.card_number for card in cards.values()
+                  if abs(history_balance(card, 1000.0) - card.balance) > 1e-6]
+    print(f"Расхождение балансов карт и наличных терминалов: {drift:.2f}")
+    print(f"Карт, чей баланс не совпадает с историей: {len(mismatched)}")
+    if abs(drift) > 1e-6 or mismatched:
+        print("ОБНАРУЖЕНЫ ПОТЕРЯННЫЕ ОБНОВЛЕНИЯ")
+        sys.exit(1)
+    print("Потерянных обновлений нет")
+
+
+if __name__ == "__main__":
+    main()
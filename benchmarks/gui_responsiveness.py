@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import ATM, DebitCard, FaultInjector, NullReceiptSink, SIMULATION_PIN_HASHER, set_default_pin_hasher
+from raschet.gui import ATMGUI
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+# Отзывчивость окна во время медленных операций банкомата. Задержка банка задается через
+# FaultInjector, а таймер Tk каждые --tick-ms записывает, насколько он опоздал. С --blocking
+# операции вызываются прямо в главном потоке, как до переноса в рабочий поток. Нужен дисплей.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержки главного цикла Tk во время операций банкомата")
+    parser.add_argument("--operations", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="задержка ответа банка, с")
+    parser.add_argument("--tick-ms", type=int, default=10)
+    parser.add_argument("--cancel-every", type=int, default=0, help="отменять каждую N-ю операцию")
+    parser.add_argument("--blocking", action="store_true", help="выполнять операции в главном потоке")
+    args = parser.parse_args()
+
+    card = DebitCard("0000000000000001", "0000", 1e9, True)
+    faults = FaultInjector(card_read_error_rate=0.0, latency={None: args.latency})
+    atm = ATM(initial_atm_cash=1e9, hourly_withdrawal_limit=1e12, receipt_sink=NullReceiptSink(), faults=faults)
+    gui = ATMGUI(atm, {card.card_number: card})
+    atm.insert_card(card)
+    atm.process_pin_entry("0000")
+
+    gaps_ms = []
+    state = {"done": 0, "cancelled": 0, "last_tick": time.perf_counter()}
+
+    def tick():
+        now = time.perf_counter()
+        gaps_ms.append((now - state["last_tick"]) * 1000 - args.tick_ms)
+        state["last_tick"] = now
+        gui.after(args.tick_ms, tick)
+
+    def finished(result=None):
+        state["done"] += 1
+        if state["done"] >= args.operations:
+            gui.after(args.tick_ms * 5, gui.quit)
+        else:
+            gui.after(args.tick_ms, start_operation)
+
+    def cancelled():
+        state["cancelled"] += 1
+        finished()
+
+    def start_operation():
+        if args.blocking:
+            atm.perform_withdrawal("100")
+            finished()
+            return
+        gui._dispatch("Снятие наличных", lambda: atm.perform_withdrawal("100"), finished, cancelled)
+        if args.cancel_every and (state["done"] + 1) % args.cancel_every == 0:
+            gui.after(max(1, int(args.latency * 500)), gui._cancel_pending_operation)
+
+    gui.after(args.tick_ms, tick)
+    gui.after(args.tick_ms, start_operation)
+    started = time.perf_counter()
+    gui.mainloop()
+    elapsed = time.perf_counter() - started
+    # Отмененные операции дорабатывают в рабочем потоке: ждем их, прежде чем закрыть окно
+    gui.executor.shutdown(wait=True)
+    gui.close()
+
+    gaps_ms.sort()
+    mode = "в главном потоке" if args.blocking else "в рабочем потоке"
+    print(f"Операции {mode}: {state['done']} за {elapsed:.2f} с, отменено {state['cancelled']}")
+    print(f"Опоздание таймера Tk: медиана {gaps_ms[len(gaps_ms) // 2]:.1f} мс, "
+          f"p99 {gaps_ms[int(len(gaps_ms) * 0.99) - 1]:.1f} мс, максимум {gaps_ms[-1]:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATM, DebitCard, FaultInjector, NullReceiptSink, SIMULATION_PIN_HASHER, format_result,
+                     set_default_pin_hasher)
+from raschet.gui import ATMGUI
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+# Время переходов между экранами ATMGUI. По умолчанию экраны кэшируются, с --rebuild
+# каждый переход заново строит экран, как раньше. Нужен дисплей (X11 или Xvfb).
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время переходов между экранами графического интерфейса")
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--history", type=int, default=200, help="строк истории у выбранной карты")
+    parser.add_argument("--rebuild", action="store_true", help="пересоздавать экран при каждом переходе")
+    args = parser.parse_args()
+
+    cards = {}
+    for i in range(args.cards):
+        card_number = f"{i:016d}"
+        cards[card_number] = DebitCard(card_number, "0000", 100000.0, True, owner_name=f"Клиент {i}")
+    card = cards[f"{0:016d}"]
+    for i in range(args.history):
+        card.add_transaction("Пополнение", float(i), 1700000000 + i)
+
+    atm = ATM(initial_atm_cash=1e9, receipt_sink=NullReceiptSink(), faults=FaultInjector(card_read_error_rate=0.0))
+    gui = ATMGUI(atm, cards, cache_screens=not args.rebuild)
+    atm.insert_card(card)
+    atm.process_pin_entry("0000")
+
+    # Баланс и история запрашиваются один раз: здесь измеряется только смена экрана, без вызовов банкомата
+    balance_text = format_result(atm.request_card_balance())
+    history_outcome = atm.open_card_history()
+    screens = [gui._show_main_menu, gui._show_withdrawal_screen, gui._show_main_menu,
+               lambda: gui._present_balance_screen(balance_text), gui._show_main_menu,
+               lambda: gui._present_history_screen(history_outcome), gui._show_pin_entry_screen,
+               gui._show_welcome_screen]
+    for show in screens:  # первый проход строит экраны и не учитывается
+        show()
+    gui.transition_times.clear()
+    for _ in range(args.cycles):
+        for show in screens:
+            show()
+    gui.close()
+
+    times_ms = sorted(seconds * 1000 for seconds in gui.transition_times)
+    p95 = times_ms[int(len(times_ms) * 0.95) - 1]
+    mode = "пересоздание экранов" if args.rebuild else "кэшированные экраны"
+    print(f"{mode}: {len(times_ms)} переходов, среднее {statistics.mean(times_ms):.3f} мс, "
+          f"медиана {statistics.median(times_ms):.3f} мс, p95 {p95:.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (DebitCard, HistoryPager, SIMULATION_PIN_HASHER, TransactionArchive, VirtualClock,
+                     format_history_row, set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+# Экран истории для карты с длинным архивом: весь список одной строкой (как раньше в Text)
+# против постраничного HistoryPager, который форматирует только запрошенное окно.
+
+
+def measure(function):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Полная история против постраничной для длинного архива")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--visible", type=int, default=12, help="строк в окне")
+    parser.add_argument("--jumps", type=int, default=200, help="переходов к случайной позиции")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clock = VirtualClock(1_600_000_000)
+    card = DebitCard("0000000000000001", "0000", 0.0, True, clock=clock)
+    with tempfile.TemporaryDirectory() as directory:
+        archive = TransactionArchive(directory)
+        archive.attach({card.card_number: card})
+        for i in range(args.rows):
+            clock.advance(rng.randint(60, 3600))
+            card.balance += 1.0
+            card.add_transaction("Пополнение", 1.0)
+        archive.flush()
+
+        text, full_seconds, full_peak = measure(
+            lambda: "\n".join(format_history_row(row) for row in reversed(card.get_transactions())))
+        print(f"Весь список: {card.count_history()} строк, {full_seconds * 1000:.1f} мс, "
+              f"пик памяти {full_peak / 1e6:.1f} МБ, текст {len(text) / 1e6:.1f} млн символов")
+
+        pager, open_seconds, _ = measure(lambda: HistoryPager(card))
+        print(f"Открытие HistoryPager: {open_seconds * 1000:.2f} мс")
+
+        def scroll():
+            timings = []
+            for first in [0] + [rng.randrange(len(pager)) for _ in range(args.jumps)]:
+                started = time.perf_counter()
+                pager.lines(first, args.visible)
+                timings.append(time.perf_counter() - started)
+            return timings
+
+        timings, _, scroll_peak = measure(scroll)
+        timings.sort()
+        print(f"Окно из {args.visible} строк: медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+              f"максимум {timings[-1] * 1000:.2f} мс, пик памяти {scroll_peak / 1e6:.2f} МБ, "
+              f"загружено страниц {pager.pages_loaded}, прочитано блоков архива {archive.blocks_read}")
+
+        started = time.perf_counter()
+        for first in range(0, min(len(pager), 5000)):
+            pager.lines(first, args.visible)
+        elapsed = time.perf_counter() - started
+        print(f"Построчная прокрутка первых 5000 строк: {elapsed / 5000 * 1e6:.1f} мкс на шаг")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed * 1000, 'tkinter' in sys.modules)
+"""
+
+
+def measure(module, runs):
+    timings = []
+    tkinter_loaded = False
+    for _ in range(runs):
+        # Каждый замер в новом процессе, чтобы модули не брались из кэша sys.modules
+        output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout.split()
+        timings.append(float(output[0]))
+        tkinter_loaded = output[1] == "True"
+    return statistics.median(timings), tkinter_loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта ядра банкомата и графического интерфейса")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for module in ("raschet", "raschet.gui"):
+        median_ms, tkinter_loaded = measure(module, args.runs)
+        print(f"{module:<12} {median_ms:8.2f} мс (медиана), tkinter загружен: {'да' if tkinter_loaded else 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import ATM, DebitCard, NullReceiptSink, OperationJournal, SIMULATION_PIN_HASHER, set_default_pin_hasher
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def run(terminals, operations_per_terminal, flush_interval, journal_path):
+    journal = OperationJournal(journal_path, flush_interval=flush_interval)
+    cards = [DebitCard(f"{i:016d}", "0000", 1000000.0) for i in range(terminals)]
+    atms = [ATM(1000000.0, receipt_sink=NullReceiptSink(), journal=journal, terminal_id=i) for i in range(terminals)]
+
+    def drive(atm, card):
+        atm.current_card = card
+        for _ in range(operations_per_terminal):
+            atm.perform_cash_deposit_to_card("10")
+
+    threads = [threading.Thread(target=drive, args=(atm, card)) for atm, card in zip(atms, cards)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    journal.close()
+    return elapsed, journal.fsync_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность журнала операций с групповой фиксацией")
+    parser.add_argument("--terminals", type=int, default=32)
+    parser.add_argument("--operations", type=int, default=200, help="операций на терминал")
+    parser.add_argument("--flush-interval", type=float, default=0.002, help="пауза перед сбросом пачки, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed, fsync_count = run(args.terminals, args.operations, args.flush_interval,
+                                   os.path.join(directory, "journal.bin"))
+    total = args.terminals * args.operations
+    print(f"Операций: {total}, время: {elapsed:.3f} с, {total / elapsed:.0f} оп/с")
+    print(f"fsync: {fsync_count}, операций на fsync: {total / max(fsync_count, 1):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATM, ATMFleet, CreditCard, DebitCard, FaultInjector, NullReceiptSink, SIMULATION_PIN_HASHER,
+                     derive_rng, set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+# Доли операций внутри сессии после успешного ввода PIN
+_OPERATION_WEIGHTS = (("withdraw", 35), ("deposit", 20), ("transfer", 10), ("balance", 25), ("history", 10))
+_WRONG_PIN_RATE = 0.10  # сессия начинается с одного неверного PIN
+_BLOCKING_PIN_RATE = 0.005  # PIN трижды неверный, карта блокируется
+
+
+def build_cards(card_count, seed):
+    rng = random.Random(seed)
+    cards = {}
+    for i in range(card_count):
+        card_number = f"{i:016d}"
+        deposit_type = "full" if rng.random() < 0.3 else "partial"
+        history_enabled = rng.random() < 0.7
+        if rng.random() < 0.4:
+            card = CreditCard(card_number, "0000", rng.uniform(-500, 3000), rng.choice((1000.0, 5000.0, 20000.0)),
+                              history_enabled, deposit_type, rng=rng)
+        else:
+            card = DebitCard(card_number, "0000", rng.uniform(0, 5000), history_enabled, deposit_type, rng=rng)
+        for _ in range(rng.randint(0, 40)):
+            card.add_transaction("Покупка", round(rng.uniform(10, 500), 2))
+        cards[card_number] = card
+    return cards
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = {}
+
+    def call(self, operation, function, *args):
+        started = time.perf_counter_ns()
+        result = function(*args)
+        self.samples.setdefault(operation, []).append(time.perf_counter_ns() - started)
+        return result
+
+
+def run_sessions(atm, cards, session_count, seed):
+    rng = derive_rng(seed, "sessions", atm.terminal_id)
+    recorder = LatencyRecorder()
+    card_numbers = sorted(cards)
+    operations, weights = zip(*_OPERATION_WEIGHTS)
+    for _ in range(session_count):
+        card = cards[rng.choice(card_numbers)]
+        if not recorder.call("insert_card", atm.insert_card, card)[0]:
+            continue  # ошибка чтения или заблокированная карта
+
+        draw = rng.random()
+        wrong_attempts = 3 if draw < _BLOCKING_PIN_RATE else 1 if draw < _WRONG_PIN_RATE else 0
+        for _ in range(wrong_attempts):
+            recorder.call("enter_pin", atm.process_pin_entry, "9999")
+        if atm.current_card is None:
+            continue  # карта изъята
+        recorder.call("enter_pin", atm.process_pin_entry, "0000")
+
+        for operation in rng.choices(operations, weights, k=rng.randint(1, 4)):
+            amount = str(rng.randint(1, 200) * 10)
+            if operation == "withdraw":
+                recorder.call(operation, atm.perform_withdrawal, amount)
+            elif operation == "deposit":
+                recorder.call(operation, atm.perform_cash_deposit_to_card, amount)
+            elif operation == "transfer":
+                recorder.call(operation, atm.perform_transfer_from_bank_to_card, amount)
+            elif operation == "balance":
+                recorder.call(operation, atm.request_card_balance)
+            else:
+                recorder.call(operation, atm.request_card_history)
+        recorder.call("eject", atm.cancel_operation_and_eject_card)
+    return recorder.samples
+
+
+def _new_atm(seed, faults, terminal_id=0):
+    return ATM(initial_atm_cash=1e12, hourly_withdrawal_limit=math.inf, receipt_sink=NullReceiptSink(),
+               terminal_id=terminal_id, rng=derive_rng(seed, "atm", terminal_id), faults=faults)
+
+
+def build_faults(read_error_rate, backend_latency_ms, backend_failure_rate):
+    if read_error_rate is None and not backend_latency_ms and not backend_failure_rate:
+        return None
+    return FaultInjector(read_error_rate, {None: backend_latency_ms / 1000}, {None: backend_failure_rate})
+
+
+def run_worker(card_count, session_count, seed, fault_settings):
+    # Процесс пула строит свою базу карт и гоняет сессии на своем терминале;
+    # время считается без запуска процесса и построения карт
+    cards = build_cards(card_count, seed)
+    faults = build_faults(*fault_settings)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        started = time.perf_counter()
+        samples = run_sessions(_new_atm(seed, faults), cards, session_count, seed)
+        return samples, time.perf_counter() - started, faults.stats() if faults is not None else None
+
+
+def merge_samples(sample_sets):
+    merged = {}
+    for samples in sample_sets:
+        for operation, durations in samples.items():
+            merged.setdefault(operation, []).extend(durations)
+    return merged
+
+
+def percentile(sorted_durations, fraction):
+    index = max(math.ceil(fraction * len(sorted_durations)) - 1, 0)
+    return sorted_durations[index]
+
+
+def build_report(config, samples, elapsed, session_count):
+    operation_count = sum(len(durations) for durations in samples.values())
+    by_type = {}
+    for operation, durations in sorted(samples.items()):
+        durations.sort()
+        by_type[operation] = {
+            "count": len(durations),
+            "p50_us": round(percentile(durations, 0.50) / 1000, 2),
+            "p95_us": round(percentile(durations, 0.95) / 1000, 2),
+            "p99_us": round(percentile(durations, 0.99) / 1000, 2),
+            "max_us": round(durations[-1] / 1000, 2),
+        }
+    return {
+        "config": config,
+        "elapsed_seconds": round(elapsed, 3),
+        "sessions": session_count,
+        "operations": operation_count,
+        "sessions_per_second": round(session_count / elapsed, 1),
+        "ops_per_second": round(operation_count / elapsed, 1),
+        "operations_by_type": by_type,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки: сессии ATM, пропускная способность и задержки")
+    parser.add_argument("--cards", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=20000, help="всего сессий")
+    parser.add_argument("--mode", choices=("inprocess", "threads", "processes"), default="inprocess",
+                        help="один терминал в процессе, терминалы в потоках (ATMFleet) или пул процессов")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="потоков или процессов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--read-error-rate", type=float, help="доля ошибок чтения карты (по умолчанию как в ATM)")
+    parser.add_argument("--backend-latency-ms", type=float, default=0.0, help="задержка банковского сервера на операцию")
+    parser.add_argument("--backend-failure-rate", type=float, default=0.0, help="доля отказов банковского сервера")
+    parser.add_argument("--output", help="файл для отчета JSON, по умолчанию stdout")
+    args = parser.parse_args()
+
+    workers = 1 if args.mode == "inprocess" else args.workers
+    per_worker = args.sessions // workers
+    config = {"mode": args.mode, "workers": workers, "cards": args.cards, "seed": args.seed,
+              "read_error_rate": args.read_error_rate, "backend_latency_ms": args.backend_latency_ms,
+              "backend_failure_rate": args.backend_failure_rate, "python": sys.version.split()[0]}
+    fault_settings = (args.read_error_rate, args.backend_latency_ms, args.backend_failure_rate)
+
+    if args.mode == "processes":
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_worker, args.cards, per_worker, args.seed + i, fault_settings)
+                       for i in range(workers)]
+            sample_sets, worker_times, worker_faults = zip(*(future.result() for future in futures))
+            elapsed = max(worker_times)
+            fault_stats = None
+            if worker_faults[0] is not None:
+                fault_stats = {key: sum(stats[key] for stats in worker_faults) for key in worker_faults[0]}
+    else:
+        cards = build_cards(args.cards, args.seed)
+        faults = build_faults(*fault_settings)
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            started = time.perf_counter()
+            if args.mode == "threads":
+                fleet = ATMFleet(cards, workers, initial_atm_cash=1e12, hourly_withdrawal_limit=math.inf,
+                                 seed=args.seed, faults=faults)
+                sample_sets = fleet.run(lambda atm: run_sessions(atm, cards, per_worker, args.seed))
+            else:
+                sample_sets = [run_sessions(_new_atm(args.seed, faults), cards, per_worker, args.seed)]
+            elapsed = time.perf_counter() - started
+        fault_stats = faults.stats() if faults is not None else None
+
+    report = build_report(config, merge_samples(sample_sets), elapsed, per_worker * workers)
+    if fault_stats is not None:
+        report["faults"] = fault_stats
+    report_text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as report_file:
+            report_file.write(report_text + "\n")
+    else:
+        print(report_text)
+
+
+if __name__ == "__main__":
+    main()
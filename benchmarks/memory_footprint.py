@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import CreditCard, DebitCard, SIMULATION_PIN_HASHER, set_default_pin_hasher
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def measure_bytes_per_card(card_count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cards = []
+    for i in range(card_count):
+        card_number = f"{i:016d}"
+        if i % 2:
+            cards.append(CreditCard(card_number, "0000", 100.0, 1000.0, True, 'partial', "Тест"))
+        else:
+            cards.append(DebitCard(card_number, "0000", 100.0, True, 'partial', "Тест"))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Номер карты и список карт считаем отдельно, они не зависят от устройства класса
+    return (after - before) / card_count, cards
+
+
+def measure_bytes_per_transaction(card_count, transactions_per_card):
+    cards = [DebitCard(f"{i:016d}", "0000", 100.0, True) for i in range(card_count)]
+    for card in cards:
+        card.add_transaction("Пополнение", 1.0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for card in cards:
+        for j in range(transactions_per_card):
+            card.balance += j
+            card.add_transaction("Пополнение", float(j))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / (card_count * transactions_per_card)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка памяти на карту и на операцию")
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=100)
+    args = parser.parse_args()
+
+    bytes_per_card, _ = measure_bytes_per_card(args.cards)
+    bytes_per_transaction = measure_bytes_per_transaction(args.cards // 100 or 1, args.transactions)
+    print(f"Байт на карту (пустая история): {bytes_per_card:.1f}")
+    print(f"Байт на операцию: {bytes_per_transaction:.1f}")
+
+
+if __name__ == "__main__":
+    main()
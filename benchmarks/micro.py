@@ -0,0 +1,147 @@
+import argparse
+import json
+import math
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATM, CREDIT_PENALTY_PERIOD_SECONDS, HISTORY_RETENTION_SECONDS, SIMULATION_PIN_HASHER, CreditCard,
+                     DebitCard, NullReceiptSink, set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+# Микробенчмарки горячих путей Card, CreditCard и ATM. Результат - лучшее время одного вызова
+# в наносекундах; с --baseline сравнивается с сохраненным прогоном и завершается с кодом 1,
+# если какой-то путь стал медленнее больше чем на --threshold.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _add_transaction(history_size):
+    # История держится постоянного размера: каждая новая запись вытесняет самую старую
+    card = DebitCard("0000000000000001", "0000", 0.0, True)
+    step = HISTORY_RETENTION_SECONDS // history_size
+    timestamps = iter(range(0, 2 ** 62, step))
+    for _ in range(history_size):
+        card.add_transaction("Пополнение", 1.0, next(timestamps))
+
+    def run():
+        card.add_transaction("Пополнение", 1.0, next(timestamps))
+    return run
+
+
+for _size in (10, 1000, 100000):
+    benchmark(f"add_transaction[{_size}]")(lambda size=_size: _add_transaction(size))
+
+
+def _history_string(history_size):
+    card = DebitCard("0000000000000001", "0000", 0.0, True)
+    for i in range(history_size):
+        card.balance += 1.0
+        card.add_transaction("Пополнение" if i % 2 else "Снятие", 1.0)
+    return card.get_history_as_string
+
+
+for _size in (30, 1000):
+    benchmark(f"get_history_as_string[{_size}]")(lambda size=_size: _history_string(size))
+
+
+@benchmark("CreditCard.withdraw near limit, declined")
+def _credit_withdraw_declined():
+    card = CreditCard("0000000000000001", "0000", -995.0, 1000.0)
+    return lambda: card.withdraw(10.0, 1e12)
+
+
+@benchmark("CreditCard.withdraw near limit, approved")
+def _credit_withdraw_approved():
+    card = CreditCard("0000000000000001", "0000", -995.0, 1000.0)
+
+    def run():
+        card.balance = -995.0
+        card.withdraw(0.01, 1e12)
+    return run
+
+
+@benchmark("CreditCard._apply_penalty_if_negative")
+def _apply_penalty():
+    card = CreditCard("0000000000000001", "0000", -500.0, 1000.0)
+
+    def run():
+        card.balance = -500.0
+        card.last_accrual_timestamp -= 3 * CREDIT_PENALTY_PERIOD_SECONDS
+        card._apply_penalty_if_negative()
+    return run
+
+
+def _atm_with_card():
+    atm = ATM(initial_atm_cash=1e12, hourly_withdrawal_limit=math.inf, receipt_sink=NullReceiptSink())
+    atm.current_card = DebitCard("0000000000000001", "0000", 1e12)
+    return atm
+
+
+@benchmark("ATM.perform_withdrawal")
+def _perform_withdrawal():
+    atm = _atm_with_card()
+    return lambda: atm.perform_withdrawal("0.01")
+
+
+@benchmark("ATM.perform_withdrawal, bad amount")
+def _perform_withdrawal_bad_amount():
+    atm = _atm_with_card()
+    return lambda: atm.perform_withdrawal("12,5")
+
+
+def measure(setup, repeat):
+    timer = timeit.Timer(setup())
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки Card, CreditCard и ATM со сравнением с базовым прогоном")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--save", help="куда сохранить результаты JSON (новый базовый прогон)")
+    parser.add_argument("--threshold", type=float, default=0.20, help="допустимое замедление, доля (0.20 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="запускать только бенчмарки, содержащие строку")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    results = {}
+    regressions = []
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = nanoseconds = round(measure(setup, args.repeat), 1)
+        line = f"{name:<44} {nanoseconds:>12.1f} нс"
+        if name in baseline:
+            ratio = nanoseconds / baseline[name]
+            line += f"   база {baseline[name]:>12.1f} нс  x{ratio:.2f}"
+            if ratio > 1 + args.threshold:
+                regressions.append(name)
+                line += "  РЕГРЕССИЯ"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as results_file:
+            json.dump({"python": sys.version.split()[0], "results": results}, results_file, ensure_ascii=False,
+                      indent=2)
+    if regressions:
+        print(f"Замедлились больше чем на {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
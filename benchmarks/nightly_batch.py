@@ -0,0 +1,43 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (CREDIT_PENALTY_PERIOD_SECONDS, CreditCard, DebitCard, SIMULATION_PIN_HASHER,
+                     run_nightly_penalty_batch, set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def build_cards(card_count):
+    cards = {}
+    for i in range(card_count):
+        card_number = f"{i:016d}"
+        if i % 4 == 0:
+            cards[card_number] = DebitCard(card_number, "0000", 100.0)
+        else:
+            card = CreditCard(card_number, "0000", -float(i % 1000), 1000.0)
+            card.last_accrual_timestamp -= (i % 3) * CREDIT_PENALTY_PERIOD_SECONDS
+            cards[card_number] = card
+    return cards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время ночного расчета пени по кредитным картам")
+    parser.add_argument("--cards", type=int, default=1000000)
+    args = parser.parse_args()
+
+    cards = build_cards(args.cards)
+    started = time.perf_counter()
+    charged_cards, total_penalty = run_nightly_penalty_batch(cards)
+    elapsed = time.perf_counter() - started
+    print(f"NumPy: {'да' if importlib.util.find_spec('numpy') is not None else 'нет'}")
+    print(f"Карт: {args.cards}, начислено пени: {charged_cards}, сумма: {total_penalty:.2f}")
+    print(f"Время: {elapsed:.3f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import PBKDF2_ITERATIONS, SCRYPT_N, SCRYPT_P, SCRYPT_R, PinHasher, PinVerifier, verify_pin
+
+# Проверок PIN в секунду при выбранной стоимости KDF: на одном ядре и в PinVerifier
+# с разным числом потоков (или процессов). Сессии подают проверки из своих потоков,
+# как терминалы ATMFleet или пул потоков ATMServer.
+
+
+def run_sessions(verifier, pin_hash, sessions, verifications):
+    per_session = verifications // sessions
+    latencies = []
+    lock = threading.Lock()
+
+    def session():
+        own = []
+        for i in range(per_session):
+            started = time.perf_counter()
+            verifier.verify("0000" if i % 10 else "9999", pin_hash)
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверки PIN в секунду при заданной стоимости KDF")
+    parser.add_argument("--scheme", choices=("scrypt", "pbkdf2_sha256"), default="scrypt")
+    parser.add_argument("--n", type=int, default=SCRYPT_N, help="scrypt: число блоков (степень двойки)")
+    parser.add_argument("--r", type=int, default=SCRYPT_R)
+    parser.add_argument("--p", type=int, default=SCRYPT_P)
+    parser.add_argument("--iterations", type=int, default=PBKDF2_ITERATIONS, help="pbkdf2: число итераций")
+    parser.add_argument("--workers", default=None, help="размеры пула через запятую (по умолчанию 1..число ядер)")
+    parser.add_argument("--sessions", type=int, default=32, help="одновременных сессий")
+    parser.add_argument("--verifications", type=int, default=320)
+    parser.add_argument("--processes", action="store_true", help="пул процессов вместо потоков")
+    args = parser.parse_args()
+
+    hasher = PinHasher(args.scheme, n=args.n, r=args.r, p=args.p, iterations=args.iterations)
+    pin_hash = hasher.hash("0000")
+    cores = os.cpu_count() or 1
+    print(f"{pin_hash.rsplit('$', 2)[0]}, ядер: {cores}")
+
+    rounds = max(3, args.verifications // 20)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        verify_pin("0000", pin_hash)
+    single = (time.perf_counter() - started) / rounds
+    print(f"Одна проверка в текущем потоке: {single * 1000:.1f} мс, {1 / single:.1f} проверок/с на ядро")
+
+    worker_counts = [int(value) for value in args.workers.split(",")] if args.workers else sorted(
+        {1, 2, max(1, cores // 2), cores})
+    for workers in worker_counts:
+        with PinVerifier(workers, use_processes=args.processes) as verifier:
+            verifier.verify("0000", pin_hash)  # запуск потоков или процессов не входит в замер
+            rate, median, p99 = run_sessions(verifier, pin_hash, args.sessions, args.verifications)
+        print(f"Пул {workers:>3}: {rate:7.1f} проверок/с ({rate / workers:.1f} на поток), "
+              f"ожидание сессии: медиана {median * 1000:.0f} мс, p99 {p99 * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
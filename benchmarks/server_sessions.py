@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import ATMClient, ATMServer, DebitCard, SIMULATION_PIN_HASHER, set_default_pin_hasher
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+_SIGNS = {"withdraw": -1.0, "deposit": 1.0}
+
+
+async def run_terminal(host, port, card_numbers, sessions, seed):
+    rng = random.Random(seed)
+    cash_moved = 0.0
+    requests = 0
+    async with await ATMClient().connect(host, port) as client:
+        for _ in range(sessions):
+            card_number = rng.choice(card_numbers)
+            while not (await client.request("insert_card", card_number=card_number))["ok"]:
+                pass
+            await client.request("enter_pin", pin="0000")
+            requests += 2
+            for _ in range(rng.randint(1, 4)):
+                op = rng.choice(("withdraw", "deposit", "balance"))
+                amount = rng.randint(1, 20)
+                response = await client.request(op, amount=str(amount))
+                requests += 1
+                if response["ok"] and op in _SIGNS:
+                    cash_moved += _SIGNS[op] * amount
+            await client.request("cancel")
+            requests += 1
+    return requests, cash_moved
+
+
+async def check_idle_timeout(cards, card_number, idle_timeout):
+    server = ATMServer(cards, idle_timeout=idle_timeout)
+    host, port = await server.start()
+    async with await ATMClient().connect(host, port) as client:
+        while not (await client.request("insert_card", card_number=card_number))["ok"]:
+            pass
+        await asyncio.sleep(idle_timeout * 2)
+        event = await asyncio.wait_for(client.read_message(), idle_timeout)
+        while event is not None and event.get("event") != "timeout":
+            event = await asyncio.wait_for(client.read_message(), idle_timeout)
+    await server.close()
+    return event
+
+
+async def main_async(args):
+    cards = {f"{i:016d}": DebitCard(f"{i:016d}", "0000", 10000.0, True) for i in range(args.cards)}
+    initial_balance = sum(card.balance for card in cards.values())
+    server = ATMServer(cards)
+    host, port = await server.start()
+    card_numbers = sorted(cards)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_terminal(host, port, card_numbers, args.sessions, seed)
+                                     for seed in range(args.terminals)))
+    elapsed = time.perf_counter() - started
+    requests = sum(result[0] for result in results)
+    print(f"Терминалов: {args.terminals}, запросов: {requests}, {elapsed:.2f} с, {requests / elapsed:.0f} запр/с")
+
+    balance_change = sum(card.balance for card in cards.values()) - initial_balance
+    cash_moved = sum(result[1] for result in results)
+    print(f"Изменение балансов: {balance_change:.2f}, по ответам сервера: {cash_moved:.2f}")
+
+    await server.close()
+
+    event = await check_idle_timeout(cards, card_numbers[0], args.idle_timeout)
+    print(f"Простой с картой: {event['message'] if event else 'событие не получено'}")
+    if abs(balance_change - cash_moved) > 1e-6 or event is None:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Множество сетевых терминалов против одного сервера")
+    parser.add_argument("--terminals", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=5, help="сессий на терминал")
+    parser.add_argument("--cards", type=int, default=100)
+    parser.add_argument("--idle-timeout", type=float, default=0.2, help="таймаут простоя для проверки возврата карты, с")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATM, CreditCard, DebitCard, NullReceiptSink, RecordingATM, SIMULATION_PIN_HASHER, SessionRecorder,
+                     VirtualClock, derive_rng, replay_session_log, set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+START_TIMESTAMP = 1700000000
+
+
+def build_cards(card_count, seed, clock):
+    rng = derive_rng(seed, "cards")
+    cards = {}
+    for i in range(card_count):
+        card_number = f"{i:016d}"
+        if i % 3 == 0:
+            cards[card_number] = CreditCard(card_number, "0000", rng.uniform(-500, 1000), 5000.0, i % 2 == 0,
+                                            clock=clock, rng=rng)
+        else:
+            cards[card_number] = DebitCard(card_number, "0000", rng.uniform(0, 5000), i % 2 == 0, clock=clock,
+                                           rng=rng)
+    return cards
+
+
+def record_sessions(path, cards, clock, session_count, terminal_count, seed):
+    rng = derive_rng(seed, "sessions")
+    card_numbers = sorted(cards)
+    with SessionRecorder(path) as recorder:
+        terminals = [RecordingATM(ATM(1e9, math.inf, receipt_sink=NullReceiptSink(), terminal_id=i, clock=clock,
+                                      rng=derive_rng(seed, "atm", i)), recorder)
+                     for i in range(terminal_count)]
+        for _ in range(session_count):
+            clock.advance(rng.randint(1, 600))
+            atm = rng.choice(terminals)
+            if not atm.insert_card(cards[rng.choice(card_numbers)])[0]:
+                continue
+            if atm.process_pin_entry("0000" if rng.random() < 0.95 else "1234")[0] != "SUCCESS":
+                atm.cancel_operation_and_eject_card()
+                continue
+            for _ in range(rng.randint(1, 4)):
+                amount = str(rng.randint(1, 300) * 10)
+                choice = rng.random()
+                if choice < 0.35:
+                    atm.perform_withdrawal(amount)
+                elif choice < 0.55:
+                    atm.perform_cash_deposit_to_card(amount)
+                elif choice < 0.65:
+                    atm.perform_transfer_from_bank_to_card(amount)
+                elif choice < 0.75:
+                    atm.perform_transfer_to_card(cards[rng.choice(card_numbers)], amount)
+                elif choice < 0.95:
+                    atm.request_card_balance()
+                else:
+                    atm.request_card_history()
+            atm.cancel_operation_and_eject_card()
+        return recorder.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись сессий ATM и их ускоренное воспроизведение с проверкой")
+    parser.add_argument("--cards", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--terminals", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.bin")
+        clock = VirtualClock(START_TIMESTAMP)
+        started = time.perf_counter()
+        calls = record_sessions(path, build_cards(args.cards, args.seed, clock), clock, args.sessions,
+                                args.terminals, args.seed)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path)
+        print(f"Записано вызовов: {calls} за {elapsed:.2f} с, файл {size / 1024 / 1024:.1f} МБ "
+              f"({size / calls:.1f} байт на вызов)")
+
+        replay_clock = VirtualClock(START_TIMESTAMP)
+        report = replay_session_log(path, build_cards(args.cards, args.seed, replay_clock), replay_clock)
+        print(f"Воспроизведено вызовов: {report.calls} за {report.elapsed:.2f} с "
+              f"({report.calls / report.elapsed * 60 / 1e6:.2f} млн в минуту)")
+        print(f"Расхождений: {len(report.mismatches)}")
+        for mismatch in report.mismatches[:10]:
+            print(f"  {mismatch}")
+        if report.mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATM, CreditCard, DebitCard, NullReceiptSink, OperationJournal, SIMULATION_PIN_HASHER, restore,
+                     set_default_pin_hasher, take_snapshot)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def build_cards(card_count, transactions_per_card):
+    cards = {}
+    for i in range(card_count):
+        card_number = f"{i:016d}"
+        if i % 2:
+            card = CreditCard(card_number, "0000", 500.0, 1000.0, True, 'partial', f"Клиент {i}")
+        else:
+            card = DebitCard(card_number, "0000", 500.0, True, 'partial', f"Клиент {i}")
+        for _ in range(transactions_per_card):
+            card.balance += 10.0
+            card.add_transaction("Пополнение", 10.0)
+        cards[card_number] = card
+    return cards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Холодный старт из снимка и хвоста журнала")
+    parser.add_argument("--cards", type=int, default=1000000)
+    parser.add_argument("--transactions", type=int, default=2, help="операций в истории каждой карты")
+    parser.add_argument("--journal-tail", type=int, default=10000, help="операций в журнале после снимка")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cards = build_cards(args.cards, args.transactions)
+        journal_path = os.path.join(directory, "journal.bin")
+        journal = OperationJournal(journal_path, synchronous=False)
+
+        started = time.perf_counter()
+        snapshot_path = take_snapshot(directory, cards, journal)
+        print(f"Запись снимка: {time.perf_counter() - started:.3f} с, "
+              f"{os.path.getsize(snapshot_path) / 1024 / 1024:.1f} МБ")
+
+        atm = ATM(1e12, receipt_sink=NullReceiptSink(), journal=journal)
+        step = max(args.cards // max(args.journal_tail, 1), 1)
+        for i in range(args.journal_tail):
+            atm.current_card = cards[f"{(i * step) % args.cards:016d}"]
+            atm.perform_cash_deposit_to_card("1")
+        journal.close()
+        del cards
+
+        started = time.perf_counter()
+        restored_cards, journal_seq, _ = restore(directory, journal_path)
+        elapsed = time.perf_counter() - started
+        print(f"Холодный старт: {elapsed:.3f} с, карт: {len(restored_cards)}, "
+              f"доиграно записей журнала: {journal_seq}")
+        restored_cards.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import DebitCard, SIMULATION_PIN_HASHER, TransactionLogFile, set_default_pin_hasher, write_transaction_log
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def build_cards(card_count, transactions_per_card):
+    cards = {}
+    for i in range(card_count):
+        card = DebitCard(f"{i:016d}", "0000", 0.0, True)
+        for j in range(transactions_per_card):
+            trans_type = "Снятие" if j % 3 == 0 else "Пополнение"
+            card.balance += 1.0
+            card.add_transaction(trans_type, float(j % 50))
+        cards[card.card_number] = card
+    return cards
+
+
+def timed(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f"{label:<52} {time.perf_counter() - started:8.3f} с  ({result})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Чтение истории из файла операций через mmap")
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=20, help="операций на карту")
+    args = parser.parse_args()
+
+    cards = build_cards(args.cards, args.transactions)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "transactions.bin")
+        timed("Запись файла операций", lambda: write_transaction_log(path, cards))
+
+        log_file = TransactionLogFile(path)
+        sample = [f"{i:016d}" for i in range(0, args.cards, max(args.cards // 1000, 1))]
+        timed("История 1000 карт: get_history_as_string",
+              lambda: sum(len(cards[number].get_history_as_string()) for number in sample))
+        timed("История 1000 карт: срез memoryview из файла",
+              lambda: sum(len(log_file.card_records(number)) for number in sample))
+
+        def python_scan():
+            total = 0.0
+            for card in cards.values():
+                for _, trans_type, amount, _ in card.transactions:
+                    if trans_type == "Снятие":
+                        total += amount
+            return round(total, 2)
+
+        timed("Сумма снятий по всем картам: кортежи в памяти", python_scan)
+        if importlib.util.find_spec("numpy") is not None:
+            def numpy_scan():
+                records = log_file.to_numpy()
+                withdrawal_code = log_file.type_names().index("Снятие")
+                result = round(float(records["amount"][records["type_code"] == withdrawal_code].sum()), 2)
+                del records
+                return result
+
+            timed("Сумма снятий по всем картам: NumPy по mmap", numpy_scan)
+        log_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+from collections import Counter
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import (ATM, CreditCard, DebitCard, NullReceiptSink, SIMULATION_PIN_HASHER, VirtualClock,
+                     run_nightly_penalty_batch, set_default_pin_hasher)
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Моделирование месяцев работы терминалов на виртуальных часах")
+    parser.add_argument("--cards", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--sessions-per-day", type=int, default=2000)
+    parser.add_argument("--terminals", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clock = VirtualClock()
+    cards = {}
+    for i in range(args.cards):
+        card_number = f"{i:016d}"
+        if i % 3 == 0:
+            cards[card_number] = CreditCard(card_number, "0000", rng.uniform(-500, 1000), 5000.0, True, clock=clock)
+        else:
+            cards[card_number] = DebitCard(card_number, "0000", rng.uniform(0, 20000), True, clock=clock)
+    terminals = [ATM(initial_atm_cash=1e9, hourly_withdrawal_limit=math.inf, receipt_sink=NullReceiptSink(),
+                     terminal_id=i, clock=clock) for i in range(args.terminals)]
+    card_numbers = sorted(cards)
+    session_step = DAY_SECONDS // args.sessions_per_day
+
+    outcomes = Counter()
+    total_penalty = 0.0
+    started = time.perf_counter()
+    for _ in range(args.days):
+        for _ in range(args.sessions_per_day):
+            clock.advance(session_step)
+            atm = rng.choice(terminals)
+            if not atm.insert_card(cards[rng.choice(card_numbers)])[0]:
+                continue
+            atm.process_pin_entry("0000")
+            if rng.random() < 0.6:
+                result = atm.perform_withdrawal(str(rng.choice((500, 2000, 10000, 30000))))
+            else:
+                result = atm.perform_cash_deposit_to_card(str(rng.choice((100, 1000, 5000))))
+            outcomes[f"{result.operation.name} {result.reason.name}"] += 1
+            atm._eject_card_to_user()
+        total_penalty += run_nightly_penalty_batch(cards, clock=clock)[1]
+    elapsed = time.perf_counter() - started
+
+    sessions = args.days * args.sessions_per_day
+    print(f"Смоделировано {args.days} дн., {sessions} сессий за {elapsed:.2f} с ({sessions / elapsed:.0f} сессий/с)")
+    print(f"Строк истории в памяти: {sum(len(card.transactions) for card in cards.values())} "
+          f"(хранятся последние 30 дней)")
+    print(f"Начислено пени: {total_penalty:.2f}")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome:<40} {count}")
+
+
+if __name__ == "__main__":
+    main()
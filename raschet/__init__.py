@@ -0,0 +1,46 @@
+import importlib
+import types
+
+from .atm import ATM, ATM_HOURLY_WITHDRAWAL_LIMIT, CARD_READ_ERROR_RATE, MAX_PIN_ATTEMPTS
+from .cards import (CREDIT_PENALTY_PERIOD_SECONDS, CREDIT_PENALTY_RATE, DAILY_WITHDRAWAL_LIMIT,
+                    DAILY_WITHDRAWAL_WINDOW_SECONDS, HISTORY_RETENTION_SECONDS, Card, CreditCard, DebitCard,
+                    run_nightly_penalty_batch)
+from .clock import SYSTEM_CLOCK, SystemClock, VirtualClock
+from .history import HISTORY_PAGE_SIZE, HistoryPager
+from .journal import OperationJournal, read_journal, replay_journal
+from .messages import format_balance, format_history_row, format_result, format_session_entry
+from .pins import (DEFAULT_PIN_HASHER, PBKDF2_ITERATIONS, SCRYPT_N, SCRYPT_P, SCRYPT_R, SIMULATION_PIN_HASHER,
+                   PinHasher, PinVerifier, hash_pin, is_pin_hash, set_default_pin_hasher, verify_pin)
+from .receipts import ConsoleReceiptSink, FileReceiptSink, MemoryReceiptSink, NullReceiptSink
+from .results import Operation, OperationResult, Reason, Status
+from .transactions import TRANSACTION_TYPES, SlidingWindowTotal, TransactionLog, get_transaction_type_code
+
+# Подсистемы с тяжелыми зависимостями (asyncio, sqlite3, mmap, json, concurrent.futures) загружаются
+# при первом обращении к их именам: import raschet загружает только ядро карт и банкомата
+_LAZY_MODULES = {
+    "archive": ("TransactionArchive",),
+    "faults": ("FaultInjector", "derive_rng"),
+    "fleet": ("ATMFleet", "CardLockTable"),
+    "lookup": ("CardIndex", "CardSearchResult"),
+    "recording": ("RecordingATM", "SessionRecorder", "read_session_log", "replay_session_log"),
+    "server": ("ATMClient", "ATMServer"),
+    "snapshot": ("SnapshotCardDatabase", "SnapshotScheduler", "restore", "take_snapshot", "write_snapshot"),
+    "storage": ("SQLiteCardStore", "describe_cards"),
+    "txlog": ("TransactionLogFile", "write_transaction_log"),
+}
+_LAZY_EXPORTS = {name: module_name for module_name, names in _LAZY_MODULES.items() for name in names}
+__all__ = sorted([name for name, value in globals().items()
+                  if not name.startswith("_") and not isinstance(value, types.ModuleType)] + list(_LAZY_EXPORTS))
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
@@ -0,0 +1,381 @@
+from datetime import datetime
+from itertools import chain
+import json
+import math
+import os
+import threading
+import time
+import zlib
+
+from .transactions import TRANSACTION_TYPES
+from .txlog import RECORD, RECORD_SIZE, _encode_card_number
+
+ARCHIVE_BLOCK_ROWS = 4096
+ARCHIVE_COMPRESSION_LEVEL = 6
+ARCHIVE_SYNC_INTERVAL = 0.5  # Как часто файл ожидающих записей сбрасывается fsync, секунд
+ARCHIVE_RETRY_INTERVAL = 5.0  # Пауза перед повтором неудавшейся записи блока, секунд
+
+_SEGMENT_SUFFIX = ".seg"
+_INDEX_SUFFIX = ".idx"
+_PENDING_PREFIX = "pending-"
+_PENDING_SUFFIX = ".rows"
+
+
+def get_month_key(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m")
+
+
+def _to_row(timestamp, trans_type, amount, balance_after):
+    return datetime.fromtimestamp(timestamp), trans_type, None if math.isnan(amount) else amount, balance_after
+
+
+def _next_month_timestamp(timestamp):
+    moment = datetime.fromtimestamp(timestamp)
+    if moment.month == 12:
+        first_day = datetime(moment.year + 1, 1, 1)
+    else:
+        first_day = datetime(moment.year, moment.month + 1, 1)
+    return int(first_day.timestamp())
+
+
+class TransactionArchive:
+    # Архив операций старше срока хранения в памяти. Каждый месяц - отдельный файл сегмента
+    # из сжатых блоков записей формата txlog.RECORD, отсортированных по номеру карты и времени.
+    # Рядом лежит индекс - по строке JSON на блок: смещение и длина блока, период и для каждой
+    # карты диапазон ее записей внутри блока. Новый блок дописывает в индекс одну строку.
+    # Индексы читаются только для месяцев из запрошенного периода, а блоки распаковываются
+    # только если в них есть записи нужной карты.
+    # Вытесненные записи копятся в памяти; когда набирается block_rows, их сжимает и пишет
+    # на диск фоновый поток, а add_rows под блокировкой карты только дописывает в буфер.
+    # Чтобы записи, уже удаленные из памяти карт, не пропали при сбое до записи блока, add_rows
+    # сразу дописывает их строкой JSON в файл ожидающих записей (pending-<поколение>.rows),
+    # а фоновый поток раз в sync_interval делает fsync. Файлы удаляются после записи блоков;
+    # блок помнит поколения своих записей, и при открытии архива из оставшихся файлов
+    # восстанавливаются только записи месяцев, для которых такого блока еще нет.
+    # Неудавшаяся запись блока повторяется через retry_interval, последняя ошибка - в flush_error.
+
+    def __init__(self, directory, block_rows=ARCHIVE_BLOCK_ROWS, compression_level=ARCHIVE_COMPRESSION_LEVEL,
+                 sync_interval=ARCHIVE_SYNC_INTERVAL, retry_interval=ARCHIVE_RETRY_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.block_rows = block_rows
+        self.compression_level = compression_level
+        self.sync_interval = sync_interval
+        self.retry_interval = retry_interval
+        self.blocks_read = 0
+        self.flush_error = None
+        self.flush_failures = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # Сбросы на диск идут по одному
+        self._pending = []
+        self._flushing = []  # Записи сбрасываемых сейчас блоков, еще не попавшие в индекс
+        self._generations = []  # Поколения файлов ожидающих записей, чьи записи лежат в _pending
+        self._pending_file = None  # Файл текущего поколения, последнего в _generations
+        self._unsynced = False
+        self._indexes = {}
+        self._months = None
+        self._closed = False
+        self._flusher = None  # Поток запускается при первом вытеснении
+        self._recover_pending()
+
+    def attach(self, card_database):
+        for card in card_database.values():
+            card.archive = self
+
+    def _path(self, month, suffix):
+        return os.path.join(self.directory, month + suffix)
+
+    def _pending_path(self, generation):
+        return os.path.join(self.directory, _PENDING_PREFIX + generation + _PENDING_SUFFIX)
+
+    def _recover_pending(self):
+        # Записи из файлов ожидающих записей, оставшихся после сбоя, без уже записанных в блоки
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith(_PENDING_PREFIX) and name.endswith(_PENDING_SUFFIX)):
+                continue
+            generation = name[len(_PENDING_PREFIX):-len(_PENDING_SUFFIX)]
+            rows = []
+            with open(self._pending_path(generation), encoding="utf-8") as pending_file:
+                for line in pending_file:
+                    try:
+                        card_number, card_rows = json.loads(line)
+                    except ValueError:
+                        continue  # Недописанная при сбое строка
+                    rows.extend((card_number, *row) for row in card_rows)
+            written_months = {month for month in {get_month_key(row[1]) for row in rows}
+                              if month in self._get_months() and any(
+                                  generation in block.get("pending", ()) for block in self._get_index(month)["blocks"])}
+            self._pending.extend(row for row in rows if get_month_key(row[1]) not in written_months)
+            self._generations.append(generation)
+        if self._generations:
+            self.flush()
+
+    def _get_months(self):
+        if self._months is None:
+            self._months = {name[:-len(_INDEX_SUFFIX)] for name in os.listdir(self.directory)
+                            if name.endswith(_INDEX_SUFFIX)}
+        return self._months
+
+    def _get_index(self, month):
+        index = self._indexes.get(month)
+        if index is None:
+            blocks = []
+            with open(self._path(month, _INDEX_SUFFIX), encoding="utf-8") as index_file:
+                for line in index_file:
+                    try:
+                        blocks.append(json.loads(line))
+                    except ValueError:
+                        continue  # Недописанная при сбое строка: ее блок не попал в индекс
+            index = self._indexes[month] = {"blocks": blocks}
+        return index
+
+    def add_rows(self, card_number, log, lo, hi):
+        type_codes = log.type_codes
+        rows = [(card_number, log.timestamps[i], TRANSACTION_TYPES[type_codes[i]], log.amounts[i], log.balances[i])
+                for i in range(lo, hi)]
+        line = json.dumps([card_number, [row[1:] for row in rows]], ensure_ascii=False, separators=(",", ":"))
+        with self._condition:
+            try:
+                if self._pending_file is None:
+                    generation = str(time.time_ns())
+                    self._pending_file = open(self._pending_path(generation), "a", encoding="utf-8")
+                    self._generations.append(generation)
+                self._pending_file.write(line + "\n")
+                self._pending_file.flush()
+                self._unsynced = True
+            except OSError as error:
+                # Операция карты уже выполнена: записи остаются в памяти, ошибка видна в flush_error
+                self.flush_error = error
+            self._pending.extend(rows)
+            if not self._closed:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="archive-flusher", daemon=True)
+                    self._flusher.start()
+                if len(self._pending) >= self.block_rows:
+                    self._condition.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._pending) >= self.block_rows or self._closed,
+                                         self.sync_interval)
+                if self._closed:
+                    return
+                full = len(self._pending) >= self.block_rows
+            try:
+                self._sync_pending_file()
+                if full:
+                    self.flush()
+            except OSError as error:
+                # Записи остались в буфере и в файлах ожидающих записей, запись повторится
+                self.flush_error = error
+                self.flush_failures += 1
+                with self._condition:
+                    self._condition.wait_for(lambda: self._closed, self.retry_interval)
+            else:
+                if full:
+                    self.flush_error = None
+
+    def _sync_pending_file(self):
+        # Файл закрывается только при сбросе, который идет под _flush_lock
+        with self._flush_lock:
+            with self._lock:
+                pending_file = self._pending_file if self._unsynced else None
+                self._unsynced = False
+            if pending_file is not None:
+                os.fsync(pending_file.fileno())
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                if not batch and not self._generations:
+                    return
+                generations = self._generations
+                pending_file = self._pending_file
+                self._pending = []
+                self._flushing = batch
+                self._generations = []
+                self._pending_file = None
+            rows = sorted(batch, key=lambda row: (row[1], row[0]))
+            try:
+                if pending_file is not None:
+                    # Новые записи пойдут в файл следующего поколения
+                    try:
+                        os.fsync(pending_file.fileno())
+                    finally:
+                        pending_file.close()
+                # Записи делятся по месяцам один раз на границу месяца, а не для каждой строки
+                start = 0
+                while start < len(rows):
+                    month_end = _next_month_timestamp(rows[start][1])
+                    end = start
+                    while end < len(rows) and rows[end][1] < month_end:
+                        end += 1
+                    month = get_month_key(rows[start][1])
+                    with self._lock:
+                        # Индекс месяца читается с диска до дозаписи, чтобы новый блок не попал в него дважды
+                        if month in self._get_months():
+                            self._get_index(month)
+                    block = self._write_block(month, rows[start:end], generations)
+                    # Блок появляется в индексе и уходит из буфера одновременно для читателей
+                    with self._lock:
+                        self._indexes.setdefault(month, {"blocks": []})["blocks"].append(block)
+                        self._months.add(month)
+                        self._flushing = rows[end:]
+                    start = end
+            except BaseException:
+                with self._lock:
+                    self._pending[:0] = self._flushing
+                    self._flushing = []
+                    self._generations[:0] = generations
+                raise
+            for generation in generations:
+                os.remove(self._pending_path(generation))
+
+    def _write_block(self, month, rows, generations):
+        rows.sort(key=lambda row: (row[0], row[1]))
+        type_names = []
+        type_indexes = {}
+        cards = {}
+        data = bytearray(RECORD_SIZE * len(rows))
+        for position, (card_number, timestamp, trans_type, amount, balance_after) in enumerate(rows):
+            type_index = type_indexes.get(trans_type)
+            if type_index is None:
+                type_index = type_indexes[trans_type] = len(type_names)
+                type_names.append(trans_type)
+            RECORD.pack_into(data, position * RECORD_SIZE, timestamp, amount, balance_after, type_index,
+                             _encode_card_number(card_number))
+            card_range = cards.get(card_number)
+            if card_range is None:
+                cards[card_number] = [position, 1]
+            else:
+                card_range[1] += 1
+        compressed = zlib.compress(data, self.compression_level)
+
+        with open(self._path(month, _SEGMENT_SUFFIX), "ab") as segment_file:
+            offset = segment_file.tell()
+            segment_file.write(compressed)
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+
+        block = {
+            "offset": offset,
+            "length": len(compressed),
+            "rows": len(rows),
+            "min_timestamp": min(row[1] for row in rows),
+            "max_timestamp": max(row[1] for row in rows),
+            "type_names": type_names,
+            "cards": cards,
+            "pending": generations,
+        }
+        line = json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with open(self._path(month, _INDEX_SUFFIX), "a+b") as index_file:
+            if index_file.seek(0, os.SEEK_END):
+                # После сбоя последняя строка может быть оборвана: новая начинается с новой строки
+                index_file.seek(-1, os.SEEK_END)
+                if index_file.read(1) != b"\n":
+                    line = b"\n" + line
+            index_file.write(line)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        return block
+
+    def _read_block(self, month, block):
+        with open(self._path(month, _SEGMENT_SUFFIX), "rb") as segment_file:
+            segment_file.seek(block["offset"])
+            compressed = segment_file.read(block["length"])
+        self.blocks_read += 1
+        return zlib.decompress(compressed)
+
+    def query(self, card_number, start_timestamp=None, end_timestamp=None, trans_type=None):
+        # Возвращает записи карты в том же виде, что и TransactionLog.row, по возрастанию времени
+        first_month = None if start_timestamp is None else get_month_key(start_timestamp)
+        last_month = None if end_timestamp is None else get_month_key(end_timestamp)
+        # Список блоков и буферы берутся под блокировкой, а сами блоки читаются уже без нее:
+        # записанные блоки не меняются
+        blocks = []
+        with self._lock:
+            for month in sorted(self._get_months()):
+                if (first_month is not None and month < first_month) or (last_month is not None and month > last_month):
+                    continue
+                for block in self._get_index(month)["blocks"]:
+                    if card_number not in block["cards"]:
+                        continue
+                    if start_timestamp is not None and block["max_timestamp"] < start_timestamp:
+                        continue
+                    if end_timestamp is not None and block["min_timestamp"] >= end_timestamp:
+                        continue
+                    blocks.append((month, block))
+            rows = [row[1:] for row in chain(self._flushing, self._pending) if row[0] == card_number]
+
+        for month, block in blocks:
+            data = memoryview(self._read_block(month, block))
+            position, count = block["cards"][card_number]
+            type_names = block["type_names"]
+            for timestamp, amount, balance_after, type_index, _ in RECORD.iter_unpack(
+                    data[position * RECORD_SIZE:(position + count) * RECORD_SIZE]):
+                rows.append((timestamp, type_names[type_index], amount, balance_after))
+
+        result = []
+        for timestamp, row_type, amount, balance_after in sorted(rows, key=lambda row: row[0]):
+            if start_timestamp is not None and timestamp < start_timestamp:
+                continue
+            if end_timestamp is not None and timestamp >= end_timestamp:
+                continue
+            if trans_type is not None and row_type != trans_type:
+                continue
+            result.append(_to_row(timestamp, row_type, amount, balance_after))
+        return result
+
+    def count(self, card_number):
+        # Число записей карты в архиве по счетчикам индексов, без чтения блоков
+        with self._lock:
+            total = sum(1 for row in chain(self._flushing, self._pending) if row[0] == card_number)
+            for month in self._get_months():
+                for block in self._get_index(month)["blocks"]:
+                    card_range = block["cards"].get(card_number)
+                    if card_range is not None:
+                        total += card_range[1]
+        return total
+
+    def iter_newest_first(self, card_number, skip=0):
+        # Записи карты от новых к старым. Записи карты попадают в архив по порядку времени,
+        # поэтому самые новые лежат в несброшенном буфере, затем в последних блоках последних
+        # месяцев. Первые skip записей пропускаются по счетчикам индекса; распакованным
+        # в памяти держится не больше одного блока.
+        with self._lock:
+            pending = [row[1:] for row in chain(self._flushing, self._pending) if row[0] == card_number]
+            blocks = [(month, block) for month in sorted(self._get_months(), reverse=True)
+                      for block in reversed(self._get_index(month)["blocks"]) if card_number in block["cards"]]
+        pending.sort(key=lambda row: row[0], reverse=True)
+        for row in pending[skip:]:
+            yield _to_row(*row)
+        skip = max(0, skip - len(pending))
+
+        for month, block in blocks:
+            position, count = block["cards"][card_number]
+            if skip >= count:
+                skip -= count
+                continue
+            data = memoryview(self._read_block(month, block))
+            records = list(RECORD.iter_unpack(data[position * RECORD_SIZE:(position + count - skip) * RECORD_SIZE]))
+            skip = 0
+            type_names = block["type_names"]
+            for timestamp, amount, balance_after, type_index, _ in reversed(records):
+                yield _to_row(timestamp, type_names[type_index], amount, balance_after)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
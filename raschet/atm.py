@@ -0,0 +1,265 @@
+from contextlib import nullcontext
+from datetime import datetime
+import math
+
+from .clock import SYSTEM_CLOCK
+from .faults import DEFAULT_SEED, derive_rng
+from .history import HISTORY_PAGE_SIZE, HistoryPager
+from .journal import (OP_CARD_BLOCKED, OP_CARD_TRANSFER_IN, OP_CARD_TRANSFER_OUT, OP_DEPOSIT, OP_TRANSFER,
+                      OP_WITHDRAWAL)
+from .messages import format_result, format_session_entry
+from .receipts import ConsoleReceiptSink
+from .results import Operation, OperationResult, Reason, Status, error_result
+from .transactions import SlidingWindowTotal
+
+MAX_PIN_ATTEMPTS = 3
+ATM_HOURLY_WITHDRAWAL_LIMIT = 200000.0
+CARD_READ_ERROR_RATE = 0.03
+
+
+def _parse_amount(amount_string):
+    # Сумма из поля ввода или запроса сервера; None для нечисловых значений, бесконечности и NaN
+    try:
+        amount = float(amount_string)
+    except (TypeError, ValueError):
+        return None
+    return amount if math.isfinite(amount) else None
+
+
+class ATM:
+    def __init__(self, initial_atm_cash=50000.0, hourly_withdrawal_limit=ATM_HOURLY_WITHDRAWAL_LIMIT,
+                 receipt_sink=None, card_store=None, journal=None, terminal_id=0, card_locks=None, clock=None,
+                 rng=None, faults=None, pin_verifier=None):
+        self.current_card = None
+        self.pin_attempts = 0
+        self.cash_in_atm = float(initial_atm_cash)
+        self.session_transactions_for_receipt = []
+        self.hourly_withdrawal_limit = float(hourly_withdrawal_limit)
+        self.hourly_withdrawals = SlidingWindowTotal(60 * 60)
+        # Куда выводятся чеки: консоль, файл, память или окно Tk (см. raschet.receipts и raschet.gui)
+        self.receipt_sink = receipt_sink if receipt_sink is not None else ConsoleReceiptSink()
+        # Хранилище (например, SQLiteCardStore), куда записывается карта после каждого изменения
+        self.card_store = card_store
+        # Журнал операций (OperationJournal): каждое изменение денег записывается до ответа пользователю
+        self.journal = journal
+        self.terminal_id = terminal_id
+        # Общая таблица блокировок карт (CardLockTable), когда терминалы работают в потоках с одной базой карт
+        self.card_locks = card_locks
+        # Источник времени для лимитов, журнала и чеков (VirtualClock для моделирования)
+        self.clock = clock if clock is not None else SYSTEM_CLOCK
+        # Свой генератор терминала: прогоны с заданным seed воспроизводимы, потоки не делят общий random.
+        # Без rng поток выводится из DEFAULT_SEED и номера терминала.
+        self.rng = rng if rng is not None else derive_rng(DEFAULT_SEED, "atm", terminal_id)
+        # FaultInjector из raschet.faults: ошибки чтения карты, задержки и отказы банковского сервера
+        self.faults = faults
+        # PinVerifier из raschet.pins: общий ограниченный пул для проверки хеша PIN. Без него
+        # хеш считается в потоке, вызвавшем process_pin_entry
+        self.pin_verifier = pin_verifier
+
+    def insert_card(self, card_object):
+        if card_object.is_blocked:
+            return False, "Эта карта заблокирована."
+        if self.faults is not None:
+            read_failed = self.faults.card_read_fails(self.rng, CARD_READ_ERROR_RATE)
+        else:
+            read_failed = self.rng.random() < CARD_READ_ERROR_RATE
+        if read_failed:
+            return False, "Ошибка чтения карты. Попробуйте другую карту или вставьте эту еще раз."
+        self.current_card = card_object
+        self.pin_attempts = 0
+        self.session_transactions_for_receipt = []
+        return True, "Карта прочитана. Введите PIN-код."
+
+    def process_pin_entry(self, pin):
+        if not self.current_card:
+            return "NO_CARD", "Сначала вставьте карту."
+
+        if self.pin_verifier is not None:
+            pin_matches = self.pin_verifier.check(self.current_card, pin)
+        else:
+            pin_matches = self.current_card.check_pin(pin)
+        if pin_matches:
+            self.pin_attempts = 0
+            return "SUCCESS", "PIN-код верный."
+        else:
+            self.pin_attempts += 1
+            if self.pin_attempts >= MAX_PIN_ATTEMPTS:
+                with self._hold_cards(self.current_card):
+                    self.current_card.is_blocked = True
+                    self._journal_operation(OP_CARD_BLOCKED, self.current_card, 0.0)
+                    self._save_card(self.current_card)
+                self._confiscate_card("PIN-код неверно введен 3 раза.")
+                return "BLOCKED", "Неверный PIN-код. Карта заблокирована и изъята."
+            else:
+                attempts_left = MAX_PIN_ATTEMPTS - self.pin_attempts
+                return "FAILURE", f"Неверный PIN-код. Осталось попыток: {attempts_left}."
+
+    def perform_withdrawal(self, amount_string):
+        if not self.current_card: return error_result(Operation.WITHDRAWAL, Reason.NO_CARD)
+        amount = _parse_amount(amount_string)
+        if amount is None: return error_result(Operation.WITHDRAWAL, Reason.AMOUNT_FORMAT)
+        if amount <= 0: return OperationResult(Status.DECLINED, Operation.WITHDRAWAL, Reason.INVALID_AMOUNT)
+
+        if self._backend_fails(Operation.WITHDRAWAL):
+            return error_result(Operation.WITHDRAWAL, Reason.BACKEND_UNAVAILABLE)
+        now = self.clock.now()
+        if self.hourly_withdrawals.current(now) + amount > self.hourly_withdrawal_limit:
+            return OperationResult(Status.DECLINED, Operation.WITHDRAWAL, Reason.ATM_HOURLY_LIMIT_EXCEEDED)
+
+        with self._hold_cards(self.current_card):
+            result = self.current_card.withdraw(amount, self.cash_in_atm)
+            if result.status == Status.SUCCESS:
+                self.cash_in_atm -= amount
+                self.hourly_withdrawals.add(now, amount)
+                self.session_transactions_for_receipt.append((Operation.WITHDRAWAL, amount))
+                self._journal_operation(OP_WITHDRAWAL, self.current_card, amount)
+                self._save_card(self.current_card)
+        return result
+
+    def perform_cash_deposit_to_card(self, amount_string):
+        if not self.current_card: return error_result(Operation.DEPOSIT, Reason.NO_CARD)
+        amount = _parse_amount(amount_string)
+        if amount is None: return error_result(Operation.DEPOSIT, Reason.AMOUNT_FORMAT)
+        if self._backend_fails(Operation.DEPOSIT):
+            return error_result(Operation.DEPOSIT, Reason.BACKEND_UNAVAILABLE)
+
+        with self._hold_cards(self.current_card):
+            result = self.current_card.deposit_cash(amount)
+            if result.status == Status.SUCCESS:
+                self.cash_in_atm += amount
+                self.session_transactions_for_receipt.append((Operation.DEPOSIT, amount))
+                self._journal_operation(OP_DEPOSIT, self.current_card, amount)
+                self._save_card(self.current_card)
+        return result
+
+    def perform_transfer_from_bank_to_card(self, amount_string=None):
+        if not self.current_card: return error_result(Operation.TRANSFER, Reason.NO_CARD)
+
+        card = self.current_card
+        if card.deposit_type == 'full':
+            amount = None
+        elif card.deposit_type == 'partial':
+            if amount_string is None: return error_result(Operation.TRANSFER, Reason.AMOUNT_REQUIRED)
+            amount = _parse_amount(amount_string)
+            if amount is None: return error_result(Operation.TRANSFER, Reason.AMOUNT_FORMAT)
+        else:
+            return error_result(Operation.TRANSFER, Reason.UNKNOWN_DEPOSIT_TYPE)
+        if self._backend_fails(Operation.TRANSFER):
+            return error_result(Operation.TRANSFER, Reason.BACKEND_UNAVAILABLE)
+
+        with self._hold_cards(card):
+            result = card.transfer_from_bank_account(amount)
+            if result.status == Status.SUCCESS:
+                self.session_transactions_for_receipt.append((result.operation, result.amount))
+                self._journal_operation(OP_TRANSFER, card, result.amount)
+                self._save_card(card)
+        return result
+
+    def perform_transfer_to_card(self, target_card, amount_string):
+        if not self.current_card: return error_result(Operation.CARD_TRANSFER, Reason.NO_CARD)
+        amount = _parse_amount(amount_string)
+        if amount is None: return error_result(Operation.CARD_TRANSFER, Reason.AMOUNT_FORMAT)
+        if self._backend_fails(Operation.CARD_TRANSFER):
+            return error_result(Operation.CARD_TRANSFER, Reason.BACKEND_UNAVAILABLE)
+
+        card = self.current_card
+        with self._hold_cards(card, target_card):
+            result = card.transfer_to_card(target_card, amount)
+            if result.status == Status.SUCCESS:
+                self.session_transactions_for_receipt.append((Operation.CARD_TRANSFER, amount))
+                self._journal_operations((OP_CARD_TRANSFER_OUT, card, amount),
+                                         (OP_CARD_TRANSFER_IN, target_card, amount))
+                self._save_card(card)
+                self._save_card(target_card)
+        return result
+
+    def request_card_balance(self):
+        if not self.current_card: return error_result(Operation.BALANCE, Reason.NO_CARD)
+        if self._backend_fails(Operation.BALANCE):
+            return error_result(Operation.BALANCE, Reason.BACKEND_UNAVAILABLE)
+        self.session_transactions_for_receipt.append((Operation.BALANCE, None))
+        with self._hold_cards(self.current_card):
+            return self.current_card.get_balance_result()
+
+    def _backend_fails(self, operation):
+        return self.faults is not None and self.faults.backend_call_fails(operation, self.rng)
+
+    def _hold_cards(self, *cards):
+        if self.card_locks is None:
+            return nullcontext()
+        return self.card_locks.hold(*(card.card_number for card in cards))
+
+    def _journal_operation(self, op, card, amount):
+        self._journal_operations((op, card, amount))
+
+    def _journal_operations(self, *entries):
+        # Записи одной операции пишутся в журнал одной группой
+        if self.journal is not None:
+            self.journal.append_group(entries, self.cash_in_atm, self.terminal_id, self.clock.now())
+
+    def _save_card(self, card):
+        if self.card_store is not None:
+            self.card_store.save(card)
+
+    def request_card_history(self):
+        if not self.current_card: return "Нет карты."
+        if not self.current_card.history_enabled:
+            return "История операций для этой карты недоступна."
+        if self._backend_fails(Operation.HISTORY):
+            return format_result(error_result(Operation.HISTORY, Reason.BACKEND_UNAVAILABLE))
+
+        self.session_transactions_for_receipt.append((Operation.HISTORY, None))
+        return self.current_card.get_history_as_string()
+
+    def open_card_history(self, page_size=HISTORY_PAGE_SIZE):
+        # Постраничная история, включая архив: для длинных списков вместо request_card_history.
+        # Возвращает (сообщение, HistoryPager) или (сообщение об ошибке, None).
+        if not self.current_card: return "Нет карты.", None
+        if not self.current_card.history_enabled:
+            return "История операций для этой карты недоступна.", None
+        if self._backend_fails(Operation.HISTORY):
+            return format_result(error_result(Operation.HISTORY, Reason.BACKEND_UNAVAILABLE)), None
+
+        self.session_transactions_for_receipt.append((Operation.HISTORY, None))
+        pager = HistoryPager(self.current_card, page_size)
+        if not len(pager):
+            return "История операций пуста.", pager
+        return f"Операций в истории: {len(pager)}", pager
+
+    def print_receipt(self, receipt_text):
+        full_receipt_text = "--- ЧЕК ---\n"
+        full_receipt_text += f"Дата: {datetime.fromtimestamp(self.clock.now()).strftime('%d.%m.%Y %H:%M')}\n"
+        if self.current_card:
+            full_receipt_text += f"Карта: **** **** **** {self.current_card.card_number[-4:]}\n"
+        full_receipt_text += "----------------\n"
+        full_receipt_text += receipt_text + "\n----------------\nСпасибо!\n"
+
+        self.receipt_sink.emit(full_receipt_text)
+
+    def cancel_operation_and_eject_card(self):
+        operation_report = "Операция отменена.\n"
+        if self.session_transactions_for_receipt:
+            operation_report += "Выполненные операции:\n"
+            for operation, amount in self.session_transactions_for_receipt:
+                operation_report += f"- {format_session_entry(operation, amount)}\n"
+        else:
+            operation_report += "Операций не было.\n"
+
+        self.print_receipt(operation_report)
+        return self._eject_card_to_user()
+
+    def _eject_card_to_user(self):
+        card_to_return = self.current_card
+        self.current_card = None
+        self.pin_attempts = 0
+        self.session_transactions_for_receipt = []
+        if card_to_return:
+            return f"Карта {card_to_return.card_number} возвращена."
+        return "Нет карты для возврата."
+
+    def _confiscate_card(self, reason=""):
+        if self.current_card:
+            print(f"СИСТЕМНОЕ СООБЩЕНИЕ: Карта {self.current_card.card_number} изъята. Причина: {reason}")
+        self.current_card = None
+        self.pin_attempts = 0
+        self.session_transactions_for_receipt = []
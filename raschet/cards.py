@@ -0,0 +1,428 @@
+from array import array
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from itertools import chain
+import math
+
+from .clock import SYSTEM_CLOCK
+from .faults import DEFAULT_SEED, derive_uniform
+from .messages import HISTORY_COLUMNS, HISTORY_SEPARATOR, format_balance, format_history_row
+from .pins import hash_pin, verify_pin
+from .results import Operation, OperationResult, Reason, Status
+from .transactions import SlidingWindowTotal, TransactionLog, to_timestamp
+
+CREDIT_PENALTY_RATE = 0.01
+CREDIT_PENALTY_PERIOD_SECONDS = 24 * 60 * 60
+HISTORY_RETENTION_SECONDS = 30 * 24 * 60 * 60
+DAILY_WITHDRAWAL_LIMIT = 50000.0
+DAILY_WITHDRAWAL_WINDOW_SECONDS = 24 * 60 * 60
+
+
+class Card:
+    __slots__ = ('card_number', 'pin', 'balance', 'history_enabled', 'transactions', 'is_blocked', 'deposit_type',
+                 'simulated_bank_account', 'owner_name', 'daily_withdrawals', 'archive', 'clock')
+
+    def __init__(self, card_number, pin, initial_balance=0.0, history_enabled=False, deposit_type='partial',
+                 owner_name="", clock=None, rng=None, pin_hasher=None):
+        self.card_number = card_number
+        # Только соленый хеш PIN (см. raschet.pins); уже захешированный PIN из хранилища сохраняется как есть
+        self.pin = hash_pin(pin, pin_hasher)
+        self.balance = float(initial_balance)
+        self.history_enabled = history_enabled
+        self.transactions = TransactionLog()
+        self.is_blocked = False
+        self.deposit_type = deposit_type
+        # rng - свой генератор карты (random.Random) для воспроизводимых прогонов; без него
+        # сумма на счете выводится из DEFAULT_SEED и номера карты, а не из общего random
+        self.simulated_bank_account = rng.uniform(1000, 10000) if rng is not None else \
+            derive_uniform(DEFAULT_SEED, 1000, 10000, "card", card_number)
+        self.owner_name = owner_name
+        self.daily_withdrawals = None  # SlidingWindowTotal создается при первом снятии
+        self.archive = None  # TransactionArchive для операций старше срока хранения в памяти
+        self.clock = clock if clock is not None else SYSTEM_CLOCK  # SystemClock или VirtualClock из raschet.clock
+
+    def check_pin(self, entered_pin):
+        return verify_pin(entered_pin, self.pin)
+
+    def get_accrued_balance(self):
+        return self.balance
+
+    def get_credit_limit(self):
+        return None
+
+    def get_balance_as_string(self):
+        return format_balance(self.get_accrued_balance(), self.get_credit_limit())
+
+    def _success(self, operation, amount=None):
+        return OperationResult(Status.SUCCESS, operation, Reason.NONE, amount, self.get_accrued_balance(),
+                               self.get_credit_limit())
+
+    def _declined(self, operation, reason, available=None):
+        return OperationResult(Status.DECLINED, operation, reason, available=available)
+
+    def get_balance_result(self):
+        return self._success(Operation.BALANCE)
+
+    def add_transaction(self, trans_type, amount, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock.now()
+        self.transactions.append(timestamp, trans_type, amount, self.balance)
+
+        # Операции добавляются по времени, поэтому устаревшие всегда лежат в начале истории
+        on_expire = None if self.archive is None else self._archive_rows
+        self.transactions.expire_before(timestamp - HISTORY_RETENTION_SECONDS, on_expire)
+
+    def _archive_rows(self, log, lo, hi):
+        self.archive.add_rows(self.card_number, log, lo, hi)
+
+    def get_history_as_string(self):
+        if not self.history_enabled:
+            return "История операций для данной карты недоступна."
+        if not self.transactions:
+            return "История операций пуста."
+
+        history_report = "История операций (за последний месяц):\n"
+        history_report += HISTORY_COLUMNS + "\n"
+        history_report += HISTORY_SEPARATOR + "\n"
+        for row in reversed(self.transactions):
+            history_report += format_history_row(row) + "\n"
+        return history_report
+
+    def count_history(self):
+        # Все записи карты: в памяти и в архиве
+        count = len(self.transactions)
+        if self.archive is not None:
+            count += self.archive.count(self.card_number)
+        return count
+
+    def iter_history(self, offset=0):
+        # Записи от новых к старым, начиная с offset-й. Архив открывается, только когда
+        # записи в памяти закончились, и пропускает offset по индексу, не распаковывая блоки.
+        log = self.transactions
+        lo, hi = log.index_range()
+        for i in range(hi - 1 - offset, lo - 1, -1):
+            yield log.row(i)
+        if self.archive is not None:
+            yield from self.archive.iter_newest_first(self.card_number, max(0, offset - (hi - lo)))
+
+    def get_transactions(self, start=None, end=None, trans_type=None):
+        log = self.transactions
+        start_timestamp = to_timestamp(start)
+        end_timestamp = to_timestamp(end)
+        rows = [log.row(i) for i in log.select(start_timestamp, end_timestamp, trans_type)]
+        rows[:0] = self._query_archive(start_timestamp, end_timestamp, trans_type)
+        return rows
+
+    def _query_archive(self, start_timestamp, end_timestamp, trans_type):
+        # Записи архива за период. В архив обращаемся, только если период начинается не позже
+        # истории в памяти. Записи со временем первой записи в памяти и позже тоже берутся из архива,
+        # но те, что совпадают с записями в памяти, отбрасываются, чтобы не попасть в ответ дважды.
+        if self.archive is None:
+            return []
+        log = self.transactions
+        lo, hi = log.index_range()
+        hot_start = log.timestamps[lo] if lo < hi else None
+        if hot_start is not None and start_timestamp is not None and start_timestamp > hot_start:
+            return []
+        archived = self.archive.query(self.card_number, start_timestamp, end_timestamp, trans_type)
+        if hot_start is None or not archived or to_timestamp(archived[-1][0]) < hot_start:
+            return archived
+        hot_rows = Counter(log.row(i) for i in log.select(hot_start, end_timestamp, trans_type))
+        rows = []
+        for row in archived:
+            if hot_rows[row] and to_timestamp(row[0]) >= hot_start:
+                hot_rows[row] -= 1
+                continue
+            rows.append(row)
+        return rows
+
+    def get_daily_totals(self, start=None, end=None, trans_type=None):
+        log = self.transactions
+        start_timestamp = to_timestamp(start)
+        end_timestamp = to_timestamp(end)
+        timestamps = log.timestamps
+        amounts = log.amounts
+        # Записи архива идут первыми, сумма без значения в архиве - None, в памяти - NaN
+        rows = chain(((to_timestamp(moment), amount) for moment, _, amount, _ in
+                      self._query_archive(start_timestamp, end_timestamp, trans_type)),
+                     ((timestamps[i], amounts[i]) for i in log.select(start_timestamp, end_timestamp, trans_type)))
+        totals = {}
+        day_totals = None
+        day_timestamp = next_day_timestamp = None
+        for timestamp, amount in rows:
+            # Дата вычисляется только при переходе через полночь, а не для каждой записи
+            if next_day_timestamp is None or not day_timestamp <= timestamp < next_day_timestamp:
+                day = datetime.fromtimestamp(timestamp).date()
+                day_timestamp = to_timestamp(datetime.combine(day, datetime.min.time()))
+                next_day_timestamp = to_timestamp(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+                day_totals = totals.setdefault(day, [0, 0.0])
+            day_totals[0] += 1
+            if amount is not None and not math.isnan(amount):
+                day_totals[1] += amount
+        return {day: (count, total) for day, (count, total) in totals.items()}
+
+    def _get_withdrawn_today(self, now):
+        if self.daily_withdrawals is None:
+            self.daily_withdrawals = SlidingWindowTotal(DAILY_WITHDRAWAL_WINDOW_SECONDS)
+        return self.daily_withdrawals.current(now)
+
+    def rebuild_daily_withdrawals(self, now=None):
+        # Восстанавливает суточный лимит по истории после загрузки карты из хранилища
+        if now is None:
+            now = self.clock.now()
+        log = self.transactions
+        self.daily_withdrawals = None
+        for i in log.select(now - DAILY_WITHDRAWAL_WINDOW_SECONDS, None, "Снятие"):
+            self._get_withdrawn_today(now)
+            self.daily_withdrawals.add(log.timestamps[i], log.amounts[i])
+
+    def withdraw(self, amount, atm_cash_available):
+        print("Ошибка: метод снятия не реализован для базового класса карты")
+        return OperationResult(Status.ERROR, Operation.WITHDRAWAL, Reason.NOT_SUPPORTED)
+
+    def deposit_cash(self, amount):
+        if amount <= 0:
+            return self._declined(Operation.DEPOSIT, Reason.INVALID_AMOUNT)
+        self.balance += amount
+        self.add_transaction("Пополнение", amount)
+        return self._success(Operation.DEPOSIT, amount)
+
+    def transfer_from_bank_account(self, amount_to_transfer=None):
+        if self.deposit_type == 'full':
+            if self.simulated_bank_account <= 0:
+                return self._declined(Operation.TRANSFER_FULL, Reason.BANK_ACCOUNT_EMPTY)
+            transfer_amount = self.simulated_bank_account
+            self.balance += transfer_amount
+            self.simulated_bank_account = 0
+            self.add_transaction("Перевод с БС", transfer_amount)
+            return self._success(Operation.TRANSFER_FULL, transfer_amount)
+
+        elif self.deposit_type == 'partial':
+            if amount_to_transfer is None or amount_to_transfer <= 0:
+                return self._declined(Operation.TRANSFER, Reason.INVALID_AMOUNT)
+            if amount_to_transfer > self.simulated_bank_account:
+                return self._declined(Operation.TRANSFER, Reason.BANK_ACCOUNT_INSUFFICIENT,
+                                      self.simulated_bank_account)
+            self.balance += amount_to_transfer
+            self.simulated_bank_account -= amount_to_transfer
+            self.add_transaction("Перевод с БС", amount_to_transfer)
+            return self._success(Operation.TRANSFER, amount_to_transfer)
+
+        return OperationResult(Status.ERROR, Operation.TRANSFER, Reason.UNKNOWN_DEPOSIT_TYPE)
+
+    def _check_funds(self, operation, amount):
+        if amount > self.balance:
+            return self._declined(operation, Reason.INSUFFICIENT_FUNDS)
+        return None
+
+    def transfer_to_card(self, target_card, amount):
+        # Вызывающий код держит блокировки обеих карт (см. CardLockTable.hold)
+        if self.is_blocked or target_card.is_blocked:
+            return self._declined(Operation.CARD_TRANSFER, Reason.CARD_BLOCKED)
+        if amount <= 0:
+            return self._declined(Operation.CARD_TRANSFER, Reason.INVALID_AMOUNT)
+        declined = self._check_funds(Operation.CARD_TRANSFER, amount)
+        if declined is not None:
+            return declined
+
+        self.balance -= amount
+        self.add_transaction("Перевод на карту", amount)
+        target_card.receive_transfer(amount)
+        return self._success(Operation.CARD_TRANSFER, amount)
+
+    def receive_transfer(self, amount):
+        self.balance += amount
+        self.add_transaction("Перевод с карты", amount)
+
+
+class DebitCard(Card):
+    __slots__ = ()
+
+    def withdraw(self, amount, atm_cash_available):
+        if self.is_blocked:
+            return self._declined(Operation.WITHDRAWAL, Reason.CARD_BLOCKED)
+        if amount <= 0:
+            return self._declined(Operation.WITHDRAWAL, Reason.INVALID_AMOUNT)
+        if amount > self.balance:
+            return self._declined(Operation.WITHDRAWAL, Reason.INSUFFICIENT_FUNDS)
+        now = self.clock.now()
+        withdrawn_today = self._get_withdrawn_today(now)
+        if withdrawn_today + amount > DAILY_WITHDRAWAL_LIMIT:
+            return self._declined(Operation.WITHDRAWAL, Reason.DAILY_LIMIT_EXCEEDED,
+                                  DAILY_WITHDRAWAL_LIMIT - withdrawn_today)
+        if amount > atm_cash_available:
+            return self._declined(Operation.WITHDRAWAL, Reason.ATM_CASH_INSUFFICIENT)
+
+        self.balance -= amount
+        self.daily_withdrawals.add(now, amount)
+        self.add_transaction("Снятие", amount)
+        return self._success(Operation.WITHDRAWAL, amount)
+
+
+class CreditCard(Card):
+    __slots__ = ('credit_limit', 'last_accrual_timestamp')
+
+    def __init__(self, card_number, pin, initial_balance=0.0, credit_limit=1000.0, history_enabled=False,
+                 deposit_type='partial', owner_name="", clock=None, rng=None, pin_hasher=None):
+        super().__init__(card_number, pin, initial_balance, history_enabled, deposit_type, owner_name, clock, rng,
+                         pin_hasher)
+        self.credit_limit = float(credit_limit)
+        self.last_accrual_timestamp = self.clock.now()
+
+    def _get_accrual(self, now):
+        # Пени начисляются за каждый полный период с отрицательным балансом как сложные проценты,
+        # поэтому долг за любое число периодов считается одной формулой
+        if self.balance >= 0:
+            return 0, self.balance
+        periods = (now - self.last_accrual_timestamp) // CREDIT_PENALTY_PERIOD_SECONDS
+        if periods <= 0:
+            return 0, self.balance
+        return periods, self.balance * (1 + CREDIT_PENALTY_RATE) ** periods
+
+    def get_accrued_balance(self):
+        return self._get_accrual(self.clock.now())[1]
+
+    def get_credit_limit(self):
+        return self.credit_limit
+
+    def _apply_penalty_if_negative(self):
+        # Вызывается перед каждым изменением баланса и фиксирует пени за прошедшие периоды
+        now = self.clock.now()
+        periods, accrued_balance = self._get_accrual(now)
+        if self.balance >= 0:
+            self.last_accrual_timestamp = now
+        elif periods:
+            penalty_amount = self.balance - accrued_balance
+            self.balance = accrued_balance
+            self.last_accrual_timestamp += periods * CREDIT_PENALTY_PERIOD_SECONDS
+            self.add_transaction("Пени", penalty_amount)
+
+    def withdraw(self, amount, atm_cash_available):
+        if self.is_blocked:
+            return self._declined(Operation.WITHDRAWAL, Reason.CARD_BLOCKED)
+        self._apply_penalty_if_negative()
+
+        if amount <= 0:
+            return self._declined(Operation.WITHDRAWAL, Reason.INVALID_AMOUNT)
+
+        if (self.balance - amount) < -self.credit_limit:
+            return self._declined(Operation.WITHDRAWAL, Reason.CREDIT_LIMIT_EXCEEDED,
+                                  self.balance + self.credit_limit)
+
+        now = self.clock.now()
+        withdrawn_today = self._get_withdrawn_today(now)
+        if withdrawn_today + amount > DAILY_WITHDRAWAL_LIMIT:
+            return self._declined(Operation.WITHDRAWAL, Reason.DAILY_LIMIT_EXCEEDED,
+                                  DAILY_WITHDRAWAL_LIMIT - withdrawn_today)
+
+        if amount > atm_cash_available:
+            return self._declined(Operation.WITHDRAWAL, Reason.ATM_CASH_INSUFFICIENT)
+
+        self.balance -= amount
+        self.daily_withdrawals.add(now, amount)
+        self.add_transaction("Снятие", amount)
+        return self._success(Operation.WITHDRAWAL, amount)
+
+    def deposit_cash(self, amount):
+        self._apply_penalty_if_negative()
+        return super().deposit_cash(amount)
+
+    def transfer_from_bank_account(self, amount_to_transfer=None):
+        self._apply_penalty_if_negative()
+        return super().transfer_from_bank_account(amount_to_transfer)
+
+    def _check_funds(self, operation, amount):
+        if (self.balance - amount) < -self.credit_limit:
+            return self._declined(operation, Reason.CREDIT_LIMIT_EXCEEDED, self.balance + self.credit_limit)
+        return None
+
+    def transfer_to_card(self, target_card, amount):
+        if not self.is_blocked:
+            self._apply_penalty_if_negative()
+        return super().transfer_to_card(target_card, amount)
+
+    def receive_transfer(self, amount):
+        self._apply_penalty_if_negative()
+        super().receive_transfer(amount)
+
+
+def _import_numpy():
+    # NumPy загружается только для пакетного расчета, чтобы не замедлять импорт ядра
+    try:
+        import numpy
+    except ImportError:  # Пакетный расчет пени работает и без NumPy, но медленнее
+        return None
+    return numpy
+
+
+def _accrue_penalties_numpy(np, balances, last_accrual_timestamps, now):
+    balances = np.asarray(balances, dtype=np.float64)
+    periods = np.maximum((now - np.asarray(last_accrual_timestamps, dtype=np.int64)) // CREDIT_PENALTY_PERIOD_SECONDS, 0)
+    accrued_balances = balances * np.power(1 + CREDIT_PENALTY_RATE, periods)
+    return periods.tolist(), accrued_balances.tolist()
+
+
+def _accrue_penalties_python(balances, last_accrual_timestamps, now):
+    growth = 1 + CREDIT_PENALTY_RATE
+    periods = [max((now - last) // CREDIT_PENALTY_PERIOD_SECONDS, 0) for last in last_accrual_timestamps]
+    accrued_balances = [balance * growth ** n for balance, n in zip(balances, periods)]
+    return periods, accrued_balances
+
+
+def run_nightly_penalty_batch(card_database, now=None, clock=None, card_locks=None, journal=None, card_store=None):
+    # Ночной расчет пени сразу по всем кредитным картам с отрицательным балансом:
+    # суммы считаются одним векторным проходом, затем результаты записываются в карты.
+    # С card_locks каждая карта меняется под своей блокировкой, как в терминалах; если карта
+    # успела измениться после векторного прохода, ее пени пересчитываются по текущему балансу.
+    # Как и операции терминалов, начисления пишутся в journal (OperationJournal) и card_store
+    # (SQLiteCardStore): журнал ждет fsync один раз на весь проход, и только затем карты
+    # сохраняются в хранилище.
+    if now is None:
+        now = (clock if clock is not None else SYSTEM_CLOCK).now()
+    debtors = [card for card in card_database.values() if isinstance(card, CreditCard) and card.balance < 0]
+    if not debtors:
+        return 0, 0.0
+
+    balances = array('d', [card.balance for card in debtors])
+    last_accrual_timestamps = array('q', [card.last_accrual_timestamp for card in debtors])
+    np = _import_numpy()
+    if np is not None:
+        periods, accrued_balances = _accrue_penalties_numpy(np, balances, last_accrual_timestamps, now)
+    else:
+        periods, accrued_balances = _accrue_penalties_python(balances, last_accrual_timestamps, now)
+
+    if journal is not None:
+        from .journal import OP_PENALTY  # journal импортирует этот модуль
+    charged = []
+    total_penalty = 0.0
+    journal_seq = None
+    for card, balance, last_accrual_timestamp, card_periods, accrued_balance in zip(
+            debtors, balances, last_accrual_timestamps, periods, accrued_balances):
+        if not card_periods:
+            continue
+        with card_locks.hold(card.card_number) if card_locks is not None else nullcontext():
+            if card.balance != balance or card.last_accrual_timestamp != last_accrual_timestamp:
+                if card.balance >= 0:
+                    continue
+                balance = card.balance
+                (card_periods,), (accrued_balance,) = _accrue_penalties_python(
+                    [balance], [card.last_accrual_timestamp], now)
+                if not card_periods:
+                    continue
+            penalty_amount = balance - accrued_balance
+            card.balance = accrued_balance
+            card.last_accrual_timestamp += card_periods * CREDIT_PENALTY_PERIOD_SECONDS
+            card.add_transaction("Пени", penalty_amount, now)
+            if journal is not None:
+                journal_seq = journal.append(OP_PENALTY, card, penalty_amount, 0.0, timestamp=now, wait=False)
+        charged.append(card)
+        total_penalty += penalty_amount
+
+    if journal_seq is not None and journal.synchronous:
+        journal.wait_durable(journal_seq)
+    if card_store is not None:
+        for card in charged:
+            with card_locks.hold(card.card_number) if card_locks is not None else nullcontext():
+                card_store.save(card)
+    return len(charged), total_penalty
@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class SystemClock:
+    # Настоящее время в целых секундах эпохи. Значение никогда не уменьшается,
+    # даже если системные часы перевели назад: история карт должна оставаться упорядоченной.
+    # Часы общие для терминалов в разных потоках, поэтому _last сравнивается и меняется под блокировкой.
+    __slots__ = ('_last', '_lock')
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            timestamp = int(time.time())
+            if timestamp < self._last:
+                return self._last
+            self._last = timestamp
+            return timestamp
+
+
+class VirtualClock:
+    # Время моделирования: стоит на месте, пока его не передвинут. С ним срок хранения истории,
+    # пени и суточные лимиты проверяются без ожидания, а месяцы работы терминалов
+    # моделируются за секунды.
+    __slots__ = ('_now',)
+
+    def __init__(self, start=None):
+        self._now = int(time.time()) if start is None else int(start)
+
+    def now(self):
+        return self._now
+
+    def advance(self, seconds):
+        if seconds < 0:
+            raise ValueError("Виртуальное время не может идти назад")
+        self._now += int(seconds)
+        return self._now
+
+    def set(self, timestamp):
+        return self.advance(int(timestamp) - self._now)
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+import zlib
+
+DEFAULT_SEED = 0  # seed терминалов и карт, которым не передали свой генератор
+
+
+def derive_rng(seed, *stream):
+    # Отдельный поток случайных чисел для терминала или карты: зависит только от общего seed
+    # и имени потока, а не от порядка создания объектов или от других потоков
+    return random.Random(":".join(str(part) for part in (seed,) + stream))
+
+
+def derive_uniform(seed, low, high, *stream):
+    # Одно число из [low, high) по seed и имени потока, как у derive_rng, но без создания
+    # random.Random: его инициализация в десятки раз дороже, а карт создаются миллионы
+    key = ":".join(str(part) for part in (seed,) + stream).encode("utf-8")
+    return low + (high - low) * (zlib.crc32(key) / 2 ** 32)
+
+
+class FaultInjector:
+    # Настраиваемые сбои для нагрузочных прогонов: ошибки чтения карты, задержка и отказы
+    # банковского сервера по типу операции. Решения принимаются генератором терминала,
+    # поэтому прогон с тем же seed воспроизводит те же сбои. Один объект можно отдать
+    # нескольким терминалам: он хранит только настройки и счетчики.
+
+    def __init__(self, card_read_error_rate=None, latency=None, failure_rates=None, sleep=time.sleep):
+        # card_read_error_rate=None оставляет обычную частоту ошибок чтения терминала.
+        # latency: {Operation: секунды или (минимум, максимум)}, failure_rates: {Operation: доля отказов};
+        # ключ None задает значение для всех операций.
+        self.card_read_error_rate = card_read_error_rate
+        self.latency = dict(latency or {})
+        self.failure_rates = dict(failure_rates or {})
+        self.sleep = sleep
+        self.card_read_errors = 0
+        self.backend_failures = 0
+        self.backend_delay = 0.0
+        self._lock = threading.Lock()
+
+    def _setting(self, settings, operation):
+        value = settings.get(operation)
+        return settings.get(None) if value is None else value
+
+    def card_read_fails(self, rng, default_rate):
+        rate = default_rate if self.card_read_error_rate is None else self.card_read_error_rate
+        if rng.random() < rate:
+            with self._lock:
+                self.card_read_errors += 1
+            return True
+        return False
+
+    def backend_call_fails(self, operation, rng):
+        # Вызывается перед обращением к карте: выдерживает задержку и решает, откажет ли сервер
+        latency = self._setting(self.latency, operation)
+        if latency:
+            delay = rng.uniform(*latency) if isinstance(latency, tuple) else latency
+            self.sleep(delay)
+            with self._lock:
+                self.backend_delay += delay
+        failure_rate = self._setting(self.failure_rates, operation)
+        if failure_rate and rng.random() < failure_rate:
+            with self._lock:
+                self.backend_failures += 1
+            return True
+        return False
+
+    def stats(self):
+        return {"card_read_errors": self.card_read_errors, "backend_failures": self.backend_failures,
+                "backend_delay_seconds": round(self.backend_delay, 6)}
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import threading
+
+from .atm import ATM
+from .faults import derive_rng
+from .receipts import NullReceiptSink
+
+
+class CardLockTable:
+    # Блокировка на каждую карту, создается при первом обращении к номеру.
+    # Несколько карт захватываются всегда по возрастанию номера, поэтому встречные
+    # переводы между двумя картами не могут заблокировать друг друга.
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def __len__(self):
+        return len(self._locks)
+
+    def get(self, card_number):
+        lock = self._locks.get(card_number)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(card_number, threading.RLock())
+        return lock
+
+    @contextmanager
+    def hold(self, *card_numbers):
+        locks = [self.get(card_number) for card_number in sorted(set(card_numbers))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+class ATMFleet:
+    # Несколько терминалов над одной базой карт. Каждый терминал ведет свою сессию,
+    # наличные и часовой лимит только в своем потоке, а карты защищены общей таблицей блокировок.
+
+    def __init__(self, card_database, terminal_count, initial_atm_cash=50000.0, receipt_sink=None, card_store=None,
+                 journal=None, clock=None, seed=None, **atm_options):
+        self.card_database = card_database
+        self.card_locks = CardLockTable()
+        if receipt_sink is None:
+            receipt_sink = NullReceiptSink()
+        self.terminals = [ATM(initial_atm_cash, receipt_sink=receipt_sink, card_store=card_store, journal=journal,
+                              terminal_id=terminal_id, card_locks=self.card_locks, clock=clock,
+                              rng=None if seed is None else derive_rng(seed, "atm", terminal_id), **atm_options)
+                          for terminal_id in range(terminal_count)]
+
+    def __len__(self):
+        return len(self.terminals)
+
+    def get_cash_by_terminal(self):
+        return {atm.terminal_id: atm.cash_in_atm for atm in self.terminals}
+
+    def get_total_cash(self):
+        return sum(atm.cash_in_atm for atm in self.terminals)
+
+    def run(self, session, *args):
+        # Запускает session(atm, *args) на всех терминалах одновременно, по потоку на терминал,
+        # и возвращает результаты в порядке терминалов. Ошибка любой сессии пробрасывается.
+        with ThreadPoolExecutor(max_workers=len(self.terminals), thread_name_prefix="atm") as executor:
+            futures = [executor.submit(session, atm, *args) for atm in self.terminals]
+            return [future.result() for future in futures]
@@ -0,0 +1,742 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import messagebox
+
+from .lookup import CardIndex
+from .messages import HISTORY_COLUMNS, HISTORY_SEPARATOR, format_history_row, format_result
+
+
+HISTORY_VISIBLE_ROWS = 12
+HISTORY_WHEEL_ROWS = 3
+CARD_LIST_ROWS = 8
+CARD_SEARCH_DELAY_MS = 200
+
+
+class TkReceiptSink:
+    # Окна Tk можно открывать только из главного потока. Чек, напечатанный в рабочем потоке ATMGUI
+    # (возврат карты, операция), ждет в очереди, и ATMGUI показывает его при следующем опросе.
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.pending = queue.SimpleQueue()
+
+    def emit(self, receipt_text):
+        if threading.current_thread() is threading.main_thread():
+            self._show(receipt_text)
+        else:
+            self.pending.put(receipt_text)
+
+    def show_pending(self):
+        while True:
+            try:
+                receipt_text = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            self._show(receipt_text)
+
+    def _show(self, receipt_text):
+        messagebox.showinfo("Чек", receipt_text, parent=self.parent)
+
+
+class _PendingOperation:
+    # Операция банкомата, выполняемая в рабочем потоке. completed и cancelled меняются под lock:
+    # отмена либо успевает до завершения вызова (тогда after_cancel выполняется в рабочем потоке),
+    # либо опаздывает и результат доставляется как обычно.
+    __slots__ = ('description', 'on_done', 'fallback', 'on_late_result', 'after_cancel', 'started', 'future',
+                 'completed', 'cancelled', 'lock')
+
+    def __init__(self, description, on_done, fallback, on_late_result, after_cancel):
+        self.description = description
+        self.on_done = on_done
+        self.fallback = fallback
+        self.on_late_result = on_late_result
+        self.after_cancel = after_cancel
+        self.started = time.perf_counter()
+        self.future = None
+        self.completed = False
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def run(self, call):
+        result = call()
+        with self.lock:
+            if not self.cancelled:
+                self.completed = True
+                return result
+        if self.after_cancel is not None:
+            self.after_cancel(result)
+        return result
+
+    def cancel(self):
+        with self.lock:
+            if self.completed:
+                return False
+            self.cancelled = True
+        self.future.cancel()
+        return True
+
+
+class ATMGUI(tk.Tk):
+    # Каждый экран строится один раз при первом показе и дальше только поднимается наверх
+    # с обновлением своих переменных. cache_screens=False возвращает старое поведение
+    # (экран пересоздается при каждом переходе) - для сравнения времени переходов.
+    # Вызовы банкомата выполняются в рабочем потоке executor, а результаты забираются из главного
+    # потока Tk опросом через after(): окно не замирает, пока банк отвечает. Executor по умолчанию
+    # однопоточный, поэтому вызовы банкомата идут строго по очереди, как и раньше.
+    # card_index - общий CardIndex базы карт; если не задан, строится здесь один раз.
+    def __init__(self, atm_logic, card_database, cache_screens=True, executor=None, poll_interval_ms=30,
+                 card_index=None):
+        super().__init__()
+        self.atm = atm_logic
+        self.cards = card_database
+        self.card_index = card_index if card_index is not None else CardIndex(card_database)
+        self.cache_screens = cache_screens
+        self.owns_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1,
+                                                                                 thread_name_prefix="atm-gui")
+        self.poll_interval_ms = poll_interval_ms
+        self.pending = None  # операция, результата которой ждет интерфейс
+        self.operations = []  # все незавершенные операции, включая отмененные
+        self._poll_id = None
+        self.title("Банкомат")
+        self.geometry("550x480")  # Немного увеличил высоту для русского текста
+        self.resizable(False, False)
+
+        self.container = tk.Frame(self)
+        self.container.pack(expand=True, fill=tk.BOTH)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+        self.screens = {}
+        self.transition_times = deque(maxlen=10000)  # секунды на каждый переход между экранами
+
+        self.active_frame = None
+        self.pin_buffer = ""
+        self.card_search = None
+        self.card_page = 0
+        self.card_page_numbers = []
+        self._card_search_id = None
+        self.amount_window_title = ""
+        self.amount_processing_function = None
+        self.balance_information = ""
+        self.history_pager = None
+        self.history_first_row = 0
+        self.history_page_loads = {}  # номер страницы -> Future ее загрузки
+        self._history_poll_id = None
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self._show_welcome_screen()
+
+    def close(self):
+        for poll_id in (self._poll_id, self._history_poll_id, self._card_search_id):
+            if poll_id is not None:
+                self.after_cancel(poll_id)
+        self._poll_id = self._history_poll_id = self._card_search_id = None
+        if self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
+    def _dispatch(self, description, call, on_done, fallback, cancellable=True, on_late_result=None,
+                  after_cancel=None):
+        # call выполняется в рабочем потоке и не должен трогать виджеты; on_done получает результат
+        # в главном потоке. fallback - экран, куда возвращается интерфейс при отмене или ошибке.
+        # on_late_result получает результат операции, завершившейся уже после отмены (деньги
+        # списаны - клиенту нужно об этом сообщить), after_cancel выполняется в рабочем потоке
+        # сразу после отмененного вызова, до следующих операций (например, возвращает карту).
+        if self.pending is not None:
+            return
+        operation = _PendingOperation(description, on_done, fallback, on_late_result, after_cancel)
+        operation.future = self.executor.submit(operation.run, call)
+        self.pending = operation
+        self.operations.append(operation)
+        self._show_processing_screen(cancellable)
+        if self._poll_id is None:
+            self._poll_id = self.after(self.poll_interval_ms, self._poll_operations)
+
+    def _poll_operations(self):
+        finished = [operation for operation in self.operations if operation.future.done()]
+        self.operations = [operation for operation in self.operations if operation not in finished]
+        # Чеки из рабочего потока показываются раньше результата операции, как при вызове в главном потоке
+        show_pending_receipts = getattr(self.atm.receipt_sink, "show_pending", None)
+        if show_pending_receipts is not None:
+            show_pending_receipts()
+        for operation in finished:
+            future = operation.future
+            if operation is self.pending:
+                self.pending = None
+                error = future.exception()
+                if error is not None:
+                    messagebox.showerror("Ошибка", f"Операция не выполнена: {error}")
+                    operation.fallback()
+                else:
+                    operation.on_done(future.result())
+            elif operation.on_late_result is not None and not future.cancelled() and future.exception() is None:
+                operation.on_late_result(future.result())
+        if self.pending is not None:
+            self.processing_elapsed_var.set(f"Прошло {time.perf_counter() - self.pending.started:.0f} с")
+        self._poll_id = self.after(self.poll_interval_ms, self._poll_operations) if self.operations else None
+
+    def _cancel_pending_operation(self):
+        operation = self.pending
+        if operation is None or not operation.cancel():
+            return  # операция уже завершилась, ее результат придет при следующем опросе
+        self.pending = None
+        operation.fallback()
+
+    def _build_processing_screen(self, frame):
+        tk.Label(frame, text="Операция выполняется", font=("Arial", 16)).pack(pady=25)
+        self.processing_description_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.processing_description_var, font=("Arial", 12)).pack(pady=5)
+        self.processing_elapsed_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.processing_elapsed_var, font=("Arial", 10)).pack(pady=5)
+        self.processing_cancel_button = tk.Button(frame, text="Отмена", command=self._cancel_pending_operation,
+                                                  font=("Arial", 12), bg="salmon", width=15)
+
+    def _show_processing_screen(self, cancellable):
+        started = time.perf_counter()
+        frame = self._get_screen("processing", self._build_processing_screen)
+        self.processing_description_var.set(self.pending.description)
+        self.processing_elapsed_var.set("Пожалуйста, подождите...")
+        if cancellable:
+            self.processing_cancel_button.pack(pady=20)
+        else:
+            self.processing_cancel_button.pack_forget()
+        self._raise_screen(frame, "Банкомат - Обработка", started)
+
+    def _get_screen(self, name, build):
+        if not self.cache_screens:
+            for frame in self.screens.values():
+                frame.destroy()
+            self.screens.clear()
+        frame = self.screens.get(name)
+        if frame is None:
+            frame = tk.Frame(self.container, padx=15, pady=15)
+            frame.grid(row=0, column=0, sticky="nsew")
+            build(frame)
+            self.screens[name] = frame
+        return frame
+
+    def _raise_screen(self, frame, title, started):
+        self.title(title)
+        frame.tkraise()
+        self.active_frame = frame
+        self.update_idletasks()
+        self.transition_times.append(time.perf_counter() - started)
+
+    def _build_welcome_screen(self, frame):
+        tk.Label(frame, text="Добро пожаловать!", font=("Arial", 20)).pack(pady=10)
+        tk.Label(frame, text="Вставьте карту: найдите ее по номеру, последним цифрам (*4444) или владельцу",
+                 font=("Arial", 10), wraplength=480).pack(pady=5)
+
+        # Список показывает одну страницу результатов поиска по CardIndex, а не всю базу карт
+        self.card_search_var = tk.StringVar(self)
+        tk.Entry(frame, textvariable=self.card_search_var, font=("Arial", 12), width=30).pack(pady=5)
+        self.card_search_var.trace_add("write", self._schedule_card_search)
+        self.card_listbox = tk.Listbox(frame, height=CARD_LIST_ROWS, width=55, font=("Arial", 10),
+                                       exportselection=False)
+        self.card_listbox.pack(pady=5)
+        self.card_listbox.bind("<Double-Button-1>", lambda event: self._handle_card_insertion())
+
+        navigation_frame = tk.Frame(frame)
+        navigation_frame.pack()
+        tk.Button(navigation_frame, text="<", width=3, command=lambda: self._show_card_page(self.card_page - 1)).pack(
+            side=tk.LEFT)
+        self.card_page_var = tk.StringVar(self)
+        tk.Label(navigation_frame, textvariable=self.card_page_var, font=("Arial", 9), width=30).pack(side=tk.LEFT)
+        tk.Button(navigation_frame, text=">", width=3, command=lambda: self._show_card_page(self.card_page + 1)).pack(
+            side=tk.LEFT)
+
+        self.insert_card_button = tk.Button(frame, text="Вставить карту", command=self._handle_card_insertion,
+                                            font=("Arial", 12))
+        self.insert_card_button.pack(pady=10)
+        self.no_cards_label = tk.Label(frame, text="", font=("Arial", 10), fg="red")
+        self.no_cards_label.pack()
+
+        self.atm_cash_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.atm_cash_var, font=("Arial", 9)).pack(side=tk.BOTTOM, pady=3)
+
+    def _schedule_card_search(self, *args):
+        # Поиск запускается после паузы в наборе, а не на каждую нажатую клавишу
+        if self._card_search_id is not None:
+            self.after_cancel(self._card_search_id)
+        self._card_search_id = self.after(CARD_SEARCH_DELAY_MS, self._run_card_search)
+
+    def _run_card_search(self):
+        self._card_search_id = None
+        self.card_search = self.card_index.search(self.card_search_var.get())
+        self._show_card_page(0)
+
+    def _show_card_page(self, page):
+        page_count = self.card_search.page_count(CARD_LIST_ROWS)
+        self.card_page = max(0, min(page, page_count - 1))
+        rows = self.card_search.page(self.card_page, CARD_LIST_ROWS)
+        self.card_page_numbers = [number for number, _, _ in rows]
+        self.card_listbox.delete(0, tk.END)
+        for number, owner_name, is_blocked in rows:
+            self.card_listbox.insert(tk.END, f"{number} ({owner_name}, {'Забл.' if is_blocked else 'OK'})")
+        if rows:
+            self.card_listbox.selection_set(0)
+        found = len(self.card_search)
+        self.card_page_var.set(f"Найдено: {found}, стр. {self.card_page + 1} из {max(page_count, 1)}")
+        if not len(self.card_index):
+            self.no_cards_label.config(text="В базе нет карт для симуляции.")
+        elif not found:
+            self.no_cards_label.config(text="Карты не найдены.")
+        else:
+            self.no_cards_label.config(text="")
+        self.insert_card_button.config(state=tk.NORMAL if rows else tk.DISABLED)
+
+    def _show_welcome_screen(self):
+        started = time.perf_counter()
+        frame = self._get_screen("welcome", self._build_welcome_screen)
+        if self.card_search is None or not self.cache_screens:
+            self.card_search = self.card_index.search(self.card_search_var.get())
+        # Страница строится заново только из ее строк: блокировка карты видна сразу
+        self._show_card_page(self.card_page)
+        self.atm_cash_var.set(f"В банкомате: {self.atm.cash_in_atm:.2f} руб.")
+        self._raise_screen(frame, "Банкомат - Ожидание карты", started)
+
+    def _handle_card_insertion(self):
+        selection = self.card_listbox.curselection()
+        if not selection:
+            messagebox.showwarning("Ошибка", "Карта не выбрана.")
+            return
+
+        card_number = self.card_page_numbers[selection[0]]
+        try:
+            card_object = self.cards[card_number]
+        except KeyError:
+            messagebox.showerror("Ошибка", "Карта не найдена в системе.")
+            return
+        self._dispatch("Чтение карты", lambda: self.atm.insert_card(card_object),
+                       lambda outcome: self._card_inserted(card_object, outcome), self._show_welcome_screen,
+                       after_cancel=self._eject_card_after_cancel)
+
+    def _card_inserted(self, card_object, outcome):
+        success, message = outcome
+        if success:
+            self._show_pin_entry_screen(message)
+        else:
+            if card_object.is_blocked:
+                self.card_index.update_card(card_object)
+            messagebox.showerror("Ошибка карты", message)
+            self._show_welcome_screen()
+
+    def _eject_card_after_cancel(self, outcome):
+        # Рабочий поток: карта, прочитанная уже после отмены, сразу возвращается
+        if outcome[0]:
+            self.atm.cancel_operation_and_eject_card()
+
+    def _build_pin_entry_screen(self, frame):
+        self.pin_message_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.pin_message_var, font=("Arial", 12)).pack(pady=10)
+
+        self.pin_display_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.pin_display_var, font=("Arial", 18, "bold"), width=8,
+                 relief=tk.GROOVE).pack(pady=10)
+
+        keypad_frame = tk.Frame(frame)
+        keypad_frame.pack(pady=5)
+
+        pinpad_buttons = [
+            '1', '2', '3',
+            '4', '5', '6',
+            '7', '8', '9',
+            'Отмена', '0', 'Стереть'
+        ]
+        row, col = 0, 0
+        for button_text in pinpad_buttons:
+            button_command = None
+            button_color = "lightgrey"
+            if button_text.isdigit():
+                button_command = lambda digit=button_text: self._add_digit_to_pin(digit)
+            elif button_text == "Стереть":
+                button_command = self._clear_pin_entry
+                button_color = "orange"
+            elif button_text == "Отмена":
+                button_command = self._cancel_button_pressed_on_pin_screen
+                button_color = "salmon"
+
+            tk.Button(keypad_frame, text=button_text, width=5, height=2, font=("Arial", 10), bg=button_color,
+                      command=button_command).grid(row=row, column=col, padx=3, pady=3)
+            col += 1
+            if col > 2:
+                col = 0
+                row += 1
+
+        tk.Button(frame, text="Ввод (OK)", command=self._submit_pin_entry, font=("Arial", 12),
+                  bg="lightgreen").pack(pady=10)
+
+    def _show_pin_entry_screen(self, initial_message=""):
+        started = time.perf_counter()
+        frame = self._get_screen("pin", self._build_pin_entry_screen)
+        self.pin_message_var.set(initial_message)
+        self._clear_pin_entry()
+        self._raise_screen(frame, "Банкомат - Ввод PIN", started)
+
+    def _add_digit_to_pin(self, digit):
+        if len(self.pin_buffer) < 4:
+            self.pin_buffer += digit
+            self.pin_display_var.set("*" * len(self.pin_buffer))
+
+    def _clear_pin_entry(self):
+        self.pin_buffer = ""
+        self.pin_display_var.set("")
+
+    def _cancel_button_pressed_on_pin_screen(self):
+        self._dispatch("Возврат карты", self.atm.cancel_operation_and_eject_card,
+                       lambda return_message: self._card_ejected("Отмена", return_message),
+                       self._show_welcome_screen, cancellable=False)
+
+    def _card_ejected(self, title, return_message):
+        messagebox.showinfo(title, return_message)
+        self._show_welcome_screen()
+
+    def _submit_pin_entry(self):
+        pin = self.pin_buffer
+        card = self.atm.current_card
+        self._dispatch("Проверка PIN-кода", lambda: self.atm.process_pin_entry(pin),
+                       lambda outcome: self._pin_entry_processed(card, outcome),
+                       self._return_to_pin_entry_screen)
+
+    def _return_to_pin_entry_screen(self):
+        self._show_pin_entry_screen(self.pin_message_var.get())
+
+    def _pin_entry_processed(self, card, outcome):
+        status, message = outcome
+        if status == "SUCCESS":
+            messagebox.showinfo("PIN-код", message)
+            self._show_main_menu()
+        elif status == "FAILURE":
+            self._return_to_pin_entry_screen()
+            messagebox.showwarning("PIN-код", message)
+        elif status == "BLOCKED":
+            self.card_index.update_card(card)
+            messagebox.showerror("PIN-код", message)
+            self._show_welcome_screen()
+        elif status == "NO_CARD":
+            messagebox.showerror("Ошибка", message)
+            self._show_welcome_screen()
+
+    def _build_main_menu(self, frame):
+        tk.Label(frame, text="Выберите операцию:", font=("Arial", 16)).pack(pady=15)
+
+        operations = [
+            ("Снять наличные", self._show_withdrawal_screen),
+            ("Внести наличные на карту", self._show_deposit_screen),
+            ("Перевести с банк. счета на карту", self._show_transfer_from_bank_screen),
+            ("Узнать баланс", self._show_balance_screen),
+        ]
+        for name, command in operations:
+            tk.Button(frame, text=name, command=command, font=("Arial", 12), width=30, height=1).pack(pady=4)
+        self.history_menu_button = tk.Button(frame, text="Посмотреть историю", command=self._show_history_screen,
+                                             font=("Arial", 12), width=30, height=1)
+
+        self.finish_button = tk.Button(frame, text="Завершить и вернуть карту",
+                                       command=self._cancel_button_pressed_in_main_menu, font=("Arial", 12),
+                                       bg="orange", width=30)
+        self.finish_button.pack(pady=20)
+
+    def _show_main_menu(self):
+        started = time.perf_counter()
+        frame = self._get_screen("main_menu", self._build_main_menu)
+        card_num_suffix = self.atm.current_card.card_number[-4:] if self.atm.current_card else "????"
+        # Кнопка истории показывается только для карт, у которых история включена
+        if self.atm.current_card and self.atm.current_card.history_enabled:
+            self.history_menu_button.pack(pady=4, before=self.finish_button)
+        else:
+            self.history_menu_button.pack_forget()
+        self._raise_screen(frame, f"Банкомат - Главное Меню (Карта *{card_num_suffix})", started)
+
+    def _cancel_button_pressed_in_main_menu(self):
+        self._dispatch("Возврат карты", self.atm.cancel_operation_and_eject_card,
+                       lambda return_message: self._card_ejected("Завершение работы", return_message),
+                       self._show_welcome_screen, cancellable=False)
+
+    def _build_amount_entry_screen(self, frame):
+        self.amount_prompt_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.amount_prompt_var, font=("Arial", 14)).pack(pady=15)
+
+        self.amount_entry_field = tk.Entry(frame, font=("Arial", 14), width=12, justify=tk.RIGHT)
+        self.amount_entry_field.pack(pady=10)
+
+        tk.Button(frame, text="OK", command=self._submit_amount_entry, font=("Arial", 12), width=8).pack(side=tk.LEFT,
+                                                                                                         padx=10,
+                                                                                                         pady=10)
+        tk.Button(frame, text="Отмена (в меню)", command=self._show_main_menu, font=("Arial", 12),
+                  width=15).pack(side=tk.RIGHT, padx=10, pady=10)
+        tk.Button(frame, text="Отменить и вернуть карту", command=self._cancel_button_pressed_in_main_menu,
+                  font=("Arial", 9)).pack(side=tk.BOTTOM, pady=5)
+
+    def _create_amount_entry_screen(self, window_title, prompt_text, amount_processing_function):
+        started = time.perf_counter()
+        frame = self._get_screen("amount_entry", self._build_amount_entry_screen)
+        self.amount_window_title = window_title
+        self.amount_processing_function = amount_processing_function
+        self.amount_prompt_var.set(prompt_text)
+        self.amount_entry_field.delete(0, tk.END)
+        self.amount_entry_field.focus()
+        self._raise_screen(frame, f"Банкомат - {window_title}", started)
+
+    def _submit_amount_entry(self):
+        window_title = self.amount_window_title
+        entered_amount_string = self.amount_entry_field.get()
+        if not entered_amount_string:
+            messagebox.showwarning("Внимание", "Введите сумму.")
+            return
+        try:
+            float(entered_amount_string)
+            if float(entered_amount_string) <= 0:
+                messagebox.showwarning("Внимание", "Сумма должна быть положительной.")
+                return
+        except ValueError:
+            messagebox.showwarning("Внимание", "Некорректная сумма.")
+            return
+
+        amount_processing_function = self.amount_processing_function
+
+        def report(outcome, title=window_title):
+            result, balance_text = outcome
+            messagebox.showinfo(title, format_result(result))
+            if result.success:
+                receipt_content = f"Операция: {window_title}\nСумма: {entered_amount_string}\nСтатус: Успешно\n{balance_text}"
+                self.atm.print_receipt(receipt_content)
+
+        self._dispatch(window_title,
+                       lambda: self._run_with_balance(amount_processing_function, entered_amount_string),
+                       lambda outcome: self._report_and_show_main_menu(report, outcome), self._show_main_menu,
+                       on_late_result=lambda outcome: report(outcome, f"{window_title} (выполнено до отмены)"))
+
+    def _run_with_balance(self, operation_function, *args):
+        # Рабочий поток: баланс для чека запрашивается сразу за операцией, в той же очереди
+        result = operation_function(*args)
+        balance_text = format_result(self.atm.request_card_balance()) if result.success else None
+        return result, balance_text
+
+    def _report_and_show_main_menu(self, report, outcome):
+        report(outcome)
+        self._show_main_menu()
+
+    def _show_withdrawal_screen(self):
+        self._create_amount_entry_screen(
+            "Снятие наличных",
+            "Введите сумму для снятия:",
+            self.atm.perform_withdrawal
+        )
+
+    def _show_deposit_screen(self):
+        self._create_amount_entry_screen(
+            "Внесение наличных",
+            "Введите сумму для внесения на карту:",
+            self.atm.perform_cash_deposit_to_card
+        )
+
+    def _build_full_transfer_screen(self, frame):
+        self.full_transfer_text_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.full_transfer_text_var, font=("Arial", 12)).pack(pady=15)
+
+        tk.Button(frame, text="Да, перевести", command=self._confirm_full_transfer, font=("Arial", 12),
+                  bg="lightgreen").pack(pady=10)
+        tk.Button(frame, text="Нет, вернуться в меню", command=self._show_main_menu,
+                  font=("Arial", 12)).pack(pady=5)
+        tk.Button(frame, text="Отменить и вернуть карту",
+                  command=self._cancel_button_pressed_in_main_menu, font=("Arial", 9)).pack(side=tk.BOTTOM, pady=5)
+
+    def _confirm_full_transfer(self):
+        def report(outcome, title="Перевод с банк. счета"):
+            result, balance_text = outcome
+            messagebox.showinfo(title, format_result(result))
+            if result.success:
+                receipt_content = f"Операция: Перевод с банк. счета (вся сумма)\nСтатус: Успешно\n{balance_text}"
+                self.atm.print_receipt(receipt_content)
+
+        self._dispatch("Перевод с банк. счета",
+                       lambda: self._run_with_balance(self.atm.perform_transfer_from_bank_to_card),
+                       lambda outcome: self._report_and_show_main_menu(report, outcome), self._show_main_menu,
+                       on_late_result=lambda outcome: report(outcome, "Перевод с банк. счета (выполнено до отмены)"))
+
+    def _show_transfer_from_bank_screen(self):
+        card = self.atm.current_card
+        if not card:
+            messagebox.showerror("Ошибка", "Нет вставленной карты.")
+            self._show_welcome_screen()
+            return
+
+        if card.deposit_type == 'full':
+            started = time.perf_counter()
+            frame = self._get_screen("full_transfer", self._build_full_transfer_screen)
+            available_on_account = card.simulated_bank_account
+            self.full_transfer_text_var.set(
+                f"Эта карта позволяет перевести только всю сумму.\nНа вашем виртуальном банк. счете: {available_on_account:.2f} руб.\nПеревести?")
+            self._raise_screen(frame, "Банкомат - Перевод всей суммы с банк. счета", started)
+
+        elif card.deposit_type == 'partial':
+            available_on_account = card.simulated_bank_account
+            self._create_amount_entry_screen(
+                "Перевод с банк. счета на карту",
+                f"Введите сумму для перевода (доступно на банк. счете: {available_on_account:.2f}):",
+                self.atm.perform_transfer_from_bank_to_card
+            )
+        else:
+            messagebox.showerror("Ошибка", "Неизвестный тип пополнения для карты.")
+            self._show_main_menu()
+
+    def _build_balance_screen(self, frame):
+        self.balance_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.balance_var, font=("Arial", 14)).pack(pady=25)
+
+        tk.Button(frame, text="Напечатать баланс (чек)",
+                  command=lambda: self.atm.print_receipt(self.balance_information),
+                  font=("Arial", 12)).pack(pady=10)
+        tk.Button(frame, text="Вернуться в меню", command=self._show_main_menu, font=("Arial", 12)).pack(
+            pady=5)
+        tk.Button(frame, text="Отменить и вернуть карту", command=self._cancel_button_pressed_in_main_menu,
+                  font=("Arial", 9)).pack(side=tk.BOTTOM, pady=5)
+
+    def _show_balance_screen(self):
+        self._dispatch("Запрос баланса", lambda: format_result(self.atm.request_card_balance()),
+                       self._present_balance_screen, self._show_main_menu)
+
+    def _present_balance_screen(self, balance_information):
+        started = time.perf_counter()
+        frame = self._get_screen("balance", self._build_balance_screen)
+        self.balance_information = balance_information
+        self.balance_var.set(self.balance_information)
+        self._raise_screen(frame, "Банкомат - Баланс карты", started)
+
+    def _build_history_screen(self, frame):
+        # Виртуальный список: в Text лежат только видимые строки, полоса прокрутки управляется
+        # вручную по номеру первой видимой строки и общему числу записей
+        self.history_message_var = tk.StringVar(self)
+        tk.Label(frame, textvariable=self.history_message_var, font=("Arial", 11)).pack(side=tk.TOP)
+        tk.Label(frame, text=HISTORY_COLUMNS, font=("Courier New", 9), anchor=tk.W).pack(side=tk.TOP, fill=tk.X,
+                                                                                          padx=(10, 0))
+
+        buttons_frame = tk.Frame(frame)
+        buttons_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(0, 10))
+
+        tk.Button(buttons_frame, text="Напечатать историю (чек)", command=self._print_history_receipt,
+                  font=("Arial", 10)).pack(pady=3)
+        tk.Button(buttons_frame, text="Вернуться в меню", command=self._show_main_menu, font=("Arial", 10)).pack(pady=3)
+        tk.Button(buttons_frame, text="Отменить и вернуть карту", command=self._cancel_button_pressed_in_main_menu,
+                  font=("Arial", 9)).pack(pady=3)
+
+        self.history_text_widget = tk.Text(frame, wrap=tk.NONE, font=("Courier New", 9),
+                                           height=HISTORY_VISIBLE_ROWS, width=65)
+        self.history_text_widget.config(state=tk.DISABLED)
+        self.history_scrollbar = tk.Scrollbar(frame, command=self._scroll_history)
+        self.history_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=5)
+        self.history_text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, pady=5, padx=(10, 0))
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.history_text_widget.bind(sequence, self._on_history_mouse_wheel)
+
+    def _show_history_screen(self):
+        self._dispatch("Запрос истории операций", self.atm.open_card_history, self._present_history_screen,
+                       self._show_main_menu)
+
+    def _present_history_screen(self, outcome):
+        message, self.history_pager = outcome
+        self.history_page_loads = {}
+        self.history_first_row = 0
+        self._return_to_history_screen(message)
+
+    def _render_history(self):
+        pager = self.history_pager
+        total = len(pager) if pager is not None else 0
+        lines = []
+        if total:
+            lines, missing_pages = pager.peek(self.history_first_row, HISTORY_VISIBLE_ROWS)
+            # Соседние окна подгружаются заранее, чтобы прокрутка не упиралась в загрузку
+            for first in (self.history_first_row - HISTORY_VISIBLE_ROWS, self.history_first_row + HISTORY_VISIBLE_ROWS):
+                if 0 <= first < total:
+                    missing_pages += pager.peek(first, HISTORY_VISIBLE_ROWS)[1]
+            for page in missing_pages:
+                self._load_history_page(pager, page)
+            lines = [line if line is not None else self._history_placeholder(pager, self.history_first_row + offset)
+                     for offset, line in enumerate(lines)]
+
+        text_area_widget = self.history_text_widget
+        text_area_widget.config(state=tk.NORMAL)
+        text_area_widget.delete("1.0", tk.END)
+        text_area_widget.insert(tk.END, "\n".join(lines))
+        text_area_widget.config(state=tk.DISABLED)
+        if total:
+            self.history_scrollbar.set(self.history_first_row / total,
+                                       min(self.history_first_row + HISTORY_VISIBLE_ROWS, total) / total)
+        else:
+            self.history_scrollbar.set(0.0, 1.0)
+
+    def _print_history_receipt(self):
+        pager = self.history_pager
+        message = self.history_message_var.get()
+        self._dispatch("Печать истории", lambda: self._print_full_history(pager, message),
+                       lambda _: self._return_to_history_screen(message),
+                       lambda: self._return_to_history_screen(message))
+
+    def _print_full_history(self, pager, message):
+        # Рабочий поток: в чек идет вся история карты, включая архив, а не только видимые строки
+        lines = [format_history_row(row) for row in pager.card.iter_history()] if pager is not None else []
+        self.atm.print_receipt("\n".join([message, HISTORY_COLUMNS, HISTORY_SEPARATOR] + lines))
+
+    def _return_to_history_screen(self, message):
+        started = time.perf_counter()
+        frame = self._get_screen("history", self._build_history_screen)
+        self.history_message_var.set(message)
+        self._render_history()
+        self._raise_screen(frame, "Банкомат - История операций", started)
+
+    def _history_placeholder(self, pager, row):
+        future = self.history_page_loads.get(row // pager.page_size)
+        if future is not None and future.done() and future.exception() is not None:
+            return "Не удалось загрузить записи"
+        return "..."
+
+    def _load_history_page(self, pager, page):
+        # Страница читается в рабочем потоке, в общей очереди с операциями банкомата
+        if page in self.history_page_loads:
+            return
+        self.history_page_loads[page] = self.executor.submit(pager.load_page, page)
+        if self._history_poll_id is None:
+            self._history_poll_id = self.after(self.poll_interval_ms, self._poll_history_pages)
+
+    def _poll_history_pages(self):
+        # В history_page_loads только загрузки текущего экрана: при новом открытии истории
+        # словарь заменяется, и результаты старых загрузок больше не отображаются
+        self._history_poll_id = None
+        loading = False
+        loaded = False
+        for page, future in list(self.history_page_loads.items()):
+            if not future.done():
+                loading = True
+            elif future.exception() is None:
+                del self.history_page_loads[page]
+                loaded = True
+        if loaded:
+            self._render_history()
+        if loading and self._history_poll_id is None:
+            self._history_poll_id = self.after(self.poll_interval_ms, self._poll_history_pages)
+
+    def _set_history_first_row(self, first):
+        total = len(self.history_pager) if self.history_pager is not None else 0
+        first = max(0, min(first, total - HISTORY_VISIBLE_ROWS))
+        if first != self.history_first_row:
+            self.history_first_row = first
+            self._render_history()
+
+    def _scroll_history(self, action, amount, unit=None):
+        # Команда полосы прокрутки: ("moveto", доля) или ("scroll", шаг, "units" или "pages")
+        if action == "moveto":
+            total = len(self.history_pager) if self.history_pager is not None else 0
+            self._set_history_first_row(int(float(amount) * total))
+        else:
+            step = int(amount) * (HISTORY_VISIBLE_ROWS - 1 if unit == "pages" else 1)
+            self._set_history_first_row(self.history_first_row + step)
+
+    def _on_history_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._set_history_first_row(self.history_first_row - HISTORY_WHEEL_ROWS)
+        else:
+            self._set_history_first_row(self.history_first_row + HISTORY_WHEEL_ROWS)
+        return "break"
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from itertools import islice
+import threading
+
+from .messages import format_history_row
+
+HISTORY_PAGE_SIZE = 200
+HISTORY_CACHED_PAGES = 6
+
+
+class HistoryPager:
+    # Постраничный доступ к истории карты (память и архив) от новых операций к старым.
+    # Строки форматируются только для загруженных страниц, а в памяти держится не больше
+    # cached_pages страниц: экран истории занимает память по размеру окна, а не истории.
+    # load_page может выполняться в рабочем потоке, peek - в потоке интерфейса.
+
+    def __init__(self, card, page_size=HISTORY_PAGE_SIZE, cached_pages=HISTORY_CACHED_PAGES):
+        self.card = card
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.pages_loaded = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.total = card.count_history()
+
+    def __len__(self):
+        return self.total
+
+    def load_page(self, page):
+        with self._lock:
+            lines = self._pages.get(page)
+            if lines is not None:
+                self._pages.move_to_end(page)
+                return lines
+        rows = islice(self.card.iter_history(page * self.page_size), self.page_size)
+        lines = [format_history_row(row) for row in rows]
+        with self._lock:
+            self._pages[page] = lines
+            self.pages_loaded += 1
+            while len(self._pages) > self.cached_pages:
+                self._pages.popitem(last=False)
+        return lines
+
+    def peek(self, first, count):
+        # Строки first..first+count-1 из уже загруженных страниц: None на месте незагруженных
+        # и номера страниц, которые нужно загрузить
+        last = min(first + count, self.total)
+        lines = []
+        missing_pages = []
+        with self._lock:
+            for page in range(first // self.page_size, (last - 1) // self.page_size + 1 if last > first else 0):
+                page_start = page * self.page_size
+                page_lines = self._pages.get(page)
+                if page_lines is not None:
+                    self._pages.move_to_end(page)
+                else:
+                    missing_pages.append(page)
+                for row in range(max(first, page_start), min(last, page_start + self.page_size)):
+                    index = row - page_start
+                    lines.append(page_lines[index] if page_lines is not None and index < len(page_lines) else None)
+        return lines, missing_pages
+
+    def lines(self, first, count):
+        # То же, что peek, но недостающие страницы загружаются сразу
+        for page in self.peek(first, count)[1]:
+            self.load_page(page)
+        return self.peek(first, count)[0]
@@ -0,0 +1,234 @@
+from collections import namedtuple
+import os
+import struct
+import threading
+import time
+import zlib
+
+from .cards import CreditCard
+
+JOURNAL_MAGIC = b"RSJRNL01"
+
+OP_WITHDRAWAL = 1
+OP_DEPOSIT = 2
+OP_TRANSFER = 3
+OP_CARD_BLOCKED = 4
+OP_CARD_TRANSFER_OUT = 5
+OP_CARD_TRANSFER_IN = 6
+OP_PENALTY = 7  # Ночное начисление пени, не связано с терминалом
+
+# Флаг в коде операции: за записью следует еще одна запись той же операции
+_OP_CONTINUED = 0x80
+
+_HISTORY_TYPES = {
+    OP_WITHDRAWAL: "Снятие",
+    OP_DEPOSIT: "Пополнение",
+    OP_TRANSFER: "Перевод с БС",
+    OP_CARD_TRANSFER_OUT: "Перевод на карту",
+    OP_CARD_TRANSFER_IN: "Перевод с карты",
+    OP_PENALTY: "Пени",
+}
+
+# Запись фиксированной длины: номер, время, терминал, код операции, номер карты, сумма,
+# баланс карты, остаток на банковском счете, момент начисления пени, наличные в банкомате.
+# В конце CRC32 всех предыдущих полей, по нему отбрасывается недописанный хвост после сбоя.
+# Записи одной операции (две стороны перевода) идут подряд, у всех кроме последней в коде
+# операции стоит _OP_CONTINUED; группа без последней записи при чтении отбрасывается целиком.
+_RECORD_BODY = struct.Struct("<QqHB20sdddqd")
+_RECORD_CRC = struct.Struct("<I")
+RECORD_SIZE = _RECORD_BODY.size + _RECORD_CRC.size
+
+JournalRecord = namedtuple("JournalRecord", "seq timestamp terminal_id op card_number amount balance_after "
+                                            "bank_account_after accrual_timestamp atm_cash_after")
+
+
+def _pack_record(record, continued=False):
+    op = record.op | _OP_CONTINUED if continued else record.op
+    body = _RECORD_BODY.pack(record.seq, record.timestamp, record.terminal_id, op,
+                             record.card_number.encode("ascii"), record.amount, record.balance_after,
+                             record.bank_account_after, record.accrual_timestamp, record.atm_cash_after)
+    return body + _RECORD_CRC.pack(zlib.crc32(body))
+
+
+def _unpack_record(data, offset):
+    body = data[offset:offset + _RECORD_BODY.size]
+    (crc,) = _RECORD_CRC.unpack_from(data, offset + _RECORD_BODY.size)
+    if zlib.crc32(body) != crc:
+        return None
+    fields = _RECORD_BODY.unpack(body)
+    op = fields[3]
+    record = JournalRecord(fields[0], fields[1], fields[2], op & ~_OP_CONTINUED,
+                           fields[4].rstrip(b"\0").decode("ascii"), *fields[5:])
+    return record, bool(op & _OP_CONTINUED)
+
+
+def _scan(path):
+    # Возвращает корректные записи и длину файла, до которой они занимают место.
+    # Записи незавершенной группы в конце не возвращаются и в эту длину не входят.
+    with open(path, "rb") as journal_file:
+        data = journal_file.read()
+    if not data:
+        return [], 0
+    if not data.startswith(JOURNAL_MAGIC):
+        raise ValueError(f"{path} не является журналом операций")
+    records = []
+    group = []
+    offset = valid_size = len(JOURNAL_MAGIC)
+    while offset + RECORD_SIZE <= len(data):
+        unpacked = _unpack_record(data, offset)
+        if unpacked is None:
+            break
+        record, continued = unpacked
+        group.append(record)
+        offset += RECORD_SIZE
+        if not continued:
+            records.extend(group)
+            group = []
+            valid_size = offset
+    return records, valid_size
+
+
+def read_journal(path, after_seq=0):
+    records, _ = _scan(path)
+    return [record for record in records if record.seq > after_seq]
+
+
+class OperationJournal:
+    # Журнал упреждающей записи денежных операций. Записи копятся в буфере, а отдельный
+    # поток сбрасывает их на диск одной записью и одним fsync на всю пачку (group commit).
+    # При synchronous=True append ждет, пока его пачка окажется на диске.
+    # after_seq - номер, возвращенный restore: снимок может содержать записи, не дошедшие до диска
+    # перед сбоем, и новые записи не должны получить их номера.
+
+    def __init__(self, path, flush_interval=0.002, synchronous=True, after_seq=0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+
+        existing_records, valid_size = _scan(path) if os.path.exists(path) else ([], 0)
+        self.last_seq = max(existing_records[-1].seq if existing_records else 0, after_seq)
+        self.durable_seq = self.last_seq
+        self.fsync_count = 0
+
+        self._file = open(path, "ab")
+        if valid_size:
+            self._file.truncate(valid_size)  # Отбрасываем недописанную при сбое запись
+        else:
+            self._file.truncate(0)
+            self._file.write(JOURNAL_MAGIC)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+        self._buffer = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._flush_error = None
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    def append(self, op, card, amount, atm_cash_after, terminal_id=0, timestamp=None, wait=True):
+        return self.append_group(((op, card, amount),), atm_cash_after, terminal_id, timestamp, wait)
+
+    def append_group(self, entries, atm_cash_after, terminal_id=0, timestamp=None, wait=True):
+        # entries - (код операции, карта, сумма) одной операции: они попадают на диск одной
+        # записью в файл и при доигрывании применяются либо все, либо ни одна.
+        # wait=False не ждет fsync даже при synchronous: пакетные задания ждут один раз в конце.
+        if timestamp is None:
+            timestamp = int(time.time())
+        with self._condition:
+            if self._closed:
+                raise ValueError("Журнал закрыт")
+            packed = []
+            for position, (op, card, amount) in enumerate(entries):
+                accrual_timestamp = card.last_accrual_timestamp if isinstance(card, CreditCard) else 0
+                self.last_seq += 1
+                record = JournalRecord(self.last_seq, timestamp, terminal_id, op, card.card_number, float(amount),
+                                       card.balance, card.simulated_bank_account, accrual_timestamp,
+                                       float(atm_cash_after))
+                packed.append(_pack_record(record, continued=position + 1 < len(entries)))
+            seq = self.last_seq
+            self._buffer.append(b"".join(packed))
+            self._condition.notify_all()
+        if self.synchronous and wait:
+            self.wait_durable(seq)
+        return seq
+
+    def wait_durable(self, seq, timeout=None):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.durable_seq >= seq or self._flush_error is not None,
+                                            timeout):
+                return False
+            if self._flush_error is not None:
+                raise self._flush_error
+            return True
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._buffer or self._closed)
+                if not self._buffer and self._closed:
+                    return
+            # Короткая пауза, чтобы в пачку успели попасть записи других терминалов
+            if self.flush_interval:
+                time.sleep(self.flush_interval)
+            with self._condition:
+                batch = self._buffer
+                self._buffer = []
+                batch_last_seq = self.last_seq
+            try:
+                self._file.write(b"".join(batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as error:
+                with self._condition:
+                    self._flush_error = error
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self.fsync_count += 1
+                self.durable_seq = batch_last_seq
+                self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def replay_journal(path, card_database, after_seq=0):
+    # Восстановление после сбоя: состояние карт берется из последних записей журнала,
+    # в историю карт добавляются записанные в журнал операции.
+    # Возвращает номер последней примененной записи и остаток наличных по каждому терминалу.
+    last_seq = after_seq
+    atm_cash = {}
+    withdrawal_cards = {}
+    for record in read_journal(path, after_seq):
+        card = card_database[record.card_number]
+        card.balance = record.balance_after
+        card.simulated_bank_account = record.bank_account_after
+        if isinstance(card, CreditCard):
+            card.last_accrual_timestamp = record.accrual_timestamp
+        if record.op == OP_CARD_BLOCKED:
+            card.is_blocked = True
+        else:
+            card.add_transaction(_HISTORY_TYPES[record.op], record.amount, record.timestamp)
+            if record.op == OP_WITHDRAWAL:
+                withdrawal_cards[record.card_number] = card
+        if record.op != OP_PENALTY:
+            atm_cash[record.terminal_id] = record.atm_cash_after
+        last_seq = record.seq
+    # Суточный лимит карты восстанавливается при загрузке до доигрывания журнала,
+    # поэтому доигранные снятия добавляются в него пересчетом по истории
+    for card in withdrawal_cards.values():
+        card.rebuild_daily_withdrawals()
+    return last_seq, atm_cash
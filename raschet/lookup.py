@@ -0,0 +1,180 @@
+from bisect import bisect_left, insort
+import re
+import threading
+
+CARD_SEARCH_PAGE_SIZE = 20
+
+# Ключ индекса - значение для сортировки и номер карты через "\0": "\0" меньше любого символа,
+# поэтому все ключи с заданным префиксом лежат подряд, а номер восстанавливается из самого ключа
+_SEPARATOR = "\0"
+_KEY_END = "\uffff"
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_card_number(card_number):
+    return _NON_DIGITS.sub("", card_number)
+
+
+def normalize_owner_name(owner_name):
+    return " ".join(owner_name.casefold().split())
+
+
+class CardSearchResult:
+    # Найденные карты - диапазон одного отсортированного списка ключей: число найденных
+    # известно сразу, а описания карт собираются только для запрошенной страницы.
+    # После изменения индекса диапазон пересчитывается двоичным поиском при следующем обращении.
+
+    def __init__(self, index, keys_name, prefix):
+        self.index = index
+        self.keys_name = keys_name
+        self.prefix = prefix
+        self._version = None
+        self._lo = self._hi = 0
+
+    def _range(self):
+        index = self.index
+        if self._version != index.version:
+            keys = getattr(index, self.keys_name)
+            self._lo = bisect_left(keys, self.prefix)
+            self._hi = bisect_left(keys, self.prefix + _KEY_END, self._lo)
+            self._version = index.version
+        return self._lo, self._hi
+
+    def __len__(self):
+        with self.index._lock:
+            lo, hi = self._range()
+        return hi - lo
+
+    def page_count(self, page_size=CARD_SEARCH_PAGE_SIZE):
+        return -(-len(self) // page_size)
+
+    def page(self, page, page_size=CARD_SEARCH_PAGE_SIZE):
+        # [(номер, владелец, заблокирована), ...] для страницы page
+        index = self.index
+        with index._lock:
+            lo, hi = self._range()
+            start = lo + page * page_size
+            keys = getattr(index, self.keys_name)[start:max(start, min(hi, start + page_size))]
+            return [index.describe(key.rpartition(_SEPARATOR)[2]) for key in keys]
+
+
+class CardIndex:
+    # Поиск карт без перебора базы: отсортированные списки ключей и bisect. Три списка -
+    # цифры номера (поиск по началу номера), цифры номера задом наперед (по последним цифрам)
+    # и имя владельца без учета регистра (по началу имени). Описания карт хранятся в индексе,
+    # поэтому ни поиск, ни страница результатов не загружают сами карты из хранилища.
+
+    def __init__(self, card_database=None):
+        self._lock = threading.RLock()
+        self.version = 0
+        descriptions = ()
+        if card_database is not None:
+            from .storage import describe_cards  # sqlite3 загружается, только когда индекс строится по базе
+            descriptions = describe_cards(card_database)
+        self.rebuild(descriptions)
+
+    def rebuild(self, descriptions):
+        # descriptions - (номер, владелец, заблокирована), как у describe_cards
+        with self._lock:
+            self._cards = {}
+            self._numbers_by_digits = {}
+            for card_number, owner_name, is_blocked in descriptions:
+                self._cards[card_number] = (owner_name or "", bool(is_blocked))
+                self._numbers_by_digits[normalize_card_number(card_number)] = card_number
+            # Цифры номера уже посчитаны для _numbers_by_digits: ключи собираются из них
+            number_keys = [digits + _SEPARATOR + number for digits, number in self._numbers_by_digits.items()]
+            suffix_keys = [digits[::-1] + _SEPARATOR + number for digits, number in self._numbers_by_digits.items()]
+            if len(self._numbers_by_digits) != len(self._cards):  # номера, совпадающие по цифрам
+                number_keys = [self._number_key(number) for number in self._cards]
+                suffix_keys = [self._suffix_key(number) for number in self._cards]
+            number_keys.sort()
+            suffix_keys.sort()
+            self._number_keys = number_keys
+            self._suffix_keys = suffix_keys
+            self._owner_keys = sorted(self._owner_key(number, owner) for number, (owner, _) in self._cards.items())
+            self.version += 1
+
+    def _number_key(self, card_number):
+        return normalize_card_number(card_number) + _SEPARATOR + card_number
+
+    def _suffix_key(self, card_number):
+        return normalize_card_number(card_number)[::-1] + _SEPARATOR + card_number
+
+    def _owner_key(self, card_number, owner_name):
+        return normalize_owner_name(owner_name) + _SEPARATOR + card_number
+
+    def _keys(self, card_number, owner_name):
+        return ((self._number_keys, self._number_key(card_number)),
+                (self._suffix_keys, self._suffix_key(card_number)),
+                (self._owner_keys, self._owner_key(card_number, owner_name)))
+
+    def add(self, card_number, owner_name="", is_blocked=False):
+        with self._lock:
+            self.remove(card_number)
+            owner_name = owner_name or ""
+            for keys, key in self._keys(card_number, owner_name):
+                insort(keys, key)
+            self._cards[card_number] = (owner_name, bool(is_blocked))
+            self._numbers_by_digits[normalize_card_number(card_number)] = card_number
+            self.version += 1
+
+    def update_card(self, card):
+        # Новая карта или изменение владельца и блокировки уже известной
+        self.add(card.card_number, card.owner_name, card.is_blocked)
+
+    def remove(self, card_number):
+        with self._lock:
+            described = self._cards.pop(card_number, None)
+            if described is None:
+                return False
+            for keys, key in self._keys(card_number, described[0]):
+                del keys[bisect_left(keys, key)]
+            digits = normalize_card_number(card_number)
+            if self._numbers_by_digits.get(digits) == card_number:
+                del self._numbers_by_digits[digits]
+            self.version += 1
+            return True
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __contains__(self, card_number):
+        return card_number in self._cards
+
+    def describe(self, card_number):
+        owner_name, is_blocked = self._cards[card_number]
+        return card_number, owner_name, is_blocked
+
+    def find_by_number(self, card_number):
+        # Номер карты в том виде, в каком он хранится в базе, для номера с любыми пробелами и дефисами
+        if card_number in self._cards:
+            return card_number
+        return self._numbers_by_digits.get(normalize_card_number(card_number))
+
+    def find_by_owner(self, owner_name):
+        # Номера всех карт владельца (имя сравнивается без учета регистра и лишних пробелов)
+        prefix = normalize_owner_name(owner_name) + _SEPARATOR
+        with self._lock:
+            keys = self._owner_keys
+            lo = bisect_left(keys, prefix)
+            hi = bisect_left(keys, prefix + _KEY_END, lo)
+            return [key.rpartition(_SEPARATOR)[2] for key in keys[lo:hi]]
+
+    def search_number(self, prefix):
+        return CardSearchResult(self, "_number_keys", normalize_card_number(prefix))
+
+    def search_last_digits(self, digits):
+        return CardSearchResult(self, "_suffix_keys", normalize_card_number(digits)[::-1])
+
+    def search_owner(self, prefix):
+        return CardSearchResult(self, "_owner_keys", normalize_owner_name(prefix))
+
+    def search(self, query):
+        # "*4444" - по последним цифрам, цифры (с пробелами и дефисами) - по началу номера,
+        # остальное - по началу имени владельца; пустой запрос - все карты по порядку номеров
+        query = query.strip()
+        if query.startswith("*"):
+            return self.search_last_digits(query[1:])
+        if all(ch.isdigit() or ch in " -" for ch in query):
+            return self.search_number(query)
+        return self.search_owner(query)
@@ -0,0 +1,72 @@
+from .results import Operation, Reason, Status
+
+_SUCCESS_MESSAGES = {
+    Operation.WITHDRAWAL: "Выдано: {amount:.2f}. Остаток на карте: {balance}",
+    Operation.DEPOSIT: "Карта пополнена на {amount:.2f}. Новый баланс: {balance}",
+    Operation.TRANSFER: "Сумма {amount:.2f} переведена с банк. счета. Баланс карты: {balance}",
+    Operation.TRANSFER_FULL: "Вся сумма {amount:.2f} переведена с банк. счета. Баланс карты: {balance}",
+    Operation.BALANCE: "Текущий баланс: {balance}",
+    Operation.CARD_TRANSFER: "Сумма {amount:.2f} переведена на другую карту. Остаток на карте: {balance}",
+}
+
+_INVALID_AMOUNT_MESSAGES = {
+    Operation.WITHDRAWAL: "Сумма снятия должна быть больше нуля.",
+    Operation.DEPOSIT: "Сумма пополнения должна быть больше нуля.",
+    Operation.TRANSFER: "Сумма перевода должна быть больше нуля.",
+    Operation.CARD_TRANSFER: "Сумма перевода должна быть больше нуля.",
+}
+
+_REASON_MESSAGES = {
+    Reason.NO_CARD: "Нет карты.",
+    Reason.AMOUNT_FORMAT: "Неверный формат суммы.",
+    Reason.AMOUNT_REQUIRED: "Нужно указать сумму для частичного перевода.",
+    Reason.CARD_BLOCKED: "Карта заблокирована.",
+    Reason.INSUFFICIENT_FUNDS: "Недостаточно средств на дебетовой карте.",
+    Reason.CREDIT_LIMIT_EXCEEDED: "Превышен кредитный лимит. Доступно для снятия с учетом кредита: {available:.2f}",
+    Reason.DAILY_LIMIT_EXCEEDED: "Превышен суточный лимит снятия. Доступно: {available:.2f}",
+    Reason.ATM_HOURLY_LIMIT_EXCEEDED: "Превышен часовой лимит выдачи наличных в этом банкомате. Попробуйте позже.",
+    Reason.ATM_CASH_INSUFFICIENT: "В банкомате недостаточно денег для этой операции.",
+    Reason.BANK_ACCOUNT_EMPTY: "На связанном банковском счете нет средств.",
+    Reason.BANK_ACCOUNT_INSUFFICIENT: "Недостаточно средств на банк. счете. Доступно: {available:.2f}",
+    Reason.UNKNOWN_DEPOSIT_TYPE: "Неизвестный вариант пополнения карты.",
+    Reason.NOT_SUPPORTED: "Ошибка операции",
+    Reason.BACKEND_UNAVAILABLE: "Банк временно недоступен. Попробуйте позже.",
+}
+
+HISTORY_COLUMNS = "Дата и время         | Тип          | Сумма    | Баланс после"
+HISTORY_SEPARATOR = "-" * 60
+
+_SESSION_ENTRIES = {
+    Operation.WITHDRAWAL: "Снятие: {amount:.2f}",
+    Operation.DEPOSIT: "Внесение наличных: {amount:.2f}",
+    Operation.TRANSFER: "Перевод с банк. счета: {amount:.2f}",
+    Operation.TRANSFER_FULL: "Перевод с банк. счета (вся сумма)",
+    Operation.BALANCE: "Запрос баланса",
+    Operation.HISTORY: "Запрос истории операций",
+    Operation.CARD_TRANSFER: "Перевод на карту: {amount:.2f}",
+}
+
+
+def format_balance(balance, credit_limit=None):
+    if credit_limit is None:
+        return f"{balance:.2f}"
+    return f"{balance:.2f} (Кредитный лимит: {credit_limit:.2f})"
+
+
+def format_result(result):
+    if result.status == Status.SUCCESS:
+        return _SUCCESS_MESSAGES[result.operation].format(
+            amount=result.amount, balance=format_balance(result.balance, result.credit_limit))
+    if result.reason == Reason.INVALID_AMOUNT:
+        return _INVALID_AMOUNT_MESSAGES.get(result.operation, "Сумма должна быть положительной.")
+    return _REASON_MESSAGES[result.reason].format(available=result.available)
+
+
+def format_session_entry(operation, amount=None):
+    return _SESSION_ENTRIES[operation].format(amount=amount)
+
+
+def format_history_row(row):
+    moment, trans_type, trans_amount, balance_after = row
+    amount_str = f"{trans_amount:.2f}" if trans_amount is not None else "N/A"
+    return f"{moment.strftime('%d.%m.%Y %H:%M')} | {trans_type:<12} | {amount_str:>8} | {balance_after:.2f}"
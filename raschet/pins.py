@@ -0,0 +1,129 @@
+import os
+import threading
+
+# PIN хранится только как строка "схема$параметры$соль$хеш": параметры KDF записаны в самой
+# строке, поэтому хеши с разной стоимостью проверяются одинаково, а хранилища (SQLite, снимки)
+# сохраняют ее как обычный текст.
+PIN_SALT_BYTES = 16
+PIN_HASH_BYTES = 32
+SCRYPT_N = 2 ** 14  # около 16 МБ памяти и нескольких десятков миллисекунд на проверку
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 200000
+
+_SCRYPT = "scrypt"
+_PBKDF2 = "pbkdf2_sha256"
+
+
+def _scrypt(pin, salt, n, r, p):
+    # hashlib (OpenSSL) загружается при первом хешировании, чтобы не замедлять import raschet.
+    # maxmem с запасом под выбранные n, r, p: ограничение OpenSSL по умолчанию - 32 МБ
+    import hashlib
+    return hashlib.scrypt(pin.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=PIN_HASH_BYTES,
+                          maxmem=128 * r * (n + p + 2) + (1 << 20))
+
+
+def _pbkdf2(pin, salt, iterations):
+    import hashlib
+    return hashlib.pbkdf2_hmac("sha256", pin.encode("utf-8"), salt, iterations, PIN_HASH_BYTES)
+
+
+class PinHasher:
+    # Соленый хеш PIN-кода: scrypt (требует памяти, по умолчанию) или PBKDF2-SHA256.
+    # Стоимость настраивается параметрами; benchmarks/pin_verification.py показывает,
+    # сколько проверок в секунду дает выбранная стоимость на одно ядро.
+
+    def __init__(self, scheme=_SCRYPT, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, iterations=PBKDF2_ITERATIONS):
+        if scheme not in (_SCRYPT, _PBKDF2):
+            raise ValueError(f"Неизвестная схема хеширования PIN: {scheme}")
+        self.scheme = scheme
+        self.n = n
+        self.r = r
+        self.p = p
+        self.iterations = iterations
+
+    def hash(self, pin):
+        salt = os.urandom(PIN_SALT_BYTES)
+        if self.scheme == _SCRYPT:
+            digest = _scrypt(pin, salt, self.n, self.r, self.p)
+            return f"{_SCRYPT}${self.n}${self.r}${self.p}${salt.hex()}${digest.hex()}"
+        digest = _pbkdf2(pin, salt, self.iterations)
+        return f"{_PBKDF2}${self.iterations}${salt.hex()}${digest.hex()}"
+
+
+DEFAULT_PIN_HASHER = PinHasher()
+# Для моделирования и нагрузочных прогонов, где создаются сотни тысяч карт,
+# а стойкость PIN к перебору не важна
+SIMULATION_PIN_HASHER = PinHasher(_PBKDF2, iterations=1)
+_default_pin_hasher = DEFAULT_PIN_HASHER
+
+
+def set_default_pin_hasher(hasher):
+    # Хешер для карт, созданных без явного pin_hasher; возвращает прежний
+    global _default_pin_hasher
+    previous = _default_pin_hasher
+    _default_pin_hasher = hasher
+    return previous
+
+
+def is_pin_hash(value):
+    return isinstance(value, str) and value.startswith((_SCRYPT + "$", _PBKDF2 + "$"))
+
+
+def hash_pin(pin, hasher=None):
+    # Уже захешированный PIN (карта из хранилища или снимка) возвращается как есть
+    if is_pin_hash(pin):
+        return pin
+    return (hasher or _default_pin_hasher).hash(str(pin))
+
+
+def verify_pin(entered_pin, pin_hash):
+    if not isinstance(entered_pin, str):
+        return False
+    scheme, *fields = pin_hash.split("$")
+    if scheme == _SCRYPT:
+        n, r, p, salt, expected = fields
+        digest = _scrypt(entered_pin, bytes.fromhex(salt), int(n), int(r), int(p))
+    elif scheme == _PBKDF2:
+        iterations, salt, expected = fields
+        digest = _pbkdf2(entered_pin, bytes.fromhex(salt), int(iterations))
+    else:
+        raise ValueError(f"Неизвестная схема хеширования PIN: {scheme}")
+    import hmac
+    return hmac.compare_digest(digest, bytes.fromhex(expected))
+
+
+class PinVerifier:
+    # Ограниченный пул проверки PIN для терминалов, работающих одновременно. Хеш считается
+    # не больше чем в max_workers потоках: scrypt занимает память, и неограниченное число
+    # одновременных проверок съело бы ее. hashlib отпускает GIL на время KDF, поэтому потоки
+    # проверяют PIN параллельно на разных ядрах; use_processes=True - пул процессов.
+    # Вызывающий поток ждет только свою проверку, другие сессии за ней не выстраиваются.
+
+    def __init__(self, max_workers=None, use_processes=False):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Пул загружается только здесь: raschet.cards хеширует PIN без concurrent.futures и multiprocessing
+        if use_processes:
+            from concurrent.futures import ProcessPoolExecutor as executor_class
+        else:
+            from concurrent.futures import ThreadPoolExecutor as executor_class
+        self.executor = executor_class(max_workers=self.max_workers)
+        self.verifications = 0
+        self._lock = threading.Lock()
+
+    def verify(self, entered_pin, pin_hash):
+        with self._lock:
+            self.verifications += 1
+        return self.executor.submit(verify_pin, entered_pin, pin_hash).result()
+
+    def check(self, card, entered_pin):
+        return self.verify(entered_pin, card.pin)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
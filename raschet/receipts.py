@@ -0,0 +1,32 @@
+import threading
+
+
+class ConsoleReceiptSink:
+    def emit(self, receipt_text):
+        print("\n--- ПЕЧАТЬ ЧЕКА ---")
+        print(receipt_text)
+
+
+class FileReceiptSink:
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self._lock = threading.Lock()
+
+    def emit(self, receipt_text):
+        with self._lock, open(self.path, "a", encoding=self.encoding) as receipt_file:
+            receipt_file.write(receipt_text)
+            receipt_file.write("\n")
+
+
+class MemoryReceiptSink:
+    def __init__(self):
+        self.receipts = []
+
+    def emit(self, receipt_text):
+        self.receipts.append(receipt_text)
+
+
+class NullReceiptSink:
+    def emit(self, receipt_text):
+        pass
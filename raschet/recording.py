@@ -0,0 +1,351 @@
+from collections import namedtuple
+import math
+import struct
+import threading
+import time
+import zlib
+
+from .atm import ATM
+from .history import HISTORY_PAGE_SIZE
+from .receipts import NullReceiptSink
+from .results import OperationResult, Reason
+
+SESSION_LOG_MAGIC = b"RSSESS01"
+
+CALL_STRING = 0
+CALL_OPEN_TERMINAL = 1
+CALL_INSERT_CARD = 2
+CALL_PIN_ENTRY = 3
+CALL_WITHDRAWAL = 4
+CALL_DEPOSIT = 5
+CALL_TRANSFER = 6
+CALL_TRANSFER_TO_CARD = 7
+CALL_BALANCE = 8
+CALL_HISTORY = 9
+CALL_PRINT_RECEIPT = 10
+CALL_CANCEL = 11
+CALL_HISTORY_PAGES = 12
+
+CALL_NAMES = {
+    CALL_OPEN_TERMINAL: "open_terminal",
+    CALL_INSERT_CARD: "insert_card",
+    CALL_PIN_ENTRY: "process_pin_entry",
+    CALL_WITHDRAWAL: "perform_withdrawal",
+    CALL_DEPOSIT: "perform_cash_deposit_to_card",
+    CALL_TRANSFER: "perform_transfer_from_bank_to_card",
+    CALL_TRANSFER_TO_CARD: "perform_transfer_to_card",
+    CALL_BALANCE: "request_card_balance",
+    CALL_HISTORY: "request_card_history",
+    CALL_PRINT_RECEIPT: "print_receipt",
+    CALL_CANCEL: "cancel_operation_and_eject_card",
+    CALL_HISTORY_PAGES: "open_card_history",
+}
+
+_PIN_STATUSES = ("NO_CARD", "SUCCESS", "FAILURE", "BLOCKED")
+_PIN_STATUS_CODES = {status: code for code, status in enumerate(_PIN_STATUSES)}
+
+# Запись вызова фиксированной длины: микросекунды от начала записи (для темпа воспроизведения),
+# время часов терминала, терминал, вызов, два аргумента как номера строк, результат
+# (статус, причина, сумма, баланс) и CRC32 текстового ответа. Строки (номера карт, суммы,
+# тексты чеков) пишутся один раз записью CALL_STRING: номер, длина и байты UTF-8.
+# Введенный PIN не записывается: для проверки PIN в журнале есть только ее итог.
+_RECORD = struct.Struct("<qqHBIIBBddI")
+_FLUSH_BYTES = 1 << 20
+SESSION_FLUSH_INTERVAL = 0.5
+SESSION_FLUSH_CALLS = 256
+
+ReplayMismatch = namedtuple("ReplayMismatch", "index terminal_id call expected actual")
+ReplayReport = namedtuple("ReplayReport", "calls mismatches elapsed")
+
+
+def _crc(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _result_fields(result):
+    if isinstance(result, OperationResult):
+        amount = math.nan if result.amount is None else result.amount
+        balance = math.nan if result.balance is None else result.balance
+        return int(result.status), int(result.reason), amount, balance, 0
+    return 0, 0, math.nan, math.nan, 0
+
+
+def _same(expected, actual):
+    # Сравнение полей результата, где NaN означает отсутствие значения
+    return all(a == b or (isinstance(a, float) and math.isnan(a) and math.isnan(b))
+               for a, b in zip(expected, actual))
+
+
+class SessionRecorder:
+    # Компактный журнал вызовов ATM для воспроизведения инцидентов и регрессионных прогонов.
+    # Записи копятся в буфере и уходят в файл каждые flush_calls вызовов, а остаток сбрасывает
+    # фоновый поток раз в flush_interval секунд: при падении процесса теряются только последние
+    # доли секунды, а не весь буфер с тем самым инцидентом. Пишет один поток за раз.
+
+    def __init__(self, path, flush_interval=SESSION_FLUSH_INTERVAL, flush_calls=SESSION_FLUSH_CALLS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_calls = flush_calls
+        self.calls = 0
+        self._file = open(path, "wb")
+        self._file.write(SESSION_LOG_MAGIC)
+        self._buffer = bytearray()
+        self._buffered_calls = 0
+        self._strings = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic_ns()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-recorder", daemon=True)
+        self._flusher.start()
+
+    def _string_id(self, text):
+        if text is None:
+            return 0
+        string_id = self._strings.get(text)
+        if string_id is None:
+            string_id = self._strings[text] = len(self._strings) + 1
+            data = text.encode("utf-8")
+            self._buffer += _RECORD.pack(0, 0, 0, CALL_STRING, string_id, len(data), 0, 0, 0.0, 0.0, 0)
+            self._buffer += data
+        return string_id
+
+    def record(self, timestamp, terminal_id, call, first=None, second=None, status=0, reason=0, amount=math.nan,
+               balance=math.nan, check=0):
+        elapsed_us = (time.monotonic_ns() - self._started) // 1000
+        with self._lock:
+            first_id = self._string_id(first)
+            second_id = self._string_id(second)
+            self._buffer += _RECORD.pack(elapsed_us, timestamp, terminal_id, call, first_id, second_id, status,
+                                         reason, amount, balance, check)
+            self.calls += 1
+            self._buffered_calls += 1
+            if self._buffered_calls >= self.flush_calls or len(self._buffer) >= _FLUSH_BYTES:
+                self._flush()
+
+    def _flush(self):
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer = bytearray()
+        self._buffered_calls = 0
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if self._buffer and not self._file.closed:
+                    self._flush()
+
+    def close(self):
+        self._stop.set()
+        if self._flusher.is_alive():
+            self._flusher.join()
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RecordingATM:
+    # Обертка над ATM: те же методы, но каждый вызов с аргументами и результатом пишется
+    # в SessionRecorder. Остальные атрибуты (current_card, cash_in_atm...) берутся из ATM,
+    # поэтому обертку можно передать в ATMGUI вместо самого терминала.
+
+    def __init__(self, atm, recorder):
+        self.atm = atm
+        self.recorder = recorder
+        recorder.record(atm.clock.now(), atm.terminal_id, CALL_OPEN_TERMINAL, repr(atm.cash_in_atm),
+                        repr(atm.hourly_withdrawal_limit))
+
+    def __getattr__(self, name):
+        return getattr(self.atm, name)
+
+    def _record_result(self, timestamp, call, result, first=None, second=None):
+        status, reason, amount, balance, check = _result_fields(result)
+        self.recorder.record(timestamp, self.atm.terminal_id, call, first, second, status, reason, amount, balance,
+                             check)
+        return result
+
+    def _record_text(self, timestamp, call, status, text, first=None, second=None):
+        self.recorder.record(timestamp, self.atm.terminal_id, call, first, second, status, check=_crc(text))
+
+    def insert_card(self, card_object):
+        timestamp = self.atm.clock.now()
+        ok, message = self.atm.insert_card(card_object)
+        self._record_text(timestamp, CALL_INSERT_CARD, int(ok), message, card_object.card_number)
+        return ok, message
+
+    def process_pin_entry(self, pin):
+        timestamp = self.atm.clock.now()
+        status, message = self.atm.process_pin_entry(pin)
+        self._record_text(timestamp, CALL_PIN_ENTRY, _PIN_STATUS_CODES[status], message)
+        return status, message
+
+    def perform_withdrawal(self, amount_string):
+        timestamp = self.atm.clock.now()
+        return self._record_result(timestamp, CALL_WITHDRAWAL, self.atm.perform_withdrawal(amount_string),
+                                   amount_string)
+
+    def perform_cash_deposit_to_card(self, amount_string):
+        timestamp = self.atm.clock.now()
+        return self._record_result(timestamp, CALL_DEPOSIT, self.atm.perform_cash_deposit_to_card(amount_string),
+                                   amount_string)
+
+    def perform_transfer_from_bank_to_card(self, amount_string=None):
+        timestamp = self.atm.clock.now()
+        return self._record_result(timestamp, CALL_TRANSFER,
+                                   self.atm.perform_transfer_from_bank_to_card(amount_string), amount_string)
+
+    def perform_transfer_to_card(self, target_card, amount_string):
+        timestamp = self.atm.clock.now()
+        return self._record_result(timestamp, CALL_TRANSFER_TO_CARD,
+                                   self.atm.perform_transfer_to_card(target_card, amount_string),
+                                   target_card.card_number, amount_string)
+
+    def request_card_balance(self):
+        timestamp = self.atm.clock.now()
+        return self._record_result(timestamp, CALL_BALANCE, self.atm.request_card_balance())
+
+    def request_card_history(self):
+        timestamp = self.atm.clock.now()
+        history = self.atm.request_card_history()
+        self._record_text(timestamp, CALL_HISTORY, 0, history)
+        return history
+
+    def open_card_history(self, page_size=HISTORY_PAGE_SIZE):
+        timestamp = self.atm.clock.now()
+        message, pager = self.atm.open_card_history(page_size)
+        self._record_text(timestamp, CALL_HISTORY_PAGES, int(pager is not None), message)
+        return message, pager
+
+    def print_receipt(self, receipt_text):
+        timestamp = self.atm.clock.now()
+        self.atm.print_receipt(receipt_text)
+        self.recorder.record(timestamp, self.atm.terminal_id, CALL_PRINT_RECEIPT, receipt_text)
+
+    def cancel_operation_and_eject_card(self):
+        timestamp = self.atm.clock.now()
+        message = self.atm.cancel_operation_and_eject_card()
+        self._record_text(timestamp, CALL_CANCEL, 0, message)
+        return message
+
+
+class _ScriptedPinVerifier:
+    # Проверка PIN при воспроизведении: PIN в записи нет, поэтому PIN считается верным
+    # ровно тогда, когда верным он был в записи
+    __slots__ = ('matches',)
+
+    def __init__(self):
+        self.matches = False
+
+    def check(self, card, entered_pin):
+        return self.matches
+
+
+class _ScriptedRandom:
+    # Генератор терминала при воспроизведении: ошибка чтения карты происходит ровно тогда,
+    # когда она была в записи
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 1.0
+
+    def random(self):
+        return self.value
+
+
+def read_session_log(path):
+    # Возвращает кортежи вызовов (elapsed_us, timestamp, terminal_id, call, first, second,
+    # status, reason, amount, balance, check) со строками вместо их номеров
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    if data[:len(SESSION_LOG_MAGIC)] != SESSION_LOG_MAGIC:
+        raise ValueError(f"{path} не является журналом сессий")
+    strings = [None]
+    calls = []
+    unpack_from = _RECORD.unpack_from
+    offset = len(SESSION_LOG_MAGIC)
+    end = len(data) - _RECORD.size
+    while offset <= end:
+        fields = unpack_from(data, offset)
+        offset += _RECORD.size
+        if fields[3] == CALL_STRING:
+            length = fields[5]
+            strings.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+            continue
+        calls.append(fields[:4] + (strings[fields[4]], strings[fields[5]]) + fields[6:])
+    return calls
+
+
+def replay_session_log(path, card_database, clock=None, pacing=False, speed=1.0, max_mismatches=100):
+    # Повторяет записанные вызовы на новой базе карт и сравнивает результаты с записанными.
+    # clock - VirtualClock, на котором созданы карты: перед каждым вызовом он ставится на
+    # записанное время. pacing=True выдерживает исходные паузы между вызовами (ускоренные в speed раз).
+    calls = read_session_log(path)
+    terminals = {}
+    mismatches = []
+    started = time.perf_counter()
+    first_elapsed = calls[0][0] if calls else 0
+
+    for index, (elapsed_us, timestamp, terminal_id, call, first, second, status, reason, amount, balance,
+                check) in enumerate(calls):
+        if pacing:
+            delay = (elapsed_us - first_elapsed) / 1e6 / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        if clock is not None and timestamp > clock.now():
+            clock.set(timestamp)
+
+        if call == CALL_OPEN_TERMINAL:
+            terminals[terminal_id] = ATM(float(first), float(second), receipt_sink=NullReceiptSink(),
+                                         terminal_id=terminal_id, clock=clock, rng=_ScriptedRandom(),
+                                         pin_verifier=_ScriptedPinVerifier())
+            continue
+        atm = terminals[terminal_id]
+        if reason == Reason.BACKEND_UNAVAILABLE:
+            continue  # внедренный отказ сервера карту не менял
+
+        expected = (status, reason, amount, balance, check)
+        if call == CALL_INSERT_CARD:
+            card = card_database[first]
+            # Неудачная вставка незаблокированной карты - это ошибка чтения
+            atm.rng.value = 0.0 if not status and not card.is_blocked else 1.0
+            ok, message = atm.insert_card(card)
+            actual = (int(ok), 0, math.nan, math.nan, _crc(message))
+        elif call == CALL_PIN_ENTRY:
+            atm.pin_verifier.matches = status == _PIN_STATUS_CODES["SUCCESS"]
+            pin_status, message = atm.process_pin_entry(None)
+            actual = (_PIN_STATUS_CODES[pin_status], 0, math.nan, math.nan, _crc(message))
+        elif call == CALL_WITHDRAWAL:
+            actual = _result_fields(atm.perform_withdrawal(first))
+        elif call == CALL_DEPOSIT:
+            actual = _result_fields(atm.perform_cash_deposit_to_card(first))
+        elif call == CALL_TRANSFER:
+            actual = _result_fields(atm.perform_transfer_from_bank_to_card(first))
+        elif call == CALL_TRANSFER_TO_CARD:
+            actual = _result_fields(atm.perform_transfer_to_card(card_database[first], second))
+        elif call == CALL_BALANCE:
+            actual = _result_fields(atm.request_card_balance())
+        elif call == CALL_HISTORY:
+            actual = (0, 0, math.nan, math.nan, _crc(atm.request_card_history()))
+        elif call == CALL_HISTORY_PAGES:
+            message, pager = atm.open_card_history()
+            actual = (int(pager is not None), 0, math.nan, math.nan, _crc(message))
+        elif call == CALL_PRINT_RECEIPT:
+            atm.print_receipt(first)
+            actual = expected
+        elif call == CALL_CANCEL:
+            actual = (0, 0, math.nan, math.nan, _crc(atm.cancel_operation_and_eject_card()))
+        else:
+            raise ValueError(f"Неизвестный вызов {call} в записи {index}")
+
+        if not _same(expected, actual) and len(mismatches) < max_mismatches:
+            mismatches.append(ReplayMismatch(index, terminal_id, CALL_NAMES[call], expected, actual))
+
+    return ReplayReport(len(calls), mismatches, time.perf_counter() - started)
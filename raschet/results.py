@@ -0,0 +1,64 @@
+from enum import IntEnum
+
+
+class Status(IntEnum):
+    SUCCESS = 0
+    DECLINED = 1
+    ERROR = 2
+
+
+class Operation(IntEnum):
+    WITHDRAWAL = 1
+    DEPOSIT = 2
+    TRANSFER = 3
+    TRANSFER_FULL = 4
+    BALANCE = 5
+    HISTORY = 6
+    CARD_TRANSFER = 7
+
+
+class Reason(IntEnum):
+    NONE = 0
+    NO_CARD = 1
+    AMOUNT_FORMAT = 2
+    INVALID_AMOUNT = 3
+    AMOUNT_REQUIRED = 4
+    CARD_BLOCKED = 5
+    INSUFFICIENT_FUNDS = 6
+    CREDIT_LIMIT_EXCEEDED = 7
+    DAILY_LIMIT_EXCEEDED = 8
+    ATM_HOURLY_LIMIT_EXCEEDED = 9
+    ATM_CASH_INSUFFICIENT = 10
+    BANK_ACCOUNT_EMPTY = 11
+    BANK_ACCOUNT_INSUFFICIENT = 12
+    UNKNOWN_DEPOSIT_TYPE = 13
+    NOT_SUPPORTED = 14
+    BACKEND_UNAVAILABLE = 15
+
+
+class OperationResult:
+    # Итог операции банкомата без готового текста: сообщение для пользователя
+    # собирается в raschet.messages только там, где его действительно показывают
+    __slots__ = ('status', 'operation', 'reason', 'amount', 'balance', 'credit_limit', 'available')
+
+    def __init__(self, status, operation, reason=Reason.NONE, amount=None, balance=None, credit_limit=None,
+                 available=None):
+        self.status = status
+        self.operation = operation
+        self.reason = reason
+        self.amount = amount
+        self.balance = balance
+        self.credit_limit = credit_limit
+        self.available = available
+
+    @property
+    def success(self):
+        return self.status == Status.SUCCESS
+
+    def __repr__(self):
+        return (f"OperationResult({self.status.name}, {self.operation.name}, {self.reason.name}, "
+                f"amount={self.amount!r}, balance={self.balance!r})")
+
+
+def error_result(operation, reason):
+    return OperationResult(Status.ERROR, operation, reason)
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import json
+
+from .atm import ATM
+from .faults import derive_rng
+from .fleet import CardLockTable
+from .lookup import CARD_SEARCH_PAGE_SIZE, CardIndex
+from .messages import format_result
+from .pins import PinVerifier
+from .receipts import MemoryReceiptSink
+from .results import OperationResult
+
+# Протокол - строки JSON в обе стороны. Запрос: {"id": 1, "op": "withdraw", "amount": "100"}.
+# Ответ несет тот же id; чеки и извлечение карты по таймауту приходят отдельными событиями
+# {"event": "receipt", "text": ...} и {"event": "timeout", "message": ...}.
+# Поиск карт без вставки: {"op": "find_cards", "query": "*4444", "page": 0} - страница результатов CardIndex.
+SERVER_IDLE_TIMEOUT = 120.0
+SERVER_MAX_SESSIONS = 10000
+SERVER_MAX_LINE_LENGTH = 64 * 1024
+SERVER_MAX_SEARCH_PAGE_SIZE = 100
+
+
+def result_to_message(result):
+    return {
+        "ok": result.success,
+        "status": result.status.name,
+        "operation": result.operation.name,
+        "reason": result.reason.name,
+        "amount": result.amount,
+        "balance": result.balance,
+        "credit_limit": result.credit_limit,
+        "available": result.available,
+        "message": format_result(result),
+    }
+
+
+class ATMSession:
+    # Сессия одного соединения: свой терминал ATM, свои наличные и свой буфер чеков
+
+    def __init__(self, server, terminal_id):
+        self.server = server
+        self.receipts = MemoryReceiptSink()
+        self.atm = ATM(server.initial_atm_cash, receipt_sink=self.receipts, card_store=server.card_store,
+                       journal=server.journal, terminal_id=terminal_id, card_locks=server.card_locks,
+                       clock=server.clock, rng=None if server.seed is None else derive_rng(server.seed, "atm", terminal_id),
+                       faults=server.faults, pin_verifier=server.pin_verifier)
+
+    def _find_card(self, card_number):
+        if not isinstance(card_number, str):
+            return None
+        card_database = self.server.card_database
+        try:
+            return card_database[card_number]
+        except KeyError:
+            pass
+        # Номер мог прийти с другими пробелами или дефисами, чем в базе
+        card_number = self.server.get_card_index().find_by_number(card_number)
+        return None if card_number is None else card_database.get(card_number)
+
+    def handle(self, request):
+        atm = self.atm
+        op = request.get("op")
+        if op == "insert_card":
+            card = self._find_card(request.get("card_number"))
+            if card is None:
+                return {"ok": False, "message": "Карта не найдена."}
+            ok, message = atm.insert_card(card)
+            return {"ok": ok, "message": message}
+        if op == "enter_pin":
+            card = atm.current_card
+            status, message = atm.process_pin_entry(request.get("pin"))
+            if status == "BLOCKED":
+                self.server.get_card_index().update_card(card)
+            return {"ok": status == "SUCCESS", "status": status, "message": message}
+        if op == "find_cards":
+            return self.server.find_cards(request.get("query", ""), request.get("page", 0),
+                                          request.get("page_size", CARD_SEARCH_PAGE_SIZE))
+        if op == "withdraw":
+            return atm.perform_withdrawal(request.get("amount"))
+        if op == "deposit":
+            return atm.perform_cash_deposit_to_card(request.get("amount"))
+        if op == "transfer":
+            return atm.perform_transfer_from_bank_to_card(request.get("amount"))
+        if op == "transfer_to_card":
+            target_card = self._find_card(request.get("card_number"))
+            if target_card is None:
+                return {"ok": False, "message": "Карта получателя не найдена."}
+            return atm.perform_transfer_to_card(target_card, request.get("amount"))
+        if op == "balance":
+            return atm.request_card_balance()
+        if op == "history":
+            return {"ok": atm.current_card is not None, "message": atm.request_card_history()}
+        if op == "receipt":
+            atm.print_receipt(str(request.get("text", "")))
+            return {"ok": True}
+        if op == "cancel":
+            return {"ok": True, "message": atm.cancel_operation_and_eject_card()}
+        return {"ok": False, "message": f"Неизвестная операция: {op}"}
+
+    def eject_idle_card(self):
+        return self.atm.cancel_operation_and_eject_card()
+
+    def drain_receipts(self):
+        receipts = self.receipts.receipts
+        self.receipts.receipts = []
+        return receipts
+
+
+class ATMServer:
+    # Асинхронный сервер терминалов: одно соединение - одна сессия ATM. Операции с картами
+    # выполняются в цикле событий, а при журнале, хранилище (fsync, SQLite) или внедренных сбоях
+    # (FaultInjector) - в пуле потоков.
+    # Запрос читается только после того, как ответ на предыдущий ушел клиенту (drain),
+    # поэтому медленный клиент не накапливает ответы в памяти сервера.
+
+    def __init__(self, card_database, initial_atm_cash=50000.0, card_store=None, journal=None,
+                 idle_timeout=SERVER_IDLE_TIMEOUT, max_sessions=SERVER_MAX_SESSIONS, clock=None, seed=None,
+                 faults=None, pin_verifier=None):
+        self.card_database = card_database
+        self.initial_atm_cash = initial_atm_cash
+        self.card_store = card_store
+        self.journal = journal
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self.seed = seed
+        self.faults = faults
+        self.card_locks = CardLockTable()
+        # Проверка PIN (KDF на десятки миллисекунд) идет в общем ограниченном пуле и никогда в цикле событий
+        self.owns_pin_verifier = pin_verifier is None
+        self.pin_verifier = pin_verifier if pin_verifier is not None else PinVerifier()
+        self.card_index = None  # CardIndex строится при первом поиске, а не при запуске
+        self.sessions = set()
+        self.requests_served = 0
+        self.cards_ejected_on_timeout = 0
+        self._next_terminal_id = 0
+        self._server = None
+
+    def get_card_index(self):
+        if self.card_index is None:
+            self.card_index = CardIndex(self.card_database)
+        return self.card_index
+
+    def find_cards(self, query, page=0, page_size=CARD_SEARCH_PAGE_SIZE):
+        if not isinstance(query, str) or not isinstance(page, int) or not isinstance(page_size, int):
+            return {"ok": False, "message": "Некорректный запрос поиска."}
+        page_size = max(1, min(page_size, SERVER_MAX_SEARCH_PAGE_SIZE))
+        result = self.get_card_index().search(query)
+        cards = [{"card_number": number, "owner_name": owner_name, "is_blocked": is_blocked}
+                 for number, owner_name, is_blocked in result.page(max(0, page), page_size)]
+        return {"ok": True, "total": len(result), "page": max(0, page), "page_size": page_size, "cards": cards}
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._serve_connection, host, port,
+                                                  limit=SERVER_MAX_LINE_LENGTH)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.owns_pin_verifier:
+            self.pin_verifier.close()
+
+    async def _call(self, function, *args, blocking=False):
+        # blocking - вызов заведомо долгий (проверка PIN) и всегда уходит из цикла событий.
+        # С FaultInjector операции тоже идут в пул: внедренная задержка сервера банка (time.sleep)
+        # должна задерживать только свою сессию, а не весь цикл событий.
+        if self.journal is None and self.card_store is None and self.faults is None and not blocking:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _send(self, writer, message):
+        writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    async def _send_receipts(self, session, writer):
+        for receipt_text in session.drain_receipts():
+            await self._send(writer, {"event": "receipt", "text": receipt_text})
+
+    async def _serve_connection(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            await self._send(writer, {"ok": False, "message": "Сервер перегружен. Попробуйте позже."})
+            writer.close()
+            return
+
+        session = ATMSession(self, self._next_terminal_id)
+        self._next_terminal_id += 1
+        self.sessions.add(session)
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if session.atm.current_card is None:
+                        break
+                    # Карта, оставленная в простаивающем терминале, возвращается с чеком
+                    message = await self._call(session.eject_idle_card)
+                    self.cards_ejected_on_timeout += 1
+                    await self._send_receipts(session, writer)
+                    await self._send(writer, {"event": "timeout", "message": message})
+                    continue
+                except ValueError:  # строка длиннее SERVER_MAX_LINE_LENGTH
+                    await self._send(writer, {"ok": False, "message": "Слишком длинный запрос."})
+                    break
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if not isinstance(request, dict):  # корректный JSON, но не объект: [1, 2], 5, null
+                    await self._send(writer, {"ok": False, "message": "Неверный формат запроса."})
+                    continue
+                if request.get("op") == "quit":
+                    break
+
+                response = await self._call(session.handle, request, blocking=request.get("op") == "enter_pin")
+                if isinstance(response, OperationResult):
+                    response = result_to_message(response)
+                response["id"] = request.get("id")
+                self.requests_served += 1
+                await self._send_receipts(session, writer)
+                await self._send(writer, response)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            if session.atm.current_card is not None:
+                # Соединение оборвалось посреди сессии: карта возвращается без чека клиенту
+                await self._call(session.atm._eject_card_to_user)
+            writer.close()
+
+
+class ATMClient:
+    # Простой клиент протокола для тестов и нагрузки: request() ждет ответ со своим id,
+    # события, пришедшие до ответа, складываются в events.
+
+    def __init__(self):
+        self.events = []
+        self._reader = None
+        self._writer = None
+        self._next_id = 0
+
+    async def connect(self, host, port):
+        self._reader, self._writer = await asyncio.open_connection(host, port, limit=SERVER_MAX_LINE_LENGTH)
+        return self
+
+    async def request(self, op, **params):
+        self._next_id += 1
+        request_id = self._next_id
+        params["op"] = op
+        params["id"] = request_id
+        self._writer.write(json.dumps(params, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self._writer.drain()
+        while True:
+            message = await self.read_message()
+            if message is None:
+                raise ConnectionError("Сервер закрыл соединение")
+            if "event" in message:
+                self.events.append(message)
+            elif message.get("id") == request_id:
+                return message
+
+    async def read_message(self):
+        line = await self._reader.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.write(b'{"op": "quit"}\n')
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+def main():
+    from .storage import SQLiteCardStore
+
+    parser = argparse.ArgumentParser(description="Сетевой сервер терминалов (строки JSON)")
+    parser.add_argument("--db", required=True, help="файл SQLite с картами")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--idle-timeout", type=float, default=SERVER_IDLE_TIMEOUT, help="секунд до возврата карты")
+    args = parser.parse_args()
+
+    card_store = SQLiteCardStore(args.db)
+
+    async def serve():
+        server = ATMServer(card_store, card_store=card_store, idle_timeout=args.idle_timeout)
+        host, port = await server.start(args.host, args.port)
+        print(f"Сервер терминалов слушает {host}:{port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        card_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+import glob
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .cards import CreditCard, DebitCard
+from .journal import replay_journal
+from .transactions import TRANSACTION_TYPES, get_transaction_type_code
+
+SNAPSHOT_MAGIC = b"RSSNAP01"
+SNAPSHOT_VERSION = 1
+
+_FLAG_CREDIT = 1
+_FLAG_HISTORY_ENABLED = 2
+_FLAG_BLOCKED = 4
+_FLAG_DEPOSIT_FULL = 8
+
+# Разделы файла в порядке записи: строки хранятся одной строкой через \0,
+# числовые столбцы карт и операций лежат как есть и читаются через memoryview без копирования
+_SECTIONS = (
+    ("card_numbers", None),
+    ("pins", None),
+    ("owner_names", None),
+    ("type_names", None),
+    ("flags", 'B'),
+    ("balances", 'd'),
+    ("bank_accounts", 'd'),
+    ("credit_limits", 'd'),
+    ("accrual_timestamps", 'q'),
+    ("transaction_offsets", 'Q'),
+    ("transaction_timestamps", 'q'),
+    ("transaction_type_codes", 'H'),
+    ("transaction_amounts", 'd'),
+    ("transaction_balances", 'd'),
+)
+
+_HEADER = struct.Struct("<8sIQQQq")
+_SECTION_ENTRY = struct.Struct("<QQ")
+_ALIGNMENT = 8
+
+
+def _join_strings(values):
+    return "\0".join(values).encode("utf-8")
+
+
+def _collect_sections(card_database):
+    # Копия всех карт в столбцы снимка; возвращает разделы, число карт и число операций.
+    # Карты упорядочены по номеру, чтобы при загрузке искать их двоичным поиском без построения словаря.
+    card_numbers, pins, owner_names = [], [], []
+    flags = array('B')
+    balances, bank_accounts, credit_limits = array('d'), array('d'), array('d')
+    accrual_timestamps = array('q')
+    transaction_offsets = array('Q', [0])
+    transaction_timestamps, transaction_type_codes = array('q'), array('H')
+    transaction_amounts, transaction_balances = array('d'), array('d')
+
+    for card in sorted(card_database.values(), key=lambda card: card.card_number):
+        is_credit = isinstance(card, CreditCard)
+        card_numbers.append(card.card_number)
+        pins.append(card.pin)
+        owner_names.append(card.owner_name)
+        flags.append((_FLAG_CREDIT if is_credit else 0) | (_FLAG_HISTORY_ENABLED if card.history_enabled else 0)
+                     | (_FLAG_BLOCKED if card.is_blocked else 0)
+                     | (_FLAG_DEPOSIT_FULL if card.deposit_type == 'full' else 0))
+        balances.append(card.balance)
+        bank_accounts.append(card.simulated_bank_account)
+        credit_limits.append(card.credit_limit if is_credit else math.nan)
+        accrual_timestamps.append(card.last_accrual_timestamp if is_credit else 0)
+
+        log = card.transactions
+        lo, hi = log.index_range()
+        transaction_timestamps.extend(log.timestamps[lo:hi])
+        transaction_type_codes.extend(log.type_codes[lo:hi])
+        transaction_amounts.extend(log.amounts[lo:hi])
+        transaction_balances.extend(log.balances[lo:hi])
+        transaction_offsets.append(len(transaction_timestamps))
+
+    sections = {
+        "card_numbers": _join_strings(card_numbers),
+        "pins": _join_strings(pins),
+        "owner_names": _join_strings(owner_names),
+        "type_names": _join_strings(TRANSACTION_TYPES),
+        "flags": flags,
+        "balances": balances,
+        "bank_accounts": bank_accounts,
+        "credit_limits": credit_limits,
+        "accrual_timestamps": accrual_timestamps,
+        "transaction_offsets": transaction_offsets,
+        "transaction_timestamps": transaction_timestamps,
+        "transaction_type_codes": transaction_type_codes,
+        "transaction_amounts": transaction_amounts,
+        "transaction_balances": transaction_balances,
+    }
+    return sections, len(card_numbers), len(transaction_timestamps)
+
+
+def _write_sections(path, sections, journal_seq, card_count, transaction_count):
+    # Пишется во временный файл и атомарно переименовывается,
+    # поэтому при сбое остается предыдущий целый снимок
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        offset = _HEADER.size + _SECTION_ENTRY.size * len(_SECTIONS)
+        table = []
+        payloads = []
+        for name, _ in _SECTIONS:
+            payload = memoryview(sections[name]).cast('B')
+            offset += -offset % _ALIGNMENT
+            table.append((offset, len(payload)))
+            payloads.append((offset, payload))
+            offset += len(payload)
+
+        snapshot_file.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, journal_seq, card_count,
+                                         transaction_count, int(time.time())))
+        for entry in table:
+            snapshot_file.write(_SECTION_ENTRY.pack(*entry))
+        for section_offset, payload in payloads:
+            snapshot_file.write(b"\0" * (section_offset - snapshot_file.tell()))
+            snapshot_file.write(payload)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temporary_path, path)
+
+
+def write_snapshot(path, card_database, journal_seq=0):
+    # Снимок всех карт в один файл
+    sections, card_count, transaction_count = _collect_sections(card_database)
+    _write_sections(path, sections, journal_seq, card_count, transaction_count)
+
+
+class SnapshotCardDatabase(MutableMapping):
+    # Словарь карт поверх отображенного в память снимка. При открытии читается только
+    # отсортированный список номеров карт; объект карты с историей создается при первом обращении.
+    # Созданным картам назначается archive для операций старше срока хранения.
+
+    def __init__(self, path, clock=None, archive=None):
+        self.path = path
+        self.clock = clock
+        self.archive = archive
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, self.journal_seq, self._card_count, _, self.created_at = _HEADER.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            buffer.release()
+            self.close()
+            raise ValueError(f"{path} не является снимком карт поддерживаемой версии")
+
+        self._views = [buffer]
+        self._columns = {}
+        for index, (name, type_code) in enumerate(_SECTIONS):
+            offset, length = _SECTION_ENTRY.unpack_from(buffer, _HEADER.size + index * _SECTION_ENTRY.size)
+            view = buffer[offset:offset + length]
+            if type_code is not None:
+                view = view.cast(type_code)
+            self._views.append(view)
+            self._columns[name] = view
+
+        self._card_numbers = self._split("card_numbers", self._card_count)
+        self._strings = {}
+        # Коды типов операций в файле переводятся в коды текущего процесса
+        self._type_code_map = [get_transaction_type_code(name) for name in self._split("type_names")]
+        self._cards = {}
+        self._deleted = set()
+        self._lock = threading.Lock()
+
+    def _split(self, name, count=None):
+        # Строки карт делятся с числом карт из заголовка: и пустой список, и одна пустая строка
+        # (владелец по умолчанию) дают пустой раздел. Имена типов операций пустыми не бывают.
+        data = bytes(self._columns[name])
+        if count is None:
+            count = 1 if data else 0
+        return data.decode("utf-8").split("\0") if count else []
+
+    def _string(self, name, row):
+        values = self._strings.get(name)
+        if values is None:
+            values = self._strings[name] = self._split(name, self._card_count)
+        return values[row]
+
+    def _find_row(self, card_number):
+        card_numbers = self._card_numbers
+        row = bisect_left(card_numbers, card_number)
+        if row < len(card_numbers) and card_numbers[row] == card_number and card_number not in self._deleted:
+            return row
+        return None
+
+    def _materialize(self, card_number, row):
+        columns = self._columns
+        card_flags = columns["flags"][row]
+        deposit_type = 'full' if card_flags & _FLAG_DEPOSIT_FULL else 'partial'
+        history_enabled = bool(card_flags & _FLAG_HISTORY_ENABLED)
+        pin = self._string("pins", row)
+        owner_name = self._string("owner_names", row)
+        if card_flags & _FLAG_CREDIT:
+            card = CreditCard(card_number, pin, columns["balances"][row], columns["credit_limits"][row],
+                              history_enabled, deposit_type, owner_name, self.clock)
+            card.last_accrual_timestamp = columns["accrual_timestamps"][row]
+        else:
+            card = DebitCard(card_number, pin, columns["balances"][row], history_enabled, deposit_type, owner_name,
+                             self.clock)
+        card.is_blocked = bool(card_flags & _FLAG_BLOCKED)
+        card.simulated_bank_account = columns["bank_accounts"][row]
+        card.archive = self.archive
+
+        lo = columns["transaction_offsets"][row]
+        hi = columns["transaction_offsets"][row + 1]
+        if hi > lo:
+            log = card.transactions
+            log.allocate()
+            log.timestamps.frombytes(columns["transaction_timestamps"][lo:hi].cast('B'))
+            type_code_map = self._type_code_map
+            log.type_codes.extend(type_code_map[code] for code in columns["transaction_type_codes"][lo:hi])
+            log.amounts.frombytes(columns["transaction_amounts"][lo:hi].cast('B'))
+            log.balances.frombytes(columns["transaction_balances"][lo:hi].cast('B'))
+            log.appended_count = hi - lo
+            card.rebuild_daily_withdrawals()
+        return card
+
+    def __getitem__(self, card_number):
+        card = self._cards.get(card_number)
+        if card is not None:
+            return card
+        with self._lock:
+            card = self._cards.get(card_number)
+            if card is None:
+                row = self._find_row(card_number)
+                if row is None:
+                    raise KeyError(card_number)
+                card = self._cards[card_number] = self._materialize(card_number, row)
+        return card
+
+    def __setitem__(self, card_number, card):
+        with self._lock:
+            self._deleted.discard(card_number)
+            self._cards[card_number] = card
+
+    def __delitem__(self, card_number):
+        if card_number not in self:
+            raise KeyError(card_number)
+        with self._lock:
+            self._cards.pop(card_number, None)
+            self._deleted.add(card_number)
+
+    def __contains__(self, card_number):
+        if card_number in self._cards:
+            return True
+        return self._find_row(card_number) is not None
+
+    def _added_card_numbers(self):
+        return [card_number for card_number in self._cards if self._find_row(card_number) is None]
+
+    def __iter__(self):
+        for card_number in self._card_numbers:
+            if card_number not in self._deleted:
+                yield card_number
+        yield from self._added_card_numbers()
+
+    def __len__(self):
+        return len(self._card_numbers) - len(self._deleted) + len(self._added_card_numbers())
+
+    def describe_cards(self):
+        owner_names = self._strings.get("owner_names") or self._split("owner_names", self._card_count)
+        flags = self._columns["flags"]
+        described = []
+        for card_number in self:
+            card = self._cards.get(card_number)
+            if card is not None:
+                described.append((card_number, card.owner_name, card.is_blocked))
+            else:
+                row = self._find_row(card_number)
+                described.append((card_number, owner_names[row], bool(flags[row] & _FLAG_BLOCKED)))
+        return described
+
+    def close(self):
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        self._views = []
+        self._mmap.close()
+        self._file.close()
+
+
+def _snapshot_path(directory, journal_seq):
+    return os.path.join(directory, f"snapshot-{journal_seq:020d}.bin")
+
+
+def list_snapshots(directory):
+    return sorted(glob.glob(os.path.join(directory, "snapshot-*.bin")))
+
+
+def take_snapshot(directory, card_database, journal=None, keep=2, card_locks=None):
+    # Карты копируются под блокировками всех карт (CardLockTable терминалов): терминал меняет карту
+    # и пишет операцию в журнал под блокировкой карты, поэтому копия содержит ровно записи журнала
+    # до last_seq, и при восстановлении доигрываются только следующие за ним. Терминалы ждут
+    # только копирования в память, файл пишется уже после снятия блокировок.
+    with card_locks.hold(*card_database) if card_locks is not None else nullcontext():
+        journal_seq = journal.last_seq if journal is not None else 0
+        sections, card_count, transaction_count = _collect_sections(card_database)
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory, journal_seq)
+    _write_sections(path, sections, journal_seq, card_count, transaction_count)
+    for old_path in list_snapshots(directory)[:-keep]:
+        os.remove(old_path)
+    return path
+
+
+def restore(directory, journal_path=None, clock=None, archive=None):
+    # Быстрый старт: открыть последний снимок и доиграть только хвост журнала после него
+    snapshots = list_snapshots(directory)
+    if snapshots:
+        cards = SnapshotCardDatabase(snapshots[-1], clock, archive)
+        journal_seq = cards.journal_seq
+    else:
+        cards = {}
+        journal_seq = 0
+    atm_cash = {}
+    if journal_path is not None and os.path.exists(journal_path):
+        journal_seq, atm_cash = replay_journal(journal_path, cards, journal_seq)
+    return cards, journal_seq, atm_cash
+
+
+class SnapshotScheduler:
+    # Периодически снимает снимок карт в фоновом потоке
+    def __init__(self, directory, card_database, journal=None, interval=300.0, keep=2, card_locks=None):
+        self.directory = directory
+        self.card_database = card_database
+        self.journal = journal
+        self.card_locks = card_locks
+        self.interval = interval
+        self.keep = keep
+        self.last_snapshot_path = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.last_snapshot_path = take_snapshot(self.directory, self.card_database, self.journal, self.keep,
+                                                     self.card_locks)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,218 @@
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+import math
+import queue
+import sqlite3
+import threading
+
+from .cards import HISTORY_RETENTION_SECONDS, CreditCard, DebitCard
+from .clock import SYSTEM_CLOCK
+from .transactions import TRANSACTION_TYPES
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS cards (
+        card_number TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        pin TEXT NOT NULL,
+        balance REAL NOT NULL,
+        history_enabled INTEGER NOT NULL,
+        is_blocked INTEGER NOT NULL,
+        deposit_type TEXT NOT NULL,
+        simulated_bank_account REAL NOT NULL,
+        owner_name TEXT NOT NULL,
+        credit_limit REAL,
+        last_accrual_timestamp INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY,
+        card_number TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        trans_type TEXT NOT NULL,
+        amount REAL,
+        balance_after REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS transactions_card_timestamp ON transactions (card_number, timestamp)",
+)
+
+# Запросы заданы константами: sqlite3 кэширует подготовленные выражения для каждого соединения
+_SELECT_CARD = ("SELECT kind, pin, balance, history_enabled, is_blocked, deposit_type, simulated_bank_account, "
+                "owner_name, credit_limit, last_accrual_timestamp FROM cards WHERE card_number = ?")
+_SELECT_TRANSACTIONS = ("SELECT timestamp, trans_type, amount, balance_after FROM transactions "
+                        "WHERE card_number = ? AND timestamp >= ? ORDER BY timestamp, id")
+_UPSERT_CARD = (
+    "INSERT INTO cards (card_number, kind, pin, balance, history_enabled, is_blocked, deposit_type, "
+    "simulated_bank_account, owner_name, credit_limit, last_accrual_timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (card_number) DO UPDATE SET kind = excluded.kind, pin = excluded.pin, "
+    "balance = excluded.balance, history_enabled = excluded.history_enabled, is_blocked = excluded.is_blocked, "
+    "deposit_type = excluded.deposit_type, simulated_bank_account = excluded.simulated_bank_account, "
+    "owner_name = excluded.owner_name, credit_limit = excluded.credit_limit, "
+    "last_accrual_timestamp = excluded.last_accrual_timestamp")
+_INSERT_TRANSACTION = ("INSERT INTO transactions (card_number, timestamp, trans_type, amount, balance_after) "
+                       "VALUES (?, ?, ?, ?, ?)")
+
+
+class SQLiteCardStore(MutableMapping):
+    # Хранилище карт и их истории в SQLite. Ведет себя как словарь номер -> карта,
+    # поэтому его можно передать вместо available_cards_data. Карта читается из базы
+    # только при первом обращении к ней и дальше берется из кэша. Если задан archive,
+    # загруженные карты вытесняют в него операции старше срока хранения.
+
+    def __init__(self, path, pool_size=4, clock=None, archive=None):
+        self.path = path
+        self.clock = clock if clock is not None else SYSTEM_CLOCK
+        self.archive = archive
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        self._cache = {}
+        self._saved_counts = {}
+        self._cache_lock = threading.Lock()
+        with self._connection() as connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                     cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def _connection(self):
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def close(self):
+        with self._cache_lock:
+            self._cache.clear()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __getitem__(self, card_number):
+        card = self._cache.get(card_number)
+        if card is not None:
+            return card
+        with self._cache_lock:
+            card = self._cache.get(card_number)
+            if card is None:
+                card = self._load_card(card_number)
+                self._cache[card_number] = card
+        return card
+
+    def __setitem__(self, card_number, card):
+        if card.card_number != card_number:
+            raise ValueError("Номер карты не совпадает с ключом")
+        with self._cache_lock:
+            self._cache[card_number] = card
+        self.save(card)
+
+    def __delitem__(self, card_number):
+        with self._connection() as connection:
+            connection.execute("BEGIN")
+            deleted = connection.execute("DELETE FROM cards WHERE card_number = ?", (card_number,)).rowcount
+            connection.execute("DELETE FROM transactions WHERE card_number = ?", (card_number,))
+            connection.execute("COMMIT")
+        with self._cache_lock:
+            self._cache.pop(card_number, None)
+            self._saved_counts.pop(card_number, None)
+        if not deleted:
+            raise KeyError(card_number)
+
+    def __contains__(self, card_number):
+        if card_number in self._cache:
+            return True
+        with self._connection() as connection:
+            row = connection.execute("SELECT 1 FROM cards WHERE card_number = ?", (card_number,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        with self._connection() as connection:
+            card_numbers = [row[0] for row in
+                            connection.execute("SELECT card_number FROM cards ORDER BY card_number")]
+        return iter(card_numbers)
+
+    def __len__(self):
+        with self._connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def describe_cards(self):
+        # Номер, владелец и блокировка без загрузки самих карт и их истории
+        with self._connection() as connection:
+            return connection.execute(
+                "SELECT card_number, owner_name, is_blocked FROM cards ORDER BY card_number").fetchall()
+
+    def _load_card(self, card_number):
+        now = self.clock.now()
+        with self._connection() as connection:
+            row = connection.execute(_SELECT_CARD, (card_number,)).fetchone()
+            if row is None:
+                raise KeyError(card_number)
+            history = connection.execute(_SELECT_TRANSACTIONS,
+                                         (card_number, now - HISTORY_RETENTION_SECONDS)).fetchall()
+
+        (kind, pin, balance, history_enabled, is_blocked, deposit_type, simulated_bank_account, owner_name,
+         credit_limit, last_accrual_timestamp) = row
+        if kind == "credit":
+            card = CreditCard(card_number, pin, balance, credit_limit, bool(history_enabled), deposit_type,
+                              owner_name, self.clock)
+            card.last_accrual_timestamp = last_accrual_timestamp
+        else:
+            card = DebitCard(card_number, pin, balance, bool(history_enabled), deposit_type, owner_name, self.clock)
+        card.is_blocked = bool(is_blocked)
+        card.simulated_bank_account = simulated_bank_account
+        card.archive = self.archive
+        for timestamp, trans_type, amount, balance_after in history:
+            card.transactions.append(timestamp, trans_type, amount, balance_after)
+        card.rebuild_daily_withdrawals(now)
+        self._saved_counts[card_number] = card.transactions.appended_count
+        return card
+
+    def save(self, card):
+        is_credit = isinstance(card, CreditCard)
+        card_row = (card.card_number, "credit" if is_credit else "debit", card.pin, card.balance,
+                    int(card.history_enabled), int(card.is_blocked), card.deposit_type,
+                    card.simulated_bank_account, card.owner_name,
+                    card.credit_limit if is_credit else None,
+                    card.last_accrual_timestamp if is_credit else None)
+
+        log = card.transactions
+        appended_count = log.appended_count
+        new_rows = []
+        for i in log.rows_appended_since(self._saved_counts.get(card.card_number, 0)):
+            amount = log.amounts[i]
+            new_rows.append((card.card_number, log.timestamps[i], TRANSACTION_TYPES[log.type_codes[i]],
+                             None if math.isnan(amount) else amount, log.balances[i]))
+
+        with self._connection() as connection:
+            connection.execute("BEGIN")
+            try:
+                connection.execute(_UPSERT_CARD, card_row)
+                if new_rows:
+                    connection.executemany(_INSERT_TRANSACTION, new_rows)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        self._saved_counts[card.card_number] = appended_count
+
+    def save_all(self):
+        with self._cache_lock:
+            cards = list(self._cache.values())
+        for card in cards:
+            self.save(card)
+
+
+def describe_cards(card_database):
+    # (номер, владелец, заблокирована) для всех карт: хранилища отвечают без загрузки карт,
+    # обычный словарь перебирается
+    if hasattr(card_database, "describe_cards"):
+        return card_database.describe_cards()
+    return [(number, card.owner_name, card.is_blocked) for number, card in card_database.items()]
@@ -0,0 +1,171 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+import math
+import threading
+
+# Названия типов операций хранятся один раз, в истории лежат только их коды
+TRANSACTION_TYPES = []
+_TRANSACTION_TYPE_CODES = {}
+_TRANSACTION_TYPES_LOCK = threading.Lock()
+
+
+def get_transaction_type_code(trans_type):
+    code = _TRANSACTION_TYPE_CODES.get(trans_type)
+    if code is None:
+        with _TRANSACTION_TYPES_LOCK:  # новый тип может встретиться одновременно в нескольких терминалах
+            code = _TRANSACTION_TYPE_CODES.get(trans_type)
+            if code is None:
+                code = len(TRANSACTION_TYPES)
+                TRANSACTION_TYPES.append(trans_type)
+                _TRANSACTION_TYPE_CODES[trans_type] = code
+    return code
+
+
+# Общие для всех пустых историй столбцы: массивы создаются только при первой записи
+_NO_ROWS = ()
+
+
+def to_timestamp(moment):
+    if moment is None:
+        return None
+    return int(moment.timestamp())
+
+
+class TransactionLog:
+    # История по столбцам: время в секундах эпохи, код типа, сумма и баланс после операции.
+    # Устаревшие записи отбрасываются сдвигом _head, а место под ними освобождается
+    # пачкой, когда они занимают больше половины массивов.
+    # appended_count считает все когда-либо добавленные записи и не уменьшается при удалении,
+    # по нему хранилища определяют, какие записи еще не сохранены.
+    # Пока записей не было, столбцы - общий пустой кортеж _NO_ROWS, а не четыре массива на карту.
+    __slots__ = ('timestamps', 'type_codes', 'amounts', 'balances', '_head', 'appended_count')
+
+    COMPACTION_MIN_ROWS = 64
+
+    def __init__(self):
+        self.timestamps = self.type_codes = self.amounts = self.balances = _NO_ROWS
+        self._head = 0
+        self.appended_count = 0
+
+    def allocate(self):
+        # Заводит собственные массивы; нужен перед записью в столбцы напрямую, минуя append
+        if self.timestamps is _NO_ROWS:
+            self.timestamps = array('q')
+            self.type_codes = array('H')
+            self.amounts = array('d')
+            self.balances = array('d')
+
+    def __len__(self):
+        return len(self.timestamps) - self._head
+
+    def __iter__(self):
+        for i in range(self._head, len(self.timestamps)):
+            yield self.row(i)
+
+    def __reversed__(self):
+        for i in range(len(self.timestamps) - 1, self._head - 1, -1):
+            yield self.row(i)
+
+    def __getitem__(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("Нет операции с таким номером")
+        return self.row(self._head + index)
+
+    def row(self, i):
+        amount = self.amounts[i]
+        return (datetime.fromtimestamp(self.timestamps[i]), TRANSACTION_TYPES[self.type_codes[i]],
+                None if math.isnan(amount) else amount, self.balances[i])
+
+    def append(self, timestamp, trans_type, amount, balance_after):
+        if self.timestamps is _NO_ROWS:
+            self.allocate()
+        self.timestamps.append(timestamp)
+        self.type_codes.append(get_transaction_type_code(trans_type))
+        self.amounts.append(math.nan if amount is None else amount)
+        self.balances.append(balance_after)
+        self.appended_count += 1
+
+    def rows_appended_since(self, appended_count):
+        # Записи, добавленные после того, как счетчик был равен appended_count
+        # (кроме уже удаленных как устаревшие)
+        new_rows = min(self.appended_count - appended_count, len(self))
+        end = len(self.timestamps)
+        return range(end - new_rows, end)
+
+    def index_range(self, start_timestamp=None, end_timestamp=None):
+        # Записи упорядочены по времени, поэтому границы периода ищутся двоичным поиском
+        lo = self._head
+        hi = len(self.timestamps)
+        if start_timestamp is not None:
+            lo = bisect_left(self.timestamps, start_timestamp, lo, hi)
+        if end_timestamp is not None:
+            hi = bisect_left(self.timestamps, end_timestamp, lo, hi)
+        return lo, hi
+
+    def select(self, start_timestamp=None, end_timestamp=None, trans_type=None):
+        lo, hi = self.index_range(start_timestamp, end_timestamp)
+        if trans_type is None:
+            return range(lo, hi)
+        code = _TRANSACTION_TYPE_CODES.get(trans_type)
+        if code is None:
+            return []
+        type_codes = self.type_codes
+        return [i for i in range(lo, hi) if type_codes[i] == code]
+
+    def expire_before(self, cutoff_timestamp, on_expire=None):
+        # on_expire(log, lo, hi) получает вытесняемые записи до того, как они будут удалены
+        timestamps = self.timestamps
+        head = self._head
+        end = len(timestamps)
+        while head < end and timestamps[head] < cutoff_timestamp:
+            head += 1
+        if on_expire is not None and head > self._head:
+            on_expire(self, self._head, head)
+        self._head = head
+        if head >= self.COMPACTION_MIN_ROWS and head * 2 >= end:
+            self._compact()
+
+    def _compact(self):
+        head = self._head
+        del self.timestamps[:head]
+        del self.type_codes[:head]
+        del self.amounts[:head]
+        del self.balances[:head]
+        self._head = 0
+
+    def clear(self):
+        self.timestamps = self.type_codes = self.amounts = self.balances = _NO_ROWS
+        self._head = 0
+
+
+class SlidingWindowTotal:
+    # Сумма операций за последние window_seconds секунд. Итог поддерживается при добавлении
+    # и вытеснении, поэтому проверка лимита не зависит от длины истории.
+    __slots__ = ('window_seconds', 'total', '_events')
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.total = 0.0
+        self._events = deque()
+
+    def _expire(self, now):
+        events = self._events
+        cutoff = now - self.window_seconds
+        while events and events[0][0] <= cutoff:
+            self.total -= events.popleft()[1]
+        if not events:
+            self.total = 0.0
+
+    def current(self, now):
+        self._expire(now)
+        return self.total
+
+    def add(self, now, amount):
+        self._expire(now)
+        self._events.append((now, amount))
+        self.total += amount
@@ -0,0 +1,158 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import math
+import mmap
+import os
+import struct
+
+from .transactions import TRANSACTION_TYPES, get_transaction_type_code
+
+TXLOG_MAGIC = b"RSTXLG01"
+
+# Запись фиксированной длины 48 байт, поля выровнены: время, сумма, баланс после операции,
+# код типа и номер карты. Записи в файле отсортированы по номеру карты и времени,
+# поэтому история одной карты - это непрерывный диапазон записей.
+RECORD = struct.Struct("<qddH20s2x")
+RECORD_SIZE = RECORD.size
+_CARD_NUMBER_OFFSET = 26
+_CARD_NUMBER_SIZE = 20
+
+_HEADER = struct.Struct("<8sIQQ")  # метка, размер записи, число записей, длина таблицы типов
+_ALIGNMENT = 64
+
+NUMPY_RECORD_DTYPE = [("timestamp", "<i8"), ("amount", "<f8"), ("balance", "<f8"), ("type_code", "<u2"),
+                      ("card_number", "S20"), ("padding", "V2")]
+
+
+def _encode_card_number(card_number):
+    encoded = card_number.encode("ascii")
+    if len(encoded) > _CARD_NUMBER_SIZE:
+        raise ValueError(f"Номер карты длиннее {_CARD_NUMBER_SIZE} символов: {card_number}")
+    return encoded.ljust(_CARD_NUMBER_SIZE, b"\0")
+
+
+def write_transaction_log(path, card_database):
+    type_names = "\0".join(TRANSACTION_TYPES).encode("utf-8")
+    cards = sorted(card_database.values(), key=lambda card: card.card_number)
+    record_count = sum(len(card.transactions) for card in cards)
+    data_offset = _HEADER.size + len(type_names)
+    data_offset += -data_offset % _ALIGNMENT
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as log_file:
+        log_file.write(_HEADER.pack(TXLOG_MAGIC, RECORD_SIZE, record_count, len(type_names)))
+        log_file.write(type_names)
+        log_file.write(b"\0" * (data_offset - log_file.tell()))
+        for card in cards:
+            card_number = _encode_card_number(card.card_number)
+            log = card.transactions
+            lo, hi = log.index_range()
+            chunk = bytearray(RECORD_SIZE * (hi - lo))
+            for position, i in enumerate(range(lo, hi)):
+                RECORD.pack_into(chunk, position * RECORD_SIZE, log.timestamps[i], log.amounts[i],
+                                 log.balances[i], log.type_codes[i], card_number)
+            log_file.write(chunk)
+        log_file.flush()
+        os.fsync(log_file.fileno())
+    os.replace(temporary_path, path)
+
+
+class _CardNumberColumn:
+    # Последовательность номеров карт прямо из отображенного файла, для bisect
+    __slots__ = ('_buffer', '_data_offset', '_length')
+
+    def __init__(self, buffer, data_offset, length):
+        self._buffer = buffer
+        self._data_offset = data_offset
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        start = self._data_offset + i * RECORD_SIZE + _CARD_NUMBER_OFFSET
+        return self._buffer[start:start + _CARD_NUMBER_SIZE]
+
+
+class TransactionLogFile:
+    # Чтение файла операций через mmap: история карты находится двоичным поиском
+    # и отдается как memoryview на ее записи, без создания объектов для каждой строки.
+    # Выданные memoryview, их срезы и массивы to_numpy() остаются действительными и после close():
+    # если они еще живы, отображение файла снимается, когда освобождается последний из них.
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size, self.record_count, type_names_size = _HEADER.unpack_from(self._mmap)
+        if magic != TXLOG_MAGIC or record_size != RECORD_SIZE:
+            self.close()
+            raise ValueError(f"{path} не является файлом операций поддерживаемого формата")
+        type_names = self._mmap[_HEADER.size:_HEADER.size + type_names_size].decode("utf-8")
+        self._type_code_map = [get_transaction_type_code(name) for name in type_names.split("\0")] \
+            if type_names else []
+        self._data_offset = _HEADER.size + type_names_size
+        self._data_offset += -self._data_offset % _ALIGNMENT
+        self._card_numbers = _CardNumberColumn(self._mmap, self._data_offset, self.record_count)
+
+    def __len__(self):
+        return self.record_count
+
+    def find_card(self, card_number):
+        key = _encode_card_number(card_number)
+        lo = bisect_left(self._card_numbers, key)
+        hi = bisect_right(self._card_numbers, key, lo)
+        return lo, hi
+
+    def records(self, lo=0, hi=None):
+        if hi is None:
+            hi = self.record_count
+        start = self._data_offset + lo * RECORD_SIZE
+        return memoryview(self._mmap)[start:self._data_offset + hi * RECORD_SIZE]
+
+    def card_records(self, card_number):
+        return self.records(*self.find_card(card_number))
+
+    def iter_rows(self, lo=0, hi=None, reverse=False):
+        # Строки (время, тип, сумма, баланс после) создаются по одной при переборе
+        if hi is None:
+            hi = self.record_count
+        indices = range(hi - 1, lo - 1, -1) if reverse else range(lo, hi)
+        buffer = self._mmap
+        data_offset = self._data_offset
+        for i in indices:
+            timestamp, amount, balance, type_code, _ = RECORD.unpack_from(buffer, data_offset + i * RECORD_SIZE)
+            yield (datetime.fromtimestamp(timestamp), TRANSACTION_TYPES[self._type_code_map[type_code]],
+                   None if math.isnan(amount) else amount, balance)
+
+    def iter_card_history(self, card_number, reverse=False):
+        lo, hi = self.find_card(card_number)
+        return self.iter_rows(lo, hi, reverse)
+
+    def to_numpy(self, lo=0, hi=None):
+        # Структурированный массив NumPy поверх тех же байтов, без копирования.
+        # Коды типов в нем - коды файла, их названия в type_names().
+        import numpy
+        if hi is None:
+            hi = self.record_count
+        return numpy.frombuffer(self._mmap, dtype=NUMPY_RECORD_DTYPE, count=hi - lo,
+                                offset=self._data_offset + lo * RECORD_SIZE)
+
+    def type_names(self):
+        return [TRANSACTION_TYPES[code] for code in self._type_code_map]
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Отображение держат выданные буферы, оно закроется вместе с последним из них
+            self._mmap = None
+            self._card_numbers = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
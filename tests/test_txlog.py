@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raschet import DebitCard, SIMULATION_PIN_HASHER, TransactionLogFile, set_default_pin_hasher
+from raschet.txlog import RECORD, RECORD_SIZE, write_transaction_log
+
+set_default_pin_hasher(SIMULATION_PIN_HASHER)
+
+
+def _write_log(path):
+    cards = {}
+    for number in ("0000000000000001", "0000000000000002"):
+        card = DebitCard(number, "0000", 0.0, True)
+        for amount in (1.0, 2.0, 3.0):
+            card.balance += amount
+            card.add_transaction("Пополнение", amount, 1_600_000_000 + int(amount))
+        cards[number] = card
+    write_transaction_log(path, cards)
+
+
+def test_close_with_derived_slice_alive(tmp_path):
+    path = str(tmp_path / "transactions.bin")
+    _write_log(path)
+    log_file = TransactionLogFile(path)
+    records = log_file.card_records("0000000000000002")
+    # Срез и cast выданного memoryview держат отображение файла так же, как он сам
+    last_record = records[2 * RECORD_SIZE:]
+    as_bytes = records.cast('B')
+    log_file.close()
+    assert log_file._file.closed
+    assert RECORD.unpack(last_record)[1] == 3.0
+    assert len(as_bytes) == 3 * RECORD_SIZE
+    del records, last_record, as_bytes
+
+
+def test_context_manager_with_view_alive(tmp_path):
+    path = str(tmp_path / "transactions.bin")
+    _write_log(path)
+    with TransactionLogFile(path) as log_file:
+        records = log_file.records()
+    assert len(records) == 6 * RECORD_SIZE
+    records.release()
+
+
+def test_close_without_exports(tmp_path):
+    path = str(tmp_path / "transactions.bin")
+    _write_log(path)
+    log_file = TransactionLogFile(path)
+    assert len(log_file.card_records("0000000000000001")) == 3 * RECORD_SIZE
+    log_file.close()
+    log_file.close()